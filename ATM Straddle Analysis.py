@@ -1,32 +1,35 @@
-from ib_insync import IB, Stock, Option
+from ib_insync import Stock, Option
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import datetime as dt
+from types import SimpleNamespace
+from chain_store import ChainStore
+from ib_snapshots import gather_snapshots, print_timeouts, STOCK_FIELDS
+from helpers import get_ib, disconnect_ib
+from straddle_scanner import straddle_summary
+from contract_cache import CONTRACT_CACHE
 
 # ========= INPUT =========
 TICKER = "AAPL"
 USE_DELAYED = True   # True = delayed (3), False = real-time (1)
 
 # ========= CONNECT =========
-ib = IB()
-ib.connect('127.0.0.1', 7497, clientId=1)
-print("Connected:", ib.isConnected())
+ib = get_ib()
 ib.reqMarketDataType(3 if USE_DELAYED else 1)
 
 # ========= 1) UNDERLYING =========
 stock = Stock(TICKER, "SMART", "USD")
-stock = ib.qualifyContracts(stock)[0]
+stock = CONTRACT_CACHE.qualify(ib, stock)[0]
 
-tick_under = ib.reqMktData(stock, snapshot=True)
-ib.sleep(2)
+(tick_under,), _ = gather_snapshots(ib, [stock], fields=STOCK_FIELDS, timeout=5)
 spot = float(tick_under.last) if tick_under.last else None
 if spot is None:
     raise ValueError(f"Kunne ikke hente spotpris for {TICKER}")
 print(f"Spotpris for {TICKER}: {spot:.2f}")
 
 # ========= 2) OPTION CHAIN & EXPIRY VALG =========
-chains = ib.reqSecDefOptParams(stock.symbol, "", stock.secType, stock.conId)
+chains = CONTRACT_CACHE.sec_def_opt_params(ib, stock.symbol, "", stock.secType, stock.conId)
 # Brug SMART hvis muligt
 chain = next((c for c in chains if c.exchange == "SMART"), chains[0])
 all_exchanges = [chain.exchange] + [c.exchange for c in chains if c.exchange != chain.exchange]
@@ -56,13 +59,12 @@ print(f"\nValgt expiry: {expiry}")
 def strikes_for_expiry(symbol: str, expiry_yyyymmdd: str, exchanges: list[str]):
     """
     Returner (exchange, sorted_strikes) for første børs med data for expiry.
-    Vi bruger strike=0.0 og right='C'/'P' for at få hele kæden i ét kald.
+    Vi bruger strike=0.0 og right='C'/'P' for at få hele kæden i ét kald (cachet lokalt).
     """
     for ex in exchanges:
-        calls = ib.reqContractDetails(Option(symbol, expiry_yyyymmdd, 0.0, "C", ex))
-        puts  = ib.reqContractDetails(Option(symbol, expiry_yyyymmdd, 0.0, "P", ex))
-        strikes = sorted({cd.contract.strike for cd in (calls + puts)
-                          if cd.contract.strike and cd.contract.strike > 0})
+        calls = CONTRACT_CACHE.find_contracts(ib, Option(symbol, expiry_yyyymmdd, 0.0, "C", ex))
+        puts  = CONTRACT_CACHE.find_contracts(ib, Option(symbol, expiry_yyyymmdd, 0.0, "P", ex))
+        strikes = sorted({c.strike for c in (calls + puts) if c.strike and c.strike > 0})
         if strikes:
             return ex, strikes
     return None, []
@@ -77,20 +79,45 @@ atm_strike = min(expiry_strikes, key=lambda s: abs(s - spot))
 print(f"Valgt ATM strike (for {expiry}): {atm_strike}")
 
 # ========= 4) HENT GREEKS & IV FOR ATM CALL/PUT =========
-atm_call = Option(TICKER, expiry, atm_strike, "C", exch)
-atm_put  = Option(TICKER, expiry, atm_strike, "P", exch)
-
-tick_call = ib.reqMktData(atm_call, "", False, False)
-tick_put  = ib.reqMktData(atm_put,  "", False, False)
-ib.sleep(3)
-
-gc = tick_call.modelGreeks
-gp = tick_put.modelGreeks
-if not gc or not gp:
-    raise ValueError("Kunne ikke hente Greeks – tjek market data abonnement.")
-
-call_price = tick_call.last if tick_call.last else gc.optPrice
-put_price  = tick_put.last  if tick_put.last  else gp.optPrice
+# Frisk snapshot fra disk genbruges; ellers streames kontrakterne fra IB
+# Egen source – Get_Stock_Price gemmer hele kæden med et andet skema under samme underlying
+STORE_SOURCE = "ib_straddle"
+store = ChainStore()
+greek_cols = ["delta", "gamma", "vega", "theta", "iv", "price"]
+cached = store.read(TICKER, source=STORE_SOURCE, expiries=[expiry])
+if cached.empty or not {"strike", "right", *greek_cols} <= set(cached.columns):
+    cached = pd.DataFrame()
+else:
+    cached = cached[(cached["strike"] == atm_strike) & cached[greek_cols].notna().all(axis=1)]
+
+if set(cached.get("right", [])) >= {"C", "P"}:
+    print(f"💾 Bruger gemt ATM snapshot (under {store.max_age} s gammel)")
+    rows = {r["right"]: r for _, r in cached.iterrows()}
+    gc, gp = (SimpleNamespace(delta=rows[k]["delta"], gamma=rows[k]["gamma"], vega=rows[k]["vega"],
+                              theta=rows[k]["theta"], impliedVol=rows[k]["iv"]) for k in ("C", "P"))
+    call_price, put_price = rows["C"]["price"], rows["P"]["price"]
+else:
+    atm_call = Option(TICKER, expiry, atm_strike, "C", exch)
+    atm_put  = Option(TICKER, expiry, atm_strike, "P", exch)
+
+    # Stream begge ben og stop, så snart modelGreeks er modtaget
+    (tick_call, tick_put), report = gather_snapshots(ib, [atm_call, atm_put], fields=("modelGreeks",),
+                                                     timeout=10, snapshot=False)
+    print_timeouts(report)
+
+    gc = tick_call.modelGreeks
+    gp = tick_put.modelGreeks
+    if not gc or not gp:
+        raise ValueError("Kunne ikke hente Greeks – tjek market data abonnement.")
+
+    call_price = tick_call.last if tick_call.last else gc.optPrice
+    put_price  = tick_put.last  if tick_put.last  else gp.optPrice
+
+    store.write(TICKER, pd.DataFrame([
+        {"expiry": expiry, "strike": atm_strike, "right": right, "spot": spot, "price": price,
+         "delta": g.delta, "gamma": g.gamma, "vega": g.vega, "theta": g.theta, "iv": g.impliedVol}
+        for right, g, price in (("C", gc, call_price), ("P", gp, put_price))
+    ]), source=STORE_SOURCE)
 
 # ========= 5) TABELLEN =========
 df_opts = pd.DataFrame([
@@ -105,38 +132,12 @@ print("\n=== ATM Call & Put (Greeks + IV) ===")
 print(df_opts)
 
 # ========= 6) STRADDLE-METRICS =========
+# Samme beregning som straddle_scanner.py (mange tickers/expiries på én gang)
 straddle_price = call_price + put_price
-straddle_pct   = straddle_price / spot
 breakeven_up   = spot + straddle_price
 breakeven_dn   = spot - straddle_price
 
-expiry_date    = dt.datetime.strptime(expiry, "%Y%m%d").date()
-days_to_expiry = max((expiry_date - today).days, 1)
-
-# Vega-vægtet kombineret IV
-combined_iv = (
-    (gc.impliedVol * gc.vega + gp.impliedVol * gp.vega) / (gc.vega + gp.vega)
-    if (gc.vega + gp.vega) != 0 else (gc.impliedVol + gp.impliedVol) / 2
-)
-annualized_move = straddle_pct / (days_to_expiry ** 0.5) * (252 ** 0.5)
-daily_move_pct  = straddle_pct / (days_to_expiry ** 0.5)
-daily_move_usd  = daily_move_pct * spot
-
-summary = pd.DataFrame([{
-    "Underlying": TICKER,
-    "Expiry": expiry,
-    "DaysToExpiry": days_to_expiry,
-    "Strike(ATM)": atm_strike,
-    "Spot": round(spot, 4),
-    "StraddlePrice": round(straddle_price, 4),
-    "StraddlePctOfSpot": round(straddle_pct, 4),
-    "Breakeven_Down": round(breakeven_dn, 4),
-    "Breakeven_Up": round(breakeven_up, 4),
-    "CombinedIV_VegaWeighted": round(combined_iv, 6),
-    "AnnualizedImpliedMove": round(annualized_move, 4),
-    "ImpliedDailyMovePct": round(daily_move_pct, 4),
-    "ImpliedDailyMoveUSD": round(daily_move_usd, 4)
-}])
+summary = pd.DataFrame([straddle_summary(TICKER, expiry, spot, atm_strike, gc, gp, call_price, put_price, today)])
 print("\n=== ATM Straddle Summary ===")
 print(summary)
 
@@ -160,4 +161,4 @@ plt.grid(alpha=0.3)
 plt.tight_layout()
 plt.show()
 
-ib.disconnect()
+disconnect_ib()
@@ -1,8 +1,8 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
-from qfin.options import BlackScholesCall
-from scipy.optimize import brentq
+from bs_pricing import bs_price
+from iv_solver import implied_vol_batch
 
 # Parametre
 S = 100
@@ -17,28 +17,12 @@ K, T = np.meshgrid(strikes, maturities)
 
 # "Fake" market prices: antag at vol afhænger af strike (volatility smile)
 true_iv = 0.25 + 0.0015 * (K - S)**2 / S  # mere vol for strikes langt væk fra spot
-market_prices = np.zeros_like(K)
+market_prices = bs_price(S, K, T, true_iv, r, right='C')  # hele grid'et i ét vektoriseret kald
 
-for i in range(K.shape[0]):
-    for j in range(K.shape[1]):
-        option = BlackScholesCall(S, true_iv[i, j], K[i, j], T[i, j], r)
-        market_prices[i, j] = option.price
-
-# Funktion til at beregne implied volatility ved root-finding
-def implied_vol(price, S, K, T, r):
-    def objective(sigma):
-        return BlackScholesCall(S, sigma, K, T, r).price - price
-    
-    try:
-        return brentq(objective, 1e-6, 5.0)  # søg mellem næsten 0% og 500% vol
-    except ValueError:
-        return np.nan  # hvis ingen løsning findes
-
-# Beregn implied vol surface
-implied_vol_surface = np.zeros_like(K)
-for i in range(K.shape[0]):
-    for j in range(K.shape[1]):
-        implied_vol_surface[i, j] = implied_vol(market_prices[i, j], S, K[i, j], T[i, j], r)
+# Beregn implied vol surface – hele grid'et inverteres i ét kald
+# (NaN + converged=False for priser uden løsning i stedet for en exception)
+implied_vol_surface, converged = implied_vol_batch(market_prices, S, K, T, r, right='C')
+print(f"IV konvergeret for {converged.sum()}/{converged.size} punkter")
 
 # Plot IV surface
 fig = plt.figure(figsize=(10, 6))
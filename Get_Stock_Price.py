@@ -1,20 +1,24 @@
-from ib_insync import IB, Stock, Option
+from ib_insync import Stock
+from helpers import get_ib, disconnect_ib
 import pandas as pd
+from chain_store import ChainStore
+from ib_snapshots import gather_snapshots, print_timeouts, OPTION_FIELDS, STOCK_FIELDS
+from contract_cache import CONTRACT_CACHE
+from chain_qualifier import qualify_chain, print_report
+from mkt_data_lines import LINES, print_line_usage
 
 # === 1) Forbind til TWS eller Gateway ===
-ib = IB()
-ib.connect('127.0.0.1', 7497, clientId=2)
+ib = get_ib()  # host/port/clientId fra config.CONFIG
 
 # === 2) Definer og kvalificer AAPL kontrakten ===
 stock = Stock('AAPL', 'SMART', 'USD')
-ib.qualifyContracts(stock)
+CONTRACT_CACHE.qualify(ib, stock)  # kontrakt-metadata caches lokalt (data/contracts.sqlite)
 
 from datetime import datetime
 
 # === 3) Hent spotpris (med fallback) ===
 ib.reqMarketDataType(1)  # 1 = real-time streaming
-ticker = ib.reqMktData(stock, snapshot=True)
-ib.sleep(2)
+(ticker,), _ = gather_snapshots(ib, [stock], fields=STOCK_FIELDS, timeout=5)  # færdig ved første 'last'
 
 spot_price = ticker.last or ticker.close
 
@@ -37,12 +41,13 @@ else:
         print(f"✅ Spotpris (EOD close fra {bar_time}) for AAPL: {spot_price}")
     else:
         print("❌ Kunne ikke hente historiske data – check API eller markedskalender.")
-        ib.disconnect()
+        disconnect_ib()
         exit()
 
 
 # === 4) Hent option chain ===
-chains = ib.reqSecDefOptParams(
+chains = CONTRACT_CACHE.sec_def_opt_params(
+    ib,
     underlyingSymbol='AAPL',
     futFopExchange='',
     underlyingSecType='STK',
@@ -60,45 +65,68 @@ print(f"📊 Henter {len(strikes)} strikes og {len(expirations)} expirations")
 
 if not strikes:
     print("⚠️ Ingen strikes fundet i det valgte interval – tjek om spotpris er korrekt.")
-    ib.disconnect()
+    disconnect_ib()
     exit()
 
-# === 6) Opret option-kontrakter ===
-options = []
-for expiry in expirations:
-    for strike in strikes:
-        options.append(Option('AAPL', expiry, strike, 'C', 'SMART'))
-        options.append(Option('AAPL', expiry, strike, 'P', 'SMART'))
-
-ib.qualifyContracts(*options)
-
-# === 7) Hent market data for optionerne ===
-ib.reqMarketDataType(4)  # 4 = delayed-frozen uden for åbningstid
-tickers = []
-for opt in options:
-    t = ib.reqMktData(opt, snapshot=True)
-    tickers.append(t)
-
-ib.sleep(5)  # Vent på at data kommer ind
-
-# === 8) Saml resultater i DataFrame ===
-data = []
-for opt, ticker in zip(options, tickers):
-    data.append({
-        "expiry": opt.lastTradeDateOrContractMonth,
-        "strike": opt.strike,
-        "type": opt.right,
-        "last": ticker.last,
-        "bid": ticker.bid,
-        "ask": ticker.ask,
-        "iv": ticker.modelGreeks.impliedVol if ticker.modelGreeks else None,
-        "delta": ticker.modelGreeks.delta if ticker.modelGreeks else None,
-        "gamma": ticker.modelGreeks.gamma if ticker.modelGreeks else None,
-        "vega": ticker.modelGreeks.vega if ticker.modelGreeks else None,
-        "theta": ticker.modelGreeks.theta if ticker.modelGreeks else None
-    })
-
-df = pd.DataFrame(data)
+# === 5b) Genbrug frisk snapshot fra disk (ChainStore), ellers hent fra IB ===
+# Egen source – ATM Straddle Analysis gemmer kun 2 rækker (og andre kolonner) pr. expiry
+STORE_SOURCE = 'ib_chain'
+CHAIN_COLUMNS = {'expiry', 'strike', 'right', 'last', 'bid', 'ask', 'iv', 'delta', 'gamma', 'vega', 'theta'}
+store = ChainStore()
+cached = store.read('AAPL', source=STORE_SOURCE, expiries=expirations)
+
+
+def covers(cached):
+    """Har snapshottet alle kolonner, alle expiries og strike-intervallet for hver expiry?"""
+    if cached.empty or not CHAIN_COLUMNS <= set(cached.columns):
+        return False
+    for expiry in expirations:
+        k = cached.loc[cached['expiry'] == expiry, 'strike']
+        if k.empty or k.min() > strikes[0] or k.max() < strikes[-1]:
+            return False
+    return True
+
+
+if covers(cached):
+    print(f"💾 Bruger gemt snapshot (under {store.max_age} s gammel) – ingen market data requests")
+    df = cached.rename(columns={'right': 'type'})
+    df = df[(df['strike'] > spot_price - 10) & (df['strike'] < spot_price + 10)]
+else:
+    # === 6) Opret og kvalificér option-kontrakter ===
+    # Kun strike/expiry-kombinationer, som IB faktisk lister (ét contract details-kald pr. expiry)
+    options, qualify_report = qualify_chain(ib, 'AAPL', expirations, strikes,
+                                            trading_class=smart_chain.tradingClass)
+    print_report(qualify_report)
+
+    # === 7) Hent market data for optionerne ===
+    ib.reqMarketDataType(4)  # 4 = delayed-frozen uden for åbningstid
+    # Hver snapshot afsluttes, så snart bid/ask/greeks er inde (eller ved snapshot-end), og
+    # linjen går videre til næste kontrakt – aldrig flere åbne requests end linjebudgettet
+    started = datetime.now()
+    tickers, report = gather_snapshots(ib, options, fields=OPTION_FIELDS, timeout=15, lines=LINES)
+    print_timeouts(report)
+    print_line_usage(LINES, (datetime.now() - started).total_seconds())
+
+    # === 8) Saml resultater i DataFrame ===
+    data = []
+    for opt, ticker in zip(options, tickers):
+        data.append({
+            "expiry": opt.lastTradeDateOrContractMonth,
+            "strike": opt.strike,
+            "type": opt.right,
+            "last": ticker.last,
+            "bid": ticker.bid,
+            "ask": ticker.ask,
+            "iv": ticker.modelGreeks.impliedVol if ticker.modelGreeks else None,
+            "delta": ticker.modelGreeks.delta if ticker.modelGreeks else None,
+            "gamma": ticker.modelGreeks.gamma if ticker.modelGreeks else None,
+            "vega": ticker.modelGreeks.vega if ticker.modelGreeks else None,
+            "theta": ticker.modelGreeks.theta if ticker.modelGreeks else None
+        })
+
+    df = pd.DataFrame(data)
+    store.write('AAPL', df.rename(columns={'type': 'right'}), source=STORE_SOURCE)
+
 print(df)
 
-ib.disconnect()
+disconnect_ib()
@@ -3,9 +3,15 @@ import yfinance as yf
 import pandas as pd
 import numpy as np
 import datetime as dt
-from scipy.interpolate import griddata
 import plotly.graph_objects as go
 from yahooquery import search
+from yahoo_chains import fetch_chains, surface_points, filter_surface_points, MAX_WORKERS, EXPIRY_TIMEOUT
+from chain_store import ChainStore
+from svi_surface import fit_surface
+from swr_cache import SWRCache
+
+# Option chains gemmes på disk – friske snapshots genbruges uden netværkskald
+CHAIN_STORE = ChainStore()
 
 # ========== LAYOUT & STYLING ==========
 st.set_page_config(page_title="Finansielt Dashboard", layout="wide")
@@ -47,7 +53,15 @@ if search_input:
         st.warning("Ingen resultater fundet. Prøv et andet søgeord.")
 
 # ========== CACHED DATAFUNKTIONS ==========
-@st.cache_data(ttl=300)
+# Én cache for hele processen (alle brugere). Forældede værdier serveres, mens de opdateres
+# i baggrunden, og "Opdater" rammer kun den valgte tickers entries.
+@st.cache_resource
+def get_data_cache():
+    return SWRCache(ttl=300)
+
+DATA_CACHE = get_data_cache()
+
+@DATA_CACHE.memoize()
 def get_stock_data(ticker, period):
     data = yf.download(ticker, period=period)
     if isinstance(data.columns, pd.MultiIndex):
@@ -55,74 +69,38 @@ def get_stock_data(ticker, period):
     timestamp = dt.datetime.now()
     return data, timestamp
 
-@st.cache_data(ttl=300)
-def get_spot_and_expiries(ticker):
+def load_spot_and_expiries(ticker):
     ticker_obj = yf.Ticker(ticker)
     spot = float(ticker_obj.history(period="1d")["Close"].iloc[-1])
     expiries = ticker_obj.options
     timestamp = dt.datetime.now()
     return spot, expiries, timestamp
 
-@st.cache_data(ttl=300)
-def build_vol_surface_df(ticker, spot, expiries, n_sigma=3, show_debug=False):
-    rows = []
+get_spot_and_expiries = DATA_CACHE.memoize()(load_spot_and_expiries)
+
+# Vol surface-pipelinen er delt i tre trin, så en UI-kontrol kun invaliderer trinene under den:
+#   1) build_vol_surface_df: rå chains (cached, nøgle = ticker) – eneste trin med netværkskald
+#   2) filter_surface_points: n_sigma / IV-loft / OI-filter (vektoriseret, ucached)
+#   3) get_vol_surface: SVI/SSVI-fit (cached pr. filter-indstilling og datasæt)
+#    "Opdater" (DATA_CACHE.refresh) kalder trin 1 med force=True: ny spot og ingen snapshots fra disk
+@DATA_CACHE.memoize(force_kwarg="force")
+def build_vol_surface_df(ticker, max_workers=MAX_WORKERS, timeout=EXPIRY_TIMEOUT, force=False):
+    spot, expiries, _ = load_spot_and_expiries(ticker) if force else get_spot_and_expiries(ticker)
     ticker_obj = yf.Ticker(ticker)
-    for expiry in expiries:
-        try:
-            chain = ticker_obj.option_chain(expiry)
-            calls = chain.calls.copy()
-            puts = chain.puts.copy()
-
-            ed = dt.datetime.strptime(expiry, "%Y-%m-%d")
-            T = (ed - dt.datetime.today()).days / 365
-            if T <= 0:
-                continue
-
-            m = pd.merge(
-                calls[['strike', 'impliedVolatility', 'openInterest']],
-                puts[['strike', 'impliedVolatility', 'openInterest']],
-                on='strike', how='inner', suffixes=('_call', '_put')
-            )
 
-            if m.empty:
-                continue
-
-            # Find ATM strike & lav endelig IV kolonne
-            atm_strike = m.loc[(m['strike'] - spot).abs().idxmin(), 'strike']
-            m['iv_final'] = np.nan
-            m.loc[m['strike'] < spot, 'iv_final'] = m.loc[m['strike'] < spot, 'impliedVolatility_put']
-            m.loc[m['strike'] > spot, 'iv_final'] = m.loc[m['strike'] > spot, 'impliedVolatility_call']
-            m.loc[m['strike'] == atm_strike, 'iv_final'] = m.loc[
-                m['strike'] == atm_strike, ['impliedVolatility_call', 'impliedVolatility_put']
-            ].mean(axis=1)
-
-            # Beregn lognormal sigma og filtrer strikes på +/- n_sigma
-            atm_iv = m.loc[m['strike'] == atm_strike, 'iv_final'].iloc[0]
-            log_std = atm_iv * np.sqrt(T)
-            m['log_moneyness'] = np.log(m['strike'] / spot)
-            m = m[(m['log_moneyness'] >= -n_sigma * log_std) & (m['log_moneyness'] <= n_sigma * log_std)]
-
-            # Fjern NaN og ekstreme IV værdier
-            m = m[np.isfinite(m['iv_final'])]
-            m = m[m['iv_final'] < 1.0]
-
-            if not m.empty:
-                tmp = pd.DataFrame({
-                    'x': m['log_moneyness'],
-                    'T': T,
-                    'iv': m['iv_final'].values
-                })
-                rows.append(tmp)
-
-        except Exception as e:
-            if show_debug:
-                st.write(f"⚠️ Skipped {expiry}: {e}")
-            continue
+    rows, skipped = fetch_chains(ticker_obj, expiries, lambda expiry, chain: surface_points(expiry, chain, spot),
+                                 max_workers=max_workers, timeout=timeout, store=CHAIN_STORE,
+                                 max_age=0 if force else None)
 
+    timestamp = dt.datetime.now()
     if rows:
-        timestamp = dt.datetime.now()
-        return pd.concat(rows, ignore_index=True), timestamp
-    return pd.DataFrame(), dt.datetime.now()
+        return pd.concat(rows, ignore_index=True), skipped, timestamp
+    return pd.DataFrame(), skipped, timestamp
+
+@st.cache_resource(ttl=300)
+def get_vol_surface(ticker, n_sigma, iv_cap, min_oi, model, df_timestamp, _df):
+    # Fittes én gang pr. filter-indstilling og datasæt (df_timestamp) – derefter evalueres overfladen blot på gridet
+    return fit_surface(_df, model)
 
 # ========== KURSDATA ==========
 if ticker:
@@ -133,6 +111,7 @@ if ticker:
         st.subheader(f"Aktiekurs for {ticker}")
         st.caption(f"Senest hentet: {data_timestamp.strftime('%Y-%m-%d %H:%M:%S')}")
 
+        data = data.copy()  # den cachede DataFrame deles mellem brugere – ændr ikke i den
         data["SMA50"] = data["Close"].rolling(50).mean()
         data["SMA200"] = data["Close"].rolling(200).mean()
 
@@ -177,29 +156,55 @@ if show_surface and ticker:
 
     # ✅ Slider til hvor bredt strike-interval du vil se
     n_sigma = st.slider("Vælg antal standardafvigelser omkring spot", min_value=1.0, max_value=4.0, value=3.0, step=0.5)
+    iv_cap = st.slider("Maks. implied volatility (outliers fjernes)", min_value=0.5, max_value=3.0, value=1.0, step=0.1)
+    oi_only = st.checkbox("Kun strikes med open interest", value=False)
+    model = st.radio("Surface-model", ["svi", "ssvi"], horizontal=True,
+                     format_func=lambda m: {"svi": "SVI pr. expiry", "ssvi": "SSVI (global)"}[m])
 
     # ✅ Ny checkbox til debug
     show_debug = st.checkbox("🔧 Vis debug-info", value=False)
 
     force_refresh = st.button("🔄 Opdater vol surface-data")
     if force_refresh:
-        st.cache_data.clear()
+        # Kun denne ticker – de nuværende data vises, indtil de nye er hentet
+        DATA_CACHE.refresh(ticker)
+    if DATA_CACHE.is_refreshing(ticker):
+        st.info("🔄 Henter nye data i baggrunden – viser de seneste data imens.")
 
     with st.spinner("⏳ Beregner volatility surface..."):
-        df, df_timestamp = build_vol_surface_df(ticker, spot, expiries, n_sigma=n_sigma, show_debug=show_debug)
+        raw, skipped, df_timestamp = build_vol_surface_df(ticker)
 
     st.caption(f"Volatility surface data hentet: {df_timestamp.strftime('%Y-%m-%d %H:%M:%S')}")
 
-    if df.empty:
+    min_oi = 0 if oi_only else None
+    df = filter_surface_points(raw, n_sigma=n_sigma, iv_cap=iv_cap, min_open_interest=min_oi)
+
+    if show_debug and not skipped.empty:
+        with st.expander(f"⚠️ {len(skipped)} expiries sprunget over"):
+            st.dataframe(skipped)
+    if show_debug:
+        totals, entries = DATA_CACHE.stats()
+        with st.expander(f"🗄️ Cache: {totals['hits']} hits, {totals['stale_hits']} stale, {totals['misses']} misses"):
+            st.dataframe(entries)
+
+    surface = None
+    if not df.empty:
+        try:
+            surface = get_vol_surface(ticker, n_sigma, iv_cap, min_oi, model, df_timestamp, df)
+        except ValueError as e:
+            st.warning(f"Kunne ikke fitte surface: {e}")
+
+    if surface is None:
         st.warning("Kunne ikke beregne volatility surface (for lidt data).")
     else:
-        x_lin = np.linspace(df['x'].min(), df['x'].max(), 80)
-        T_lin = np.linspace(df['T'].min(), df['T'].max(), 60)
+        # Parametrisk overflade – billig at evaluere, så gridet kan være fint
+        x_lin = np.linspace(df['x'].min(), df['x'].max(), 200)
+        T_lin = np.linspace(df['T'].min(), df['T'].max(), 120)
         X, Y = np.meshgrid(x_lin, T_lin)
+        Z = surface.grid(x_lin, T_lin)
 
-        Z_cubic = griddata(df[['x', 'T']].values, df['iv'].values, (X, Y), method='cubic')
-        Z_near = griddata(df[['x', 'T']].values, df['iv'].values, (X, Y), method='nearest')
-        Z = np.where(np.isnan(Z_cubic), Z_near, Z_cubic)
+        if show_debug:
+            st.caption(f"Fit-RMSE (total varians) pr. expiry: {np.round(surface.rmse, 5).tolist()}")
 
         strikes_grid = spot * np.exp(X)
 
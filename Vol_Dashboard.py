@@ -2,48 +2,186 @@ import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
 import threading
 import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+from scipy import stats
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from ibapi.client import EClient
 from ibapi.wrapper import EWrapper
 from ibapi.contract import Contract
 from datetime import datetime
+from ib_pacing import PACER
+from config import CONFIG
+from helpers import allocate_client_id
+from bar_buffer import BarBuffer, parse_ib_date
+from bar_cache import BAR_CACHE
+from iv_regime import RegimeMonitor
+from metrics import METRICS
+from downsample import lttb, thin
 import warnings
 warnings.filterwarnings("ignore", category=UserWarning, module="matplotlib")
 
+QUERY_TIMEOUT = 60  # seconds before an in-flight historical request is given up
+LIVE_DURATION = "2 Y"  # history behind each live subscription (the percentile needs 252 bars)
+MAX_SCATTER_POINTS = 5000  # regression scatters are thinned above this
+MIN_SERIES_POINTS = 200  # LTTB target never drops below this, even for a tiny axes
+
+
+class IBRequestError(Exception):
+
+    def __init__(self, reqId, errorCode, errorString):
+        super().__init__(f"reqId {reqId}: error {errorCode} {errorString}")
+        self.reqId = reqId
+        self.errorCode = errorCode
+        self.errorString = errorString
+
+
 class IBApp(EWrapper, EClient):
 
     def __init__(self):
         EClient.__init__(self, self)
         self.connected = False
         self.historical_data = {}
-
-    def error(self, reqId, errorCode, errorString):
+        self._futures = {}
+        self._updates = {}   # reqId -> callback(reqId, bar) for keepUpToDate subscriptions
+        self._req_lock = threading.Lock()
+        self._next_req_id = 1
+
+    def next_req_id(self):
+        with self._req_lock:
+            req_id = self._next_req_id
+            self._next_req_id += 1
+            return req_id
+
+    def request_historical_data(self, contract, durationStr, barSizeSetting, whatToShow,
+                                endDateTime="", useRTH=1, formatDate=1, keepUpToDate=False, on_update=None):
+        """Send a historical data request and return (reqId, Future).
+
+        The future resolves with a DataFrame of the bars (indexed by date) on historicalDataEnd,
+        or fails with IBRequestError if TWS reports an error for the reqId.
+        With keepUpToDate the subscription stays open after that and every bar update is passed
+        to on_update(reqId, bar) on the API thread, until cancel_request(reqId).
+        """
+        req_id = self.next_req_id()
+        future = Future()
+        with self._req_lock:
+            self._futures[req_id] = future
+            self.historical_data[req_id] = BarBuffer()
+            if keepUpToDate and on_update is not None:
+                self._updates[req_id] = on_update
+        self.reqHistoricalData(
+            reqId=req_id,
+            contract=contract,
+            endDateTime=endDateTime,
+            durationStr=durationStr,
+            barSizeSetting=barSizeSetting,
+            whatToShow=whatToShow,
+            useRTH=useRTH,
+            formatDate=formatDate,
+            keepUpToDate=keepUpToDate,
+            chartOptions=[]
+        )
+        return req_id, future
+
+    def cancel_request(self, reqId):
+        with self._req_lock:
+            future = self._futures.pop(reqId, None)
+            self.historical_data.pop(reqId, None)
+            subscribed = self._updates.pop(reqId, None) is not None
+        if future is not None:
+            future.cancel()
+        if future is not None or subscribed:
+            self.cancelHistoricalData(reqId)
+
+    def error(self, reqId, errorCode, errorString, advancedOrderRejectJson=""):
         if errorCode == 2176 and 'fractional share' in errorString.lower():
             return
         print(f"Error {reqId} {errorCode} {errorString}")
 
+        # 2100-2199 are informational (farm status etc.) and do not end a request
+        if 2100 <= errorCode < 2200:
+            return
+        with self._req_lock:
+            future = self._futures.pop(reqId, None)
+            self.historical_data.pop(reqId, None)
+            self._updates.pop(reqId, None)
+        if future is not None and not future.done():
+            future.set_exception(IBRequestError(reqId, errorCode, errorString))
+
     def nextValidId(self, orderId):
         self.connected = True
         print("Connected to IBTWS")
 
     
     def historicalData(self, reqId, bar):
-        if reqId not in self.historical_data:
-            self.historical_data[reqId] = []
-        self.historical_data[reqId].append({
-            'date': bar.date,
-            'open': bar.open,
-            'close': bar.close,
-            'high': bar.high,
-            'low':bar.low,
-            'volume': bar.volume
-        })
+        # Columnar buffer per reqId; the date is parsed once here on arrival
+        buffer = self.historical_data.get(reqId)
+        if buffer is not None:
+            buffer.append_bar(bar)
 
     def historicalDataEnd(self, reqId, start, end):
         print(f"Historical data has been received for reqId {reqId}")
+        with self._req_lock:
+            future = self._futures.pop(reqId, None)
+            buffer = self.historical_data.pop(reqId, None)
+        if future is not None and not future.done():
+            future.set_result(buffer.to_frame() if buffer is not None else BarBuffer().to_frame())
+
+    def historicalDataUpdate(self, reqId, bar):
+        # keepUpToDate: the last bar is re-sent while it forms, then a new bar starts
+        callback = self._updates.get(reqId)
+        if callback is not None:
+            callback(reqId, bar)
+
+
+@METRICS.timed('analytics_forward_vol_regression')
+def forward_vol_regression(volatility_data, horizon=30):
+    """
+    Forward vs. current iVol regressions behind the Analyze button (no plotting).
+    Returns None with fewer than 30 usable rows, otherwise a dict with the analysis frame,
+    the overall fits, the regime split and the per-regime fits (None below 11 points).
+    """
+    vol_forward = volatility_data['implied_vol'].rolling(window=horizon, min_periods=1).mean().shift(-horizon)
+
+    analysis_df = pd.DataFrame({
+        'current_vol': volatility_data['implied_vol'],
+        'forward_30d_vol': vol_forward,
+        'vol_diff': vol_forward - volatility_data['implied_vol'],
+        'vol_percentile': volatility_data['iv_percentile']
+    }).dropna()
+
+    if len(analysis_df) < 30:
+        return None
+
+    fit_forward = stats.linregress(analysis_df['current_vol'], analysis_df['forward_30d_vol'])
+    fit_diff = stats.linregress(analysis_df['current_vol'], analysis_df['vol_diff'])
+
+    if fit_forward.slope != 1:
+        intersection_x = fit_forward.intercept / (1 - fit_forward.slope)
+    else:
+        intersection_x = analysis_df['current_vol'].median()
+
+    high_vol_regime = analysis_df['current_vol'] > intersection_x
+    low_vol_regime = analysis_df['current_vol'] <= intersection_x
+
+    def regime_fit(mask):
+        if mask.sum() <= 10:
+            return None
+        return stats.linregress(analysis_df.loc[mask, 'current_vol'], analysis_df.loc[mask, 'vol_diff'])
+
+    return {
+        'analysis_df': analysis_df,
+        'fit_forward': fit_forward,
+        'fit_diff': fit_diff,
+        'intersection_x': intersection_x,
+        'high_vol_regime': high_vol_regime,
+        'low_vol_regime': low_vol_regime,
+        'fit_high': regime_fit(high_vol_regime),
+        'fit_low': regime_fit(low_vol_regime),
+    }
 
 
 class ImpliedVolatilityDashboard:
@@ -58,6 +196,13 @@ class ImpliedVolatilityDashboard:
         self.option_data = None
         self.volatility_data = None
         self.current_implied_vol = None
+        self.equity_data = None
+        self.current_symbol = None
+
+        # Rolling 252-day IV percentile per symbol, updated in O(log n) per bar
+        self.regime_monitor = RegimeMonitor(on_change=self._on_regime_change)
+        self._live_subs = {}      # symbol -> reqId of the keepUpToDate subscription
+        self._live_pending = {}   # symbol -> bar updates received before the history was seeded
 
         self.ib_app = IBApp()
         self.connected = False
@@ -88,11 +233,11 @@ class ImpliedVolatilityDashboard:
         conn_frame.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
 
         ttk.Label(conn_frame, text="Host:").grid(row=0,column=0, padx=(0, 5))
-        self.host_var = tk.StringVar(value="127.0.0.1")
+        self.host_var = tk.StringVar(value=CONFIG["host"])
         ttk.Entry(conn_frame, textvariable=self.host_var, width=15).grid(row=0, column=1, padx=(0, 10))
 
         ttk.Label(conn_frame, text="Port:").grid(row=0,column=2, padx=(0, 5))
-        self.port_var = tk.StringVar(value="7497")
+        self.port_var = tk.StringVar(value=str(CONFIG["port"]))
         ttk.Entry(conn_frame, textvariable=self.port_var, width=10).grid(row=0, column=3, padx=(0, 10))
 
         self.connect_btn = ttk.Button(conn_frame, text="Connect", command = self.connect_ib)
@@ -119,6 +264,13 @@ class ImpliedVolatilityDashboard:
         self.analyze_btn = ttk.Button(data_frame, text="Analyze Implied Vol", command = self.analyze_volatility, state="disabled")
         self.analyze_btn.grid(row=0, column=5, padx=(0, 10))
 
+        ttk.Label(data_frame, text="Watchlist:").grid(row=1, column=0, padx=(0, 5), pady=(5, 0))
+        self.watchlist_var = tk.StringVar(value="SPY, QQQ, IWM")
+        ttk.Entry(data_frame, textvariable=self.watchlist_var, width=40).grid(row=1, column=1, columnspan=3, sticky=tk.W, pady=(5, 0))
+
+        self.live_btn = ttk.Button(data_frame, text="Start Live", command = self.toggle_live, state="disabled")
+        self.live_btn.grid(row=1, column=4, padx=(0, 10), pady=(5, 0))
+
         # Vol frame
         vol_frame = ttk.LabelFrame(main_frame, text="Current Implied Volatility", padding="5")
         vol_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
@@ -166,6 +318,70 @@ class ImpliedVolatilityDashboard:
         self.fig, (self.ax1, self.ax2, self.ax3) = plt.subplots(1, 3, figsize=(18, 6))
         self.canvas = FigureCanvasTkAgg(self.fig, plot_frame)
         self.canvas.get_tk_widget().grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.setup_plots()
+
+    def setup_plots(self):
+        """Create every artist once; analyze/live updates only swap their data."""
+        self._iv_series = None    # (date numbers, values) behind the downsampled ax3 line
+        self._plotted_symbol = None
+        self._background = None   # figure pixels without the animated artists (for blitting)
+
+        self.fwd_scatter = self.ax1.scatter([], [], alpha=.6, s=20)
+        self.fwd_fit_line, = self.ax1.plot([], [], 'r-', linewidth=2)
+        self.no_change_line, = self.ax1.plot([], [], 'k--', linewidth=1, alpha=.7, label='y=x (No Change)')
+        self.ax1.set_xlabel("Current Implied Volatility")
+        self.ax1.set_ylabel("30-Day Forward Average iVOL")
+        self.ax1.grid(True, alpha=.3)
+
+        self.high_scatter = self.ax2.scatter([], [], alpha=.6, s=20, color='red', label='High Vol Regime')
+        self.low_scatter = self.ax2.scatter([], [], alpha=.6, s=20, color='blue', label='Low Vol Regime')
+        self.high_fit_line, = self.ax2.plot([], [], 'r-', linewidth=2)
+        self.low_fit_line, = self.ax2.plot([], [], 'r-', linewidth=2)
+        self.zero_line = self.ax2.axhline(y=0, color='k', linestyle='--', linewidth=1, alpha=.7,
+                                          label='No Change (y=0)')
+        self.split_line = self.ax2.axvline(x=0, color='g', linestyle=':', linewidth=1, alpha=.7)
+        self.ax2.set_xlabel("Current Implied Volatility")
+        self.ax2.set_ylabel("Vol Difference (Forward - Current)")
+        self.ax2.set_title("Vol Difference vs Current Vol (Regime Analysis)")
+        self.ax2.grid(True, alpha=.3)
+
+        self.ax3.xaxis_date()
+        self.iv_line, = self.ax3.plot([], [], label="Implied Volatility", linewidth=1)
+        self.p75_line = self.ax3.axhline(y=0, color='red', linestyle='--', alpha=.7, label='75th Percentile')
+        self.p25_line = self.ax3.axhline(y=0, color='green', linestyle='--', alpha=.7, label='25th Percentile')
+        self.mean_line = self.ax3.axhline(y=0, color='black', linestyle='--', alpha=.7, label='Mean')
+        # Animated: redrawn on its own by blitting when live bars move it
+        self.current_marker = self.ax3.scatter([], [], color='red', s=100, zorder=5, label='Current iVOL',
+                                               animated=True)
+        self.ax3.set_xlabel('Date')
+        self.ax3.set_ylabel('Implied Volatility')
+        self.ax3.set_title("Implied Volatility Time Series with Regime Bands")
+        self.ax3.grid(True, alpha=.3)
+        self.ax3.tick_params(axis='x', rotation=45)
+
+        for artist in (self.zero_line, self.split_line, self.p75_line, self.p25_line, self.mean_line):
+            artist.set_visible(False)
+        self.fig.tight_layout()
+        self.canvas.mpl_connect('draw_event', self._on_canvas_draw)
+        self.canvas.mpl_connect('resize_event', self._on_canvas_resize)
+
+    def _on_canvas_draw(self, event):
+        self._background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self.ax3.draw_artist(self.current_marker)
+
+    def _on_canvas_resize(self, event):
+        # The LTTB target follows the axes width in pixels
+        if self._iv_series is not None:
+            self._set_iv_line(*self._iv_series)
+
+    def _blit(self):
+        """Redraw only the animated artists on top of the cached background."""
+        if self._background is None:
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self._background)
+        self.ax3.draw_artist(self.current_marker)
+        self.canvas.blit(self.ax3.bbox)
 
     def log_message(self, message):
         timestamp = datetime.now().strftime('%H:%M:%S')
@@ -178,11 +394,13 @@ class ImpliedVolatilityDashboard:
             host = self.host_var.get()
             port = int(self.port_var.get())
 
-            self.log_message(f"Connecting to IB at {host}:{port}")
+            # Reserve a clientId so this dashboard can run next to the other scripts
+            client_id = allocate_client_id()
+            self.log_message(f"Connecting to IB at {host}:{port} (clientId {client_id})")
 
             def connect_thread():
                 try:
-                    self.ib_app.connect(host, port, 0)
+                    self.ib_app.connect(host, port, client_id)
                     self.ib_app.run()
                 except Exception as e:
                     self.log_message(f"Connection error: {e}")
@@ -200,6 +418,7 @@ class ImpliedVolatilityDashboard:
                 self.connect_btn.config(state='disabled')
                 self.disconnect_btn.config(state='normal')
                 self.query_btn.config(state='normal')
+                self.live_btn.config(state='normal')
                 self.log_message("Successfully connected to IBTWS")
             else:
                 self.log_message("Failed to connect to IBTWS")
@@ -209,12 +428,14 @@ class ImpliedVolatilityDashboard:
 
     def disconnect_ib(self):
         try:
+            self.stop_live()
             self.ib_app.disconnect()
             self.connected = False
             self.connect_btn.config(state='normal')
             self.disconnect_btn.config(state='disabled')
             self.query_btn.config(state='disabled')
             self.analyze_btn.config(state='disabled')
+            self.live_btn.config(state='disabled')
 
             self.current_implied_vol = None
             self.update_current_vol_display()
@@ -228,58 +449,71 @@ class ImpliedVolatilityDashboard:
     def query_data(self):
         if not self.connected:
             messagebox.showerror("Error", "Not connected to IBTWS")
+            return
 
         symbol = self.symbol_var.get().upper()
         duration = self.duration_var.get()
 
         self.log_message(f"Querying Implied Volatility for {symbol}...")
 
-        self.ib_app.historical_data.clear()    
+        # The request runs on a worker thread so the GUI stays responsive;
+        # several queries may be in flight at once
+        threading.Thread(target=self._query_worker, args=(symbol, duration), daemon=True).start()
 
+    def _query_worker(self, symbol, duration):
         contract = self.create_equity_contract(symbol)
+        req_id = None
+        now = datetime.now()
+        # Only request the bars missing from the local cache (e.g. "3 D" instead of "2 Y")
+        cached, request = BAR_CACHE.plan(contract, duration, "1 day", "OPTION_IMPLIED_VOLATILITY", now=now)
+        if request != duration:
+            self.root.after(0, self.log_message,
+                            f"{len(cached)} cached iVol bars for {symbol} - requesting last {request}")
+        try:
+            # Pacing: wait for our turn and hold the slot until the request has completed
+            with PACER.slot(contract, "OPTION_IMPLIED_VOLATILITY", request, "1 day"):
+                req_id, future = self.ib_app.request_historical_data(
+                    contract, request, "1 day", "OPTION_IMPLIED_VOLATILITY"
+                )
+                data = future.result(timeout=QUERY_TIMEOUT)
+        except FutureTimeout:
+            self.ib_app.cancel_request(req_id)
+            self.root.after(0, self.log_message, f"No iVol Data Received for {symbol} - request timed out")
+            return
+        except IBRequestError as e:
+            self.root.after(0, self.log_message, f"No iVol Data Received for {symbol} - {e.errorString}")
+            return
 
-        self.ib_app.reqHistoricalData(
-            reqId = 1,
-            contract = contract,
-            endDateTime="",
-            durationStr=duration,
-            barSizeSetting="1 day",
-            whatToShow="OPTION_IMPLIED_VOLATILITY",
-            useRTH=1,
-            formatDate=1,
-            keepUpToDate=False,
-            chartOptions=[]
-        )
-
-        timeout = 15
-        start_time = time.time()
+        merged = BAR_CACHE.update(contract, request, "1 day", "OPTION_IMPLIED_VOLATILITY", data, now=now)
+        data = BAR_CACHE.window(merged, duration, now)
 
-        while 1 not in self.ib_app.historical_data and (time.time() - start_time) < timeout:
-            time.sleep(.1)
+        equity_data = None
+        if len(data) > 0:
+            equity_data = data.copy()
+            equity_data['implied_vol'] = equity_data['close']
 
-        if 1 in self.ib_app.historical_data:
-            data = self.ib_app.historical_data[1]
-            if len(data) > 0:
-                self.equity_data = pd.DataFrame(data)
-                self.equity_data['date'] = pd.to_datetime(self.equity_data['date'])
-                self.equity_data.set_index('date', inplace=True)
+        # Tk widgets may only be touched from the main thread
+        self.root.after(0, self._on_query_result, symbol, equity_data)
 
-                self.equity_data['implied_vol'] = self.equity_data['close']
+        pacing = PACER.metrics()
+        if pacing['paced']:
+            self.root.after(0, self.log_message,
+                            f"Pacing: {pacing['paced']} requests delayed, max wait {pacing['wait_max']:.1f}s")
 
-                self.log_message(f"Received {len(self.equity_data)} implied vol points for {symbol}")
-                self.log_message(f"Date range: {self.equity_data.index.min()} to {self.equity_data.index.max()}")
-                self.log_message("Note: All iVol Values are Annualized")
+    def _on_query_result(self, symbol, equity_data):
+        if equity_data is None:
+            self.log_message(f"No iVol Data Received for {symbol} - May Not Be Available for Symbol")
+            return
 
-                self.process_implied_volatility()
+        self.equity_data = equity_data
+        self.current_symbol = symbol
+        self.log_message(f"Received {len(self.equity_data)} implied vol points for {symbol}")
+        self.log_message(f"Date range: {self.equity_data.index.min()} to {self.equity_data.index.max()}")
+        self.log_message("Note: All iVol Values are Annualized")
 
-                self.analyze_btn.config(state="normal")
-            else:
-                self.log_message("No iVol Data Received")
-                self.equity_data = None
-        else:
-            self.log_message("No iVol Data Received - May Not Be Available for Symbol")
-            self.equity_data = None
+        self.process_implied_volatility()
 
+        self.analyze_btn.config(state="normal")
 
     def process_implied_volatility(self):
         if self.equity_data is None:
@@ -290,7 +524,10 @@ class ImpliedVolatilityDashboard:
 
         self.equity_data['implied_vol'] = self.equity_data['close']*np.sqrt(self.vol_annualization)
 
-        self.equity_data['iv_percentile'] = self.equity_data['implied_vol'].rolling(window=252).rank(pct=True)
+        # Seeds the streaming percentile for this symbol; same values as rolling(252).rank(pct=True)
+        self.equity_data['iv_percentile'] = self.regime_monitor.seed(
+            self.current_symbol, self.equity_data['implied_vol'].tolist(), self.equity_data.index
+        )
 
         self.current_implied_vol = self.equity_data['implied_vol'].iloc[-1] if len(self.equity_data) > 0 else None
 
@@ -341,7 +578,7 @@ class ImpliedVolatilityDashboard:
         if self.volatility_data is None or self.current_implied_vol is None:
             return
         
-        current_percentile = self.volatility_data['iv_percentile'].iloc[-1]
+        current_percentile = self.regime_monitor.percentile(self.current_symbol)
 
         if current_percentile > .8:
             regime = "HIGH iVOL"
@@ -375,6 +612,98 @@ class ImpliedVolatilityDashboard:
         self.reversion_label.config(text=reversion, foreground=rcolor)
 
 
+    def toggle_live(self):
+        if self._live_subs or self._live_pending:
+            self.stop_live()
+            return
+
+        symbols = [s.strip().upper() for s in self.watchlist_var.get().replace(";", ",").split(",") if s.strip()]
+        if not symbols:
+            return
+        self.live_btn.config(text="Stop Live")
+        self.log_message(f"Starting live iVol regime monitor for {len(symbols)} symbols")
+        for symbol in symbols:
+            self._live_pending[symbol] = []
+            threading.Thread(target=self._live_worker, args=(symbol,), daemon=True).start()
+
+    def stop_live(self):
+        for symbol, req_id in list(self._live_subs.items()):
+            self.ib_app.cancel_request(req_id)
+        if self._live_subs:
+            self.log_message(f"Stopped live updates for {len(self._live_subs)} symbols")
+        self._live_subs.clear()
+        self._live_pending.clear()
+        self.live_btn.config(text="Start Live")
+
+    def _live_worker(self, symbol):
+        contract = self.create_equity_contract(symbol)
+        now = datetime.now()
+        # History comes from the bar cache; the subscription only backfills the gap
+        _, request = BAR_CACHE.plan(contract, LIVE_DURATION, "1 day", "OPTION_IMPLIED_VOLATILITY", now=now)
+        req_id = None
+        try:
+            with PACER.slot(contract, "OPTION_IMPLIED_VOLATILITY", request, "1 day"):
+                req_id, future = self.ib_app.request_historical_data(
+                    contract, request, "1 day", "OPTION_IMPLIED_VOLATILITY", keepUpToDate=True,
+                    on_update=lambda _, bar: self.root.after(0, self._on_live_bar, symbol, bar)
+                )
+                data = future.result(timeout=QUERY_TIMEOUT)
+        except (FutureTimeout, IBRequestError) as e:
+            if req_id is not None:
+                self.ib_app.cancel_request(req_id)
+            reason = "request timed out" if isinstance(e, FutureTimeout) else e.errorString
+            self.root.after(0, self._on_live_failed, symbol, reason)
+            return
+
+        merged = BAR_CACHE.update(contract, request, "1 day", "OPTION_IMPLIED_VOLATILITY", data, now=now)
+        history = BAR_CACHE.window(merged, LIVE_DURATION, now)
+        self.root.after(0, self._on_live_seeded, symbol, req_id, history)
+
+    def _on_live_failed(self, symbol, reason):
+        self._live_pending.pop(symbol, None)
+        self.log_message(f"Live iVol for {symbol} failed - {reason}")
+        if not self._live_subs and not self._live_pending:
+            self.live_btn.config(text="Start Live")
+
+    def _on_live_seeded(self, symbol, req_id, history):
+        pending = self._live_pending.pop(symbol, None)
+        if pending is None:
+            # Live mode was stopped while the history was loading
+            self.ib_app.cancel_request(req_id)
+            return
+        self._live_subs[symbol] = req_id
+
+        iv = history['close'] * np.sqrt(self.vol_annualization)
+        self.regime_monitor.seed(symbol, iv.tolist(), history.index)
+        regime = self.regime_monitor.regime(symbol) or "N/A (under 252 bars)"
+        self.log_message(f"Live {symbol}: {len(history)} bars, regime {regime}")
+        for bar in pending:
+            self._on_live_bar(symbol, bar)
+
+    def _on_live_bar(self, symbol, bar):
+        if symbol in self._live_pending:
+            self._live_pending[symbol].append(bar)
+            return
+        if symbol not in self._live_subs:
+            return
+
+        date = pd.Timestamp(parse_ib_date(bar.date), unit="s")
+        implied_vol = bar.close * np.sqrt(self.vol_annualization)
+        # O(log n) percentile update; _on_regime_change fires only if the bucket changes
+        percentile, _ = self.regime_monitor.update(symbol, date, implied_vol)
+
+        if symbol == self.current_symbol:
+            self.current_implied_vol = implied_vol
+            self.current_vol_label.config(text=f"{implied_vol*100:.2f}%")
+            self._update_current_marker(date, implied_vol)
+            if percentile == percentile:
+                self.percentile_label.config(text=f"{percentile:.1%}")
+
+    def _on_regime_change(self, symbol, regime, color, percentile):
+        self.log_message(f"Regime change {symbol}: {regime} ({percentile:.1%})")
+        if symbol == self.current_symbol:
+            self.update_regime_analysis()
+
     def analyze_volatility(self):
 
         if self.equity_data is None or self.volatility_data is None:
@@ -383,130 +712,113 @@ class ImpliedVolatilityDashboard:
         
         self.log_message("Analyzing iVOL Data")
 
-        vol_forward_30d = self.volatility_data['implied_vol'].rolling(window=30, min_periods=1).mean().shift(-30)
-
-        analysis_df = pd.DataFrame({
-            'current_vol': self.volatility_data['implied_vol'],
-            'forward_30d_vol': vol_forward_30d,
-            'vol_diff': vol_forward_30d - self.volatility_data['implied_vol'],
-            'vol_percentile': self.volatility_data['iv_percentile']
-        })
-
-        analysis_df = analysis_df.dropna()
-
-        if len(analysis_df) < 30:
+        result = forward_vol_regression(self.volatility_data)
+        if result is None:
             self.log_message("Insufficient iVOL Data for Analysis")
             return
 
-        from scipy import stats
-
-        slope1, intercept1, r_value1, p_value1, std_error1 = stats.linregress(
-            analysis_df['current_vol'], analysis_df['forward_30d_vol']
-        )
-
-        slope2, intercept2, r_value2, p_value2, std_error2 = stats.linregress(
-            analysis_df['current_vol'], analysis_df['vol_diff']
-        )
-
-        if slope1 != 1:
-            intersection_x = intercept1 / (1-slope1)
-        else:
-            intersection_x = analysis_df['current_vol'].median()
-        
-        high_vol_regime = analysis_df['current_vol'] > intersection_x
-        low_vol_regime = analysis_df['current_vol'] <= intersection_x
-
-        if high_vol_regime.sum() > 10:
-            slope_high, intercept_high, r_high, p_high, std_error_high = stats.linregress(
-                analysis_df.loc[high_vol_regime, 'current_vol'], analysis_df.loc[high_vol_regime, 'vol_diff']
-            )
-        else:
-            slope_high = intercept_high = r_high = p_high = std_error_high = None
-
-        if low_vol_regime.sum() > 10:
-            slope_low, intercept_low, r_low, p_low, std_error_low = stats.linregress(
-                analysis_df.loc[low_vol_regime, 'current_vol'], analysis_df.loc[low_vol_regime, 'vol_diff']
-            )
-        else:
-            slope_low = intercept_low = r_low = p_low = std_error_low = None
-
-        self.ax1.clear()
-        self.ax2.clear()
-        self.ax3.clear()
+        analysis_df = result['analysis_df']
+        intersection_x = result['intersection_x']
+        high_vol_regime, low_vol_regime = result['high_vol_regime'], result['low_vol_regime']
+        slope1, intercept1, r_value1, p_value1, std_error1 = result['fit_forward']
+        slope2, intercept2, r_value2, p_value2, std_error2 = result['fit_diff']
+        slope_high, intercept_high, r_high, p_high, std_error_high = result['fit_high'] or (None,) * 5
+        slope_low, intercept_low, r_low, p_low, std_error_low = result['fit_low'] or (None,) * 5
 
-        self.ax1.scatter(analysis_df['current_vol'], analysis_df['forward_30d_vol'], alpha=.6, s=20)
+        current_vol = analysis_df['current_vol'].to_numpy()
+        forward_vol = analysis_df['forward_30d_vol'].to_numpy()
+        vol_diff = analysis_df['vol_diff'].to_numpy()
 
-        x_range = np.linspace(analysis_df['current_vol'].min(), analysis_df['current_vol'].max(), 100)
-        y_pred1 = slope1 * x_range + intercept1
+        idx = thin(len(current_vol), MAX_SCATTER_POINTS)
+        self.fwd_scatter.set_offsets(np.column_stack([current_vol[idx], forward_vol[idx]]))
 
-        self.ax1.plot(x_range, y_pred1, 'r-', linewidth=2, label=f"Regression R^2 = {r_value1**2:.3f}")
+        x_range = np.linspace(current_vol.min(), current_vol.max(), 100)
+        self.fwd_fit_line.set_data(x_range, slope1 * x_range + intercept1)
+        self.fwd_fit_line.set_label(f"Regression R^2 = {r_value1**2:.3f}")
 
-        min_val = min(analysis_df['current_vol'].min(), analysis_df['forward_30d_vol'].min())
-        max_val = max(analysis_df['current_vol'].max(), analysis_df['forward_30d_vol'].max())
-        self.ax1.plot([min_val, max_val], [min_val, max_val], 'k--', linewidth=1, alpha=.7, label='y=x (No Change)')
+        min_val = min(current_vol.min(), forward_vol.min())
+        max_val = max(current_vol.max(), forward_vol.max())
+        self.no_change_line.set_data([min_val, max_val], [min_val, max_val])
 
-        self.ax1.set_xlabel("Current Implied Volatility")
-        self.ax1.set_ylabel("30-Day Forward Average iVOL")
         self.ax1.set_title(f"Forward iVOL vs Current iVOL \n y = {slope1:.3f}x + {intercept1:.3f}, R^2 = {r_value1**2:.3f}")
+        self._set_limits(self.ax1, current_vol, np.concatenate([forward_vol, [min_val, max_val]]))
         self.ax1.legend()
-        self.ax1.grid(True, alpha=.3)
 
-        self.ax2.scatter(analysis_df.loc[high_vol_regime, 'current_vol'], 
-                         analysis_df.loc[high_vol_regime, 'vol_diff'],
-                         alpha=.6, s=20, color='red', label='High Vol Regime')
-        self.ax2.scatter(analysis_df.loc[low_vol_regime, 'current_vol'], 
-                         analysis_df.loc[low_vol_regime, 'vol_diff'],
-                         alpha=.6, s=20, color='blue', label='Low Vol Regime')
-        
-        if slope_high is not None:
-            x_high = analysis_df.loc[high_vol_regime, 'current_vol']
-            if len(x_high) > 0:
-                x_range_high = np.linspace(x_high.min(), x_high.max(), 100)
-                y_pred_high = slope_high * x_range_high + intercept_high
-                self.ax2.plot(x_range_high, y_pred_high, 'r-', linewidth=2,
-                              label=f"High Vol R^2 = {r_high**2:.3f}")
-                
-        if slope_low is not None:
-            x_low = analysis_df.loc[low_vol_regime, 'current_vol']
-            if len(x_high) > 0:
-                x_range_low = np.linspace(x_low.min(), x_low.max(), 100)
-                y_pred_low = slope_low * x_range_low + intercept_low
-                self.ax2.plot(x_range_low, y_pred_low, 'r-', linewidth=2,
-                              label=f"Low Vol R^2 = {r_low**2:.3f}")
-                
-        self.ax2.axhline(y = 0, color='k', linestyle='--', linewidth=1, alpha=.7, label='No Change (y=0)')
-        self.ax2.axvline(x = intersection_x, color='g', linestyle=':', linewidth=1, alpha=.7,
-                         label=f"Regime Split (Vol={intersection_x:.3f})")
-        
-        self.ax2.set_xlabel("Current Implied Volatility")
-        self.ax2.set_ylabel("Vol Difference (Forward - Current)")
-        self.ax2.set_title("Vol Difference vs Current Vol (Regime Analysis)")
+        high, low = high_vol_regime.to_numpy(), low_vol_regime.to_numpy()
+        for scatter, mask in ((self.high_scatter, high), (self.low_scatter, low)):
+            x, y = current_vol[mask], vol_diff[mask]
+            idx = thin(len(x), MAX_SCATTER_POINTS)
+            scatter.set_offsets(np.column_stack([x[idx], y[idx]]))
+
+        for line, mask, slope, intercept, r, name in (
+                (self.high_fit_line, high, slope_high, intercept_high, r_high, "High Vol"),
+                (self.low_fit_line, low, slope_low, intercept_low, r_low, "Low Vol")):
+            x = current_vol[mask]
+            if slope is not None and len(x) > 0:
+                x_range = np.linspace(x.min(), x.max(), 100)
+                line.set_data(x_range, slope * x_range + intercept)
+                line.set_label(f"{name} R^2 = {r**2:.3f}")
+                line.set_visible(True)
+            else:
+                line.set_data([], [])
+                line.set_label(f"_{name}")   # leading underscore: left out of the legend
+                line.set_visible(False)
+
+        self.split_line.set_xdata([intersection_x, intersection_x])
+        self.split_line.set_label(f"Regime Split (Vol={intersection_x:.3f})")
+        self.zero_line.set_visible(True)
+        self.split_line.set_visible(True)
+        self._set_limits(self.ax2, current_vol, np.concatenate([vol_diff, [0.0]]))
         self.ax2.legend()
-        self.ax2.grid(True, alpha=.3)
 
-        self.ax3.plot(self.volatility_data.index, self.volatility_data['implied_vol'],
-                      label="Implied Volatility", linewidth=1)
-        
-        vol_75th = self.volatility_data['implied_vol'].quantile(.75)
-        vol_25th = self.volatility_data['implied_vol'].quantile(.25)
+        iv = self.volatility_data['implied_vol'].dropna()
+        self._set_iv_line(mdates.date2num(iv.index), iv.to_numpy())
+        for line, level in ((self.p75_line, iv.quantile(.75)), (self.p25_line, iv.quantile(.25)),
+                            (self.mean_line, iv.mean())):
+            line.set_ydata([level, level])
+            line.set_visible(True)
 
-        self.ax3.axhline(y=vol_75th, color='red', linestyle='--', alpha=.7, label='75th Percentile')
-        self.ax3.axhline(y=vol_25th, color='green', linestyle='--', alpha=.7, label='25th Percentile')
-        self.ax3.axhline(y=self.volatility_data['implied_vol'].mean(), color='black', linestyle='--', alpha=.7, label='Mean')
-    
         if self.current_implied_vol is not None:
-            self.ax3.scatter(self.volatility_data.index[-1], self.current_implied_vol,
-                             color='red', s=100, zorder=5, label='Current iVOL')
-        
-        self.ax3.set_xlabel('Date')
-        self.ax3.set_ylabel('Implied Volatility')
-        self.ax3.set_title("Implied Volatility Time Series with Regime Bands")
+            self.current_marker.set_offsets([[mdates.date2num(iv.index[-1]), self.current_implied_vol]])
+        else:
+            self.current_marker.set_offsets(np.empty((0, 2)))
+        # A live bar outside the view sets explicit limits (autoscale off) - turn it back on
+        self.ax3.set_autoscale_on(True)
+        self.ax3.relim()
+        self.ax3.autoscale_view()
         self.ax3.legend()
-        self.ax3.grid(True, alpha=.3)
-        self.ax3.tick_params(axis='x', rotation=45)
 
+        self._plotted_symbol = self.current_symbol
         self.fig.tight_layout()
-        self.canvas.draw()
+        self.canvas.draw_idle()
+
+    @staticmethod
+    def _set_limits(ax, x, y, margin=.05):
+        # Collections (scatters) are not part of relim(), so the limits are set from the data
+        for setter, values in ((ax.set_xlim, x), (ax.set_ylim, y)):
+            lo, hi = np.nanmin(values), np.nanmax(values)
+            pad = (hi - lo) * margin or abs(hi) * margin or 1e-3
+            setter(lo - pad, hi + pad)
+
+    def _set_iv_line(self, dates, values):
+        """Plot the iVol series downsampled (LTTB) to about one point per pixel of the axes."""
+        self._iv_series = (dates, values)
+        idx = lttb(dates, values, max(int(self.ax3.bbox.width), MIN_SERIES_POINTS))
+        self.iv_line.set_data(dates[idx], values[idx])
+
+    def _update_current_marker(self, date, implied_vol):
+        """Move the 'Current iVOL' marker for a live bar; blit unless it falls outside the view."""
+        if self._iv_series is None or self._plotted_symbol != self.current_symbol:
+            return
+        x = mdates.date2num(date)
+        self.current_marker.set_offsets([[x, implied_vol]])
+        (x0, x1), (y0, y1) = self.ax3.get_xlim(), self.ax3.get_ylim()
+        if x0 <= x <= x1 and y0 <= implied_vol <= y1:
+            self._blit()
+            return
+        self.ax3.set_xlim(min(x0, x), max(x1, x))
+        self.ax3.set_ylim(min(y0, implied_vol), max(y1, implied_vol))
+        self.canvas.draw_idle()
 
 
 def main():
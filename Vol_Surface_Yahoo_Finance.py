@@ -3,8 +3,9 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
-import datetime as dt
-from scipy.interpolate import griddata
+from yahoo_chains import fetch_chains, merge_calls_puts, time_to_expiry, MAX_WORKERS, EXPIRY_TIMEOUT
+from chain_store import ChainStore
+from svi_surface import fit_surface
 
 # ----- 1) Vælg ticker -----
 ticker_symbol = "NVDA"   # <-- ændr ticker her
@@ -13,79 +14,54 @@ ticker = yf.Ticker(ticker_symbol)
 spot = float(ticker.history(period="1d")["Close"].iloc[-1])
 expiries = ticker.options
 
-rows = []
-
-for expiry in expiries:
-    try:
-        chain = ticker.option_chain(expiry)
-        calls = chain.calls.copy()
-        puts  = chain.puts.copy()
-
-        # Tid til udløb i år
-        ed = dt.datetime.strptime(expiry, "%Y-%m-%d")
-        T = (ed - dt.datetime.today()).days / 365
-        if T <= 0: 
-            continue
-
-        # Merge calls/puts på strike
-        m = pd.merge(
-            calls[['strike','impliedVolatility','openInterest']],
-            puts [['strike','impliedVolatility','openInterest']],
-            on='strike', how='inner', suffixes=('_call','_put')
-        )
-
-        # ATM strike
-        atm_strike = m.loc[(m['strike']-spot).abs().idxmin(), 'strike']
-
-        # Vælg IV: puts under spot, calls over spot, ATM = gennemsnit
-        m['iv_final'] = np.nan
-        m.loc[m['strike'] <  spot, 'iv_final'] = m.loc[m['strike'] <  spot, 'impliedVolatility_put']
-        m.loc[m['strike'] >  spot, 'iv_final'] = m.loc[m['strike'] >  spot, 'impliedVolatility_call']
-        m.loc[m['strike'] == atm_strike, 'iv_final'] = m.loc[
-            m['strike'] == atm_strike, ['impliedVolatility_call','impliedVolatility_put']
-        ].mean(axis=1)
-
-        # ATM-IV til filter
-        atm_iv = m.loc[m['strike'] == atm_strike, 'iv_final'].iloc[0]
-
-        sigma_exp = atm_iv * np.sqrt(T)
-        lower = spot * (1 - 2 * sigma_exp)
-        upper = spot * (1 + 2 * sigma_exp)
-
-        # Filtrér strikes og outliers
-        m = m[(m['strike'] >= lower) & (m['strike'] <= upper)]
-        m = m[(m['openInterest_call'] + m['openInterest_put']) > 0]
-        m = m[np.isfinite(m['iv_final'])]
-        m = m[m['iv_final'] < 1.0]  # fjern IV > 100% som outliers
-
-        if m.empty:
-            continue
-
-        # Gem data
-        tmp = pd.DataFrame({
-            'x': np.log(m['strike'] / spot),  # log-moneyness
-            'T': T,
-            'iv': m['iv_final'].values
-        })
-        rows.append(tmp)
-
-    except Exception as e:
-        print(f"Skip {expiry}: {e}")
-
-# ----- 2) Saml & Interpolér -----
-df = pd.concat(rows, ignore_index=True)
+def process(expiry, chain):
+    # Tid til udløb i år
+    T = time_to_expiry(expiry)
+
+    # Merge calls/puts på strike – puts under spot, calls over spot, ATM = gennemsnit
+    m = merge_calls_puts(chain.calls, chain.puts, spot)
+    if m.empty:
+        return None
+
+    # ATM-IV til filter
+    sigma_exp = m['atm_iv'].iloc[0] * np.sqrt(T)
+    lower = spot * (1 - 2 * sigma_exp)
+    upper = spot * (1 + 2 * sigma_exp)
+
+    # Filtrér strikes og outliers
+    m = m[(m['strike'] >= lower) & (m['strike'] <= upper)]
+    m = m[(m['openInterest_call'] + m['openInterest_put']) > 0]
+    m = m[np.isfinite(m['iv_final'])]
+    m = m[m['iv_final'] < 1.0]  # fjern IV > 100% som outliers
+
+    # Gem data
+    return pd.DataFrame({
+        'x': m['log_moneyness'],  # log-moneyness
+        'T': T,
+        'iv': m['iv_final'].values
+    })
+
+# Alle expiries hentes parallelt og behandles, efterhånden som de ankommer
+# (friske snapshots fra disk genbruges, nye downloads gemmes)
+rows, skipped = fetch_chains(ticker, expiries, process, max_workers=MAX_WORKERS, timeout=EXPIRY_TIMEOUT,
+                             store=ChainStore())
+for _, skip in skipped.iterrows():
+    print(f"Skip {skip['expiry']}: {skip['reason']} {skip['detail']}")
+
+# ----- 2) Saml & Fit SVI -----
+df = pd.concat(rows, ignore_index=True) if rows else pd.DataFrame()
 if df.empty:
     raise SystemExit("Ingen data tilbage efter filtrering")
 
-# Definér grid
-x_lin = np.linspace(df['x'].min(), df['x'].max(), 80)
-T_lin = np.linspace(df['T'].min(), df['T'].max(), 60)
-X, Y = np.meshgrid(x_lin, T_lin)
+# SVI-slice pr. expiry (fit_surface(df, 'ssvi') giver en global SSVI)
+surface = fit_surface(df, 'svi')
+print(f"SVI fit: {len(surface.T)} expiries, gns. RMSE (total varians) {surface.rmse.mean():.2e}")
 
-# Cubic interpolation + fallback nearest
-Z_cubic = griddata(df[['x','T']].values, df['iv'].values, (X, Y), method='cubic')
-Z_near  = griddata(df[['x','T']].values, df['iv'].values, (X, Y), method='nearest')
-Z = np.where(np.isnan(Z_cubic), Z_near, Z_cubic)
+# Definér grid – overfladen evalueres direkte, så gridet kan gøres finere
+x_lin = np.linspace(df['x'].min(), df['x'].max(), 200)
+T_lin = np.linspace(df['T'].min(), df['T'].max(), 120)
+X, Y = np.meshgrid(x_lin, T_lin)
+Z = surface.grid(x_lin, T_lin)
 
 # Konverter strikes tilbage fra log-moneyness
 strikes_grid = spot * np.exp(X)
@@ -1,21 +1,18 @@
-from ib_insync import IB, Stock, Option, util
+from ib_insync import Stock, Option
+import asyncio
 import pandas as pd
 import numpy as np
 import datetime as dt
+from ib_snapshots import gather_snapshots, gather_snapshots_async, print_timeouts, STOCK_FIELDS
+from helpers import get_ib, disconnect_ib
+from realized_vol import estimate
+from contract_cache import CONTRACT_CACHE
+from bar_cache import BAR_CACHE
+from mkt_data_lines import LINES, print_line_usage
+from straddle_scanner import chain_params, spot_price
 
-# ========= Opret IB-forbindelse =========
-ib = IB()
-
-def connect_ib():
-    if not ib.isConnected():
-        ib.connect('127.0.0.1', 7497, clientId=1)
-        ib.reqMarketDataType(3)  # 3 = delayed (brug 1 for real-time hvis du har data)
-        print("✅ Forbundet til IBKR.")
-
-def disconnect_ib():
-    if ib.isConnected():
-        ib.disconnect()
-        print("🔌 Forbindelse afbrudt.")
+ATM_CANDIDATES = 4     # nærmeste strikes der prøves, hvis den nærmeste ikke er listet for expiry'en
+VOL_COLUMNS = ['ticker', 'spot', 'realized_vol', 'rv_yang_zhang', 'atm_iv', 'expiry', 'strike']
 
 # === Helper: find næste fredag ≥ en given dato ===
 def get_next_friday(start_date: dt.date) -> dt.date:
@@ -25,43 +22,39 @@ def get_next_friday(start_date: dt.date) -> dt.date:
     return start_date + dt.timedelta(days=days_ahead)
 
 def get_volatility_with_iv(ticker: str, exchange: str = "SMART", currency: str = "USD"):
-    connect_ib()
+    # Genbruger processens forbindelse – ingen connect/disconnect pr. ticker
+    ib = get_ib()
+    ib.reqMarketDataType(3)  # 3 = delayed (brug 1 for real-time hvis du har data)
 
     # === Hent aktiekontrakt og seneste pris ===
     contract = Stock(ticker, exchange, currency)
-    contract = ib.qualifyContracts(contract)[0]
+    contract = CONTRACT_CACHE.qualify(ib, contract)[0]
 
-    market_price_data = ib.reqMktData(contract, snapshot=True)
-    ib.sleep(2)
+    (market_price_data,), _ = gather_snapshots(ib, [contract], fields=STOCK_FIELDS, timeout=5)
     try:
         last_price = float(market_price_data.last)
         print(f"📊 Spotpris for {ticker}: {last_price}")
     except (TypeError, ValueError):
         print(f"⚠️ Kunne ikke hente aktuel pris for {ticker}.")
-        disconnect_ib()
         return
 
     # === Hent 1 års historiske aktiedata (Realized Vol) ===
-    bars = ib.reqHistoricalData(
-        contract,
-        endDateTime='',
-        durationStr='1 Y',
-        barSizeSetting='1 day',
-        whatToShow='TRADES',
-        useRTH=True,
-        formatDate=1
-    )
-    df = util.df(bars)
+    # Samme vej som get_volatility_many: pacet af PACER og kun den manglende hale hentes (BAR_CACHE)
+    df = BAR_CACHE.get(ib, contract, '1 Y', '1 day', 'TRADES')
     if df.empty:
         print(f"⚠️ Ingen historiske data hentet for {ticker}.")
-        disconnect_ib()
         return
 
     # Beregn realiseret vol
-    df['returns'] = df['close'].pct_change()
-    realized_vol = df['returns'].std() * np.sqrt(252)
+    realized_vol = df['close'].pct_change().std() * np.sqrt(252)
     print(f"✅ Realiseret volatilitet ({ticker}, 1 år): {realized_vol*100:.2f}%")
 
+    # OHLC-estimatorer over samme år (vinduet = hele perioden) og EWMA (seneste værdi)
+    window = len(df) - 1
+    for method in ('parkinson', 'garman_klass', 'rogers_satchell', 'yang_zhang'):
+        print(f"   {method:<16} {estimate(df, method, window=window).iloc[-1]*100:6.2f}%")
+    print(f"   {'ewma (λ=0.94)':<16} {estimate(df, 'ewma', window=32).iloc[-1]*100:6.2f}%")
+
     # === Find ATM option, næste fredag ca. 30 dage ude ===
     target_date = dt.date.today() + dt.timedelta(days=30)
     expiry = get_next_friday(target_date).strftime("%Y%m%d")
@@ -77,8 +70,7 @@ def get_volatility_with_iv(ticker: str, exchange: str = "SMART", currency: str =
     )
 
     # === Hent IV ===
-    snapshot = ib.reqMktData(option, snapshot=True)
-    ib.sleep(2)
+    (snapshot,), _ = gather_snapshots(ib, [option], fields=('modelGreeks',), timeout=10)
 
     if snapshot.modelGreeks and snapshot.modelGreeks.impliedVol:
         iv = snapshot.modelGreeks.impliedVol
@@ -87,8 +79,99 @@ def get_volatility_with_iv(ticker: str, exchange: str = "SMART", currency: str =
         print(f"⚠️ Ingen IV returneret for {ticker} (expiry {expiry}). "
               f"Tjek om du har det rigtige options data abonnement.")
 
-    disconnect_ib()
+
+# === Mange tickers på én gang (asyncio, én forbindelse) ===
+async def _realized(ib, stock):
+    """(close-to-close RV, Yang-Zhang RV) over 1 år – bars via BAR_CACHE, så kun halen hentes."""
+    try:
+        df = await BAR_CACHE.get_async(ib, stock, '1 Y', '1 day', 'TRADES')
+    except Exception as e:
+        print(f"⚠️ {stock.symbol}: historiske data fejlede ({e})")
+        return np.nan, np.nan
+    if len(df) < 3:
+        return np.nan, np.nan
+    rv = df['close'].pct_change().std() * np.sqrt(252)
+    return rv, estimate(df, 'yang_zhang', window=len(df) - 1).iloc[-1]
+
+
+async def get_volatility_many_async(ib, tickers, exchange="SMART", currency="USD", lines=LINES, today=None):
+    """
+    Spot, realiseret vol og ATM IV for mange tickers på én forbindelse.
+
+    Historikken (pacet af PACER) hentes i baggrunden, mens spot-snapshots, chain-parametre
+    og ATM-optionernes IV hentes for alle tickers samtidigt inden for market data-linjerne.
+    ATM = den listede strike nærmest spot på den listede expiry nærmest fredagen ~30 dage ude.
+    Returnerer en DataFrame med VOL_COLUMNS – én række pr. ticker (NaN hvor data manglede).
+    """
+    today = today or dt.date.today()
+    target = get_next_friday(today + dt.timedelta(days=30))
+
+    requested = [t.upper() for t in tickers]
+    stocks = [Stock(t, exchange, currency) for t in requested]
+    await CONTRACT_CACHE.qualify_async(ib, *stocks)
+    stocks = [s for s in stocks if s.conId]
+    history = asyncio.ensure_future(asyncio.gather(*(_realized(ib, s) for s in stocks)))
+
+    tickers_, _ = await gather_snapshots_async(ib, stocks, fields=STOCK_FIELDS, timeout=5, lines=lines)
+    spots = {t.contract.symbol: spot_price(t) for t in tickers_}
+    chains = await asyncio.gather(*(chain_params(ib, s) for s in stocks))
+
+    # ATM-kandidater pr. ticker; den nærmeste strike, der kvalificerer, vinder
+    candidates = {}
+    for stock, chain in zip(stocks, chains):
+        spot = spots.get(stock.symbol)
+        if chain is None or spot is None or not chain.expirations:
+            print(f"⚠️ {stock.symbol}: ingen spot eller option chain")
+            continue
+        expiry = min(chain.expirations,
+                     key=lambda e: abs((dt.datetime.strptime(e, "%Y%m%d").date() - target).days))
+        strikes = sorted(chain.strikes, key=lambda k: abs(k - spot))[:ATM_CANDIDATES]
+        candidates[stock.symbol] = [
+            Option(stock.symbol, expiry, k, 'C', exchange, chain.multiplier, currency,
+                   tradingClass=chain.tradingClass)
+            for k in strikes
+        ]
+    await CONTRACT_CACHE.qualify_async(ib, *(o for opts in candidates.values() for o in opts))
+    atm = {symbol: next((o for o in opts if o.conId), None) for symbol, opts in candidates.items()}
+    options = [o for o in atm.values() if o is not None]
+
+    snapshots, report = await gather_snapshots_async(ib, options, fields=('modelGreeks',), timeout=10,
+                                                     snapshot=False, lines=lines)
+    print_timeouts(report)
+    print_line_usage(lines)
+    ivs = {t.contract.symbol: t.modelGreeks.impliedVol for t in snapshots
+           if t.modelGreeks and t.modelGreeks.impliedVol}
+
+    realized = dict(zip((s.symbol for s in stocks), await history))
+    rows = []
+    for symbol in requested:
+        rv, rv_yz = realized.get(symbol, (np.nan, np.nan))
+        option = atm.get(symbol)
+        rows.append({
+            'ticker': symbol,
+            'spot': spots.get(symbol) or np.nan,
+            'realized_vol': rv,
+            'rv_yang_zhang': rv_yz,
+            'atm_iv': ivs.get(symbol, np.nan),
+            'expiry': option.lastTradeDateOrContractMonth if option else None,
+            'strike': option.strike if option else np.nan,
+        })
+    return pd.DataFrame(rows, columns=VOL_COLUMNS)
+
+
+def get_volatility_many(tickers, exchange="SMART", currency="USD", lines=LINES):
+    """Synkron udgave (kører event-loopet via ib.run)."""
+    ib = get_ib()
+    ib.reqMarketDataType(3)  # 3 = delayed (brug 1 for real-time hvis du har data)
+    return ib.run(get_volatility_many_async(ib, tickers, exchange, currency, lines))
+
 
 if __name__ == "__main__":
-    ticker = input("Indtast ticker (fx AAPL, NVDA, NVO): ").strip().upper()
-    get_volatility_with_iv(ticker)
+    tickers = input("Indtast ticker(s) (fx AAPL, NVDA, NVO): ").replace(',', ' ').upper().split()
+    if len(tickers) == 1:
+        get_volatility_with_iv(tickers[0])
+    else:
+        result = get_volatility_many(tickers)
+        with pd.option_context('display.float_format', '{:.4f}'.format, 'display.width', 120):
+            print(result.to_string(index=False))
+    disconnect_ib()
@@ -0,0 +1,176 @@
+# bar_buffer.py
+# Kompakt kolonne-buffer til historiske bars (én pr. reqId).
+# Forallokerede NumPy-arrays, der fordobles ved behov; datoen parses én gang ved modtagelse,
+# og to_frame() giver en DataFrame, der deler hukommelse med bufferen (ingen kopi).
+
+import datetime as dt
+import functools
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+_EPOCH_ORDINAL = dt.date(1970, 1, 1).toordinal()
+
+
+def parse_ib_date(value) -> int:
+    """
+    IB bar-dato -> sekunder siden epoch (gemmes som datetime64[s]).
+    ibapi (strenge):
+      formatDate=1: 'YYYYMMDD' eller 'YYYYMMDD  HH:MM:SS' (evt. med tidszone-suffiks, som ignoreres);
+      formatDate=2: epoch-sekunder.
+    ib_insync (allerede parset):
+      datetime.date: daglige bars -> midnat;
+      datetime.datetime: intradag-bars – tz-aware (formatDate=2 giver UTC) som ægte epoch,
+      naiv som vægurstid ligesom formatDate=1-strengene.
+    """
+    if isinstance(value, dt.datetime):
+        if value.tzinfo is not None:
+            return int(value.timestamp())
+        return (_day_seconds_ordinal(value.toordinal())
+                + value.hour * 3600 + value.minute * 60 + value.second)
+    if isinstance(value, dt.date):
+        return _day_seconds_ordinal(value.toordinal())
+    s = str(value)
+    if len(s) > 8 and s.isdigit():
+        return int(s)
+    seconds = _day_seconds(s[:8])
+    if len(s) > 8:
+        clock = s[8:].split()[0]
+        seconds += int(clock[:2]) * 3600 + int(clock[3:5]) * 60 + int(clock[6:8])
+    return seconds
+
+
+@functools.lru_cache(maxsize=8192)
+def _day_seconds(yyyymmdd):
+    # Intradag-bars deler dato – hver dag parses kun én gang
+    return _day_seconds_ordinal(dt.date(int(yyyymmdd[:4]), int(yyyymmdd[4:6]), int(yyyymmdd[6:8])).toordinal())
+
+
+def _day_seconds_ordinal(ordinal):
+    return (ordinal - _EPOCH_ORDINAL) * 86400
+
+
+class BarBuffer:
+
+    STAGE = 1024  # bars samles i en lille liste og skrives til arrays i blokke
+
+    def __init__(self, capacity=256):
+        self._n = 0
+        self._stage = []
+        self._dates = np.empty(capacity, dtype=np.int64)   # epoch-sekunder
+        self._values = np.empty((capacity, len(FIELDS)), dtype=np.float64)
+
+    def __len__(self):
+        return self._n + len(self._stage)
+
+    @property
+    def nbytes(self):
+        return self._dates.nbytes + self._values.nbytes
+
+    def _grow(self, needed):
+        capacity = max(2 * len(self._dates), needed, 16)
+        dates = np.empty(capacity, dtype=self._dates.dtype)
+        values = np.empty((capacity, len(FIELDS)), dtype=np.float64)
+        dates[:self._n] = self._dates[:self._n]
+        values[:self._n] = self._values[:self._n]
+        self._dates, self._values = dates, values
+
+    def _flush(self):
+        k = len(self._stage)
+        if not k:
+            return
+        if self._n + k > len(self._dates):
+            self._grow(self._n + k)
+        block = np.array(self._stage, dtype=np.float64)
+        self._dates[self._n:self._n + k] = block[:, 0]
+        self._values[self._n:self._n + k] = block[:, 1:]
+        self._n += k
+        self._stage.clear()
+
+    def append(self, date, open_, high, low, close, volume):
+        """date i epoch-sekunder (se parse_ib_date)."""
+        self._stage.append((date, open_, high, low, close, volume))
+        if len(self._stage) >= self.STAGE:
+            self._flush()
+
+    def append_bar(self, bar):
+        """ibapi BarData (dato som streng) / ib_insync BarData (date/datetime); volume kan være Decimal."""
+        self.append(parse_ib_date(bar.date), bar.open, bar.high, bar.low, bar.close, float(bar.volume))
+
+    @property
+    def dates(self):
+        self._flush()
+        return self._dates[:self._n].view('datetime64[s]')
+
+    @property
+    def values(self):
+        self._flush()
+        return self._values[:self._n]
+
+    def to_frame(self) -> pd.DataFrame:
+        """DataFrame indekseret på 'date' – views ind i bufferens arrays, ingen kopi."""
+        index = pd.DatetimeIndex(self.dates, name='date', copy=False)
+        return pd.DataFrame(self.values, index=index, columns=list(FIELDS), copy=False)
+
+
+# === Benchmark: dict-pr.-bar vs BarBuffer ===
+class _FakeBar:
+    __slots__ = ('date', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, date, o, h, l, c, v):
+        self.date, self.open, self.high, self.low, self.close, self.volume = date, o, h, l, c, v
+
+
+def _fake_bars(n):
+    days = pd.date_range('2000-01-03', periods=n, freq='min').strftime('%Y%m%d  %H:%M:%S')
+    px = 100 + np.cumsum(np.random.default_rng(0).normal(size=n))
+    return [_FakeBar(d, p, p + 1, p - 1, p + 0.5, 1000.0) for d, p in zip(days, px)]
+
+
+def benchmark(n=500_000):
+    bars = _fake_bars(n)
+
+    def dict_ingest():
+        rows = []
+        for bar in bars:
+            rows.append({'date': bar.date, 'open': bar.open, 'close': bar.close,
+                         'high': bar.high, 'low': bar.low, 'volume': bar.volume})
+        return rows
+
+    def dict_frame(rows):
+        df = pd.DataFrame(rows)
+        df['date'] = pd.to_datetime(df['date'])
+        return df.set_index('date')
+
+    def buffer_ingest():
+        buf = BarBuffer()
+        for bar in bars:
+            buf.append_bar(bar)
+        return buf
+
+    print(f"{n} bars")
+    for name, ingest, frame in (('dict', dict_ingest, dict_frame), ('BarBuffer', buffer_ingest, BarBuffer.to_frame)):
+        # Hukommelse (tracemalloc) og tid måles i separate kørsler
+        tracemalloc.start()
+        store = ingest()
+        held, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del store
+
+        t0 = time.perf_counter()
+        store = ingest()
+        t_ingest = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        frame(store)
+        t_frame = time.perf_counter() - t0
+        print(f"{name:>10}: {held / n:7.1f} bytes/bar | ingest {n / t_ingest:12,.0f} bars/s"
+              f" | to DataFrame {t_frame*1e3:8.1f} ms | total {(t_ingest + t_frame):6.2f} s")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,123 @@
+# bar_cache.py
+# Lokal cache af historiske bars pr. kontrakt/whatToShow/barSize, så en opdatering kun
+# henter halen siden sidste gemte bar (fx "3 D") i stedet for hele perioden (fx "2 Y").
+# Bars gemmes som Parquet + en lille JSON-sidecar med hvor langt tilbage cachen dækker.
+
+import datetime as dt
+import json
+import math
+import os
+import re
+from pathlib import Path
+
+import pandas as pd
+
+from ib_pacing import PACER
+
+CACHE_DIR = Path(os.environ.get("BAR_CACHE_DIR", Path(__file__).resolve().parent / "data" / "bars"))
+BAR_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+_UNIT_DAYS = {'S': 1 / 86400, 'D': 1, 'W': 7, 'M': 31, 'Y': 366}
+
+
+def duration_to_timedelta(durationStr: str) -> dt.timedelta:
+    """IB durationStr ('30 D', '2 Y', '3600 S' ...) -> timedelta (M/Y rundes op)."""
+    n, unit = durationStr.split()
+    return dt.timedelta(days=int(n) * _UNIT_DAYS[unit.upper()])
+
+
+def timedelta_to_duration(delta: dt.timedelta) -> str:
+    """Mindste IB durationStr der dækker delta."""
+    seconds = max(delta.total_seconds(), 1)
+    if seconds < 86400:
+        return f"{int(math.ceil(seconds))} S"
+    days = int(math.ceil(seconds / 86400))
+    if days <= 365:
+        return f"{days} D"
+    return f"{int(math.ceil(days / 365))} Y"
+
+
+def bars_to_frame(bars) -> pd.DataFrame:
+    """ib_insync BarDataList / DataFrame -> DataFrame indekseret på dato med BAR_COLUMNS."""
+    df = bars if isinstance(bars, pd.DataFrame) else pd.DataFrame([vars(b) for b in bars])
+    if df.empty:
+        return pd.DataFrame(columns=BAR_COLUMNS, index=pd.DatetimeIndex([], name='date'))
+    if 'date' in df.columns:
+        df = df.set_index(pd.to_datetime(df['date'])).drop(columns='date')
+    df.index.name = 'date'
+    return df[BAR_COLUMNS].astype(float)
+
+
+class BarCache:
+
+    def __init__(self, root=CACHE_DIR):
+        self.root = Path(root)
+
+    def _path(self, contract, whatToShow, barSize, useRTH):
+        name = "_".join([contract.symbol, contract.secType, contract.currency or 'USD',
+                         whatToShow, barSize, 'RTH' if useRTH else 'ALL'])
+        return self.root / (re.sub(r'[^A-Za-z0-9_.-]', '', name.replace(' ', '')) + ".parquet")
+
+    def load(self, contract, whatToShow, barSize, useRTH=True):
+        """(gemte bars, dækket-fra-tidspunkt eller None)."""
+        path = self._path(contract, whatToShow, barSize, useRTH)
+        if not path.exists():
+            return bars_to_frame([]), None
+        meta = json.loads(path.with_suffix('.json').read_text())
+        return pd.read_parquet(path), pd.Timestamp(meta['covered_from'])
+
+    def plan(self, contract, durationStr, barSize, whatToShow, useRTH=True, now=None):
+        """
+        Hvad skal hentes? Returnerer (gemte bars, durationStr for requesten eller None).
+        Dækker cachen ikke hele den ønskede periode, hentes hele perioden;
+        ellers kun halen fra sidste gemte bar (inkl. den, da den kan være ufuldstændig).
+        """
+        now = pd.Timestamp(now or dt.datetime.now())
+        cached, covered_from = self.load(contract, whatToShow, barSize, useRTH)
+        wanted_from = now - duration_to_timedelta(durationStr)
+        if cached.empty or covered_from is None or covered_from > wanted_from:
+            return cached, durationStr
+        last = cached.index.max()
+        if last.normalize() >= now.normalize() and barSize.endswith(('day', 'days', 'week', 'month')):
+            return cached, "1 D"  # dagens (evt. ufuldstændige) bar opdateres
+        return cached, timedelta_to_duration(now - last + dt.timedelta(days=1))
+
+    def update(self, contract, durationStr, barSize, whatToShow, new_bars, useRTH=True, now=None):
+        """Flet nye bars ind (nyeste vinder ved dubletter), gem og returnér den ønskede periode."""
+        now = pd.Timestamp(now or dt.datetime.now())
+        cached, covered_from = self.load(contract, whatToShow, barSize, useRTH)
+        new = bars_to_frame(new_bars)
+        merged = pd.concat([cached, new]) if not cached.empty else new
+        merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+
+        requested_from = now - duration_to_timedelta(durationStr)
+        if not new.empty and (covered_from is None or requested_from < covered_from):
+            covered_from = requested_from
+        if covered_from is None:
+            return merged  # intet hentet og intet gemt – skriv ikke en tom cache
+
+        path = self._path(contract, whatToShow, barSize, useRTH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        merged.to_parquet(path)
+        path.with_suffix('.json').write_text(json.dumps({'covered_from': covered_from.isoformat()}))
+        return merged
+
+    def window(self, bars, durationStr, now=None):
+        now = pd.Timestamp(now or dt.datetime.now())
+        return bars[bars.index >= now - duration_to_timedelta(durationStr)]
+
+    async def get_async(self, ib, contract, durationStr, barSize, whatToShow, useRTH=True,
+                        pacer=PACER, priority=10):
+        """Som reqHistoricalDataAsync, men henter kun det manglende stykke (gennem pacing-scheduleren)."""
+        now = dt.datetime.now()
+        cached, request = self.plan(contract, durationStr, barSize, whatToShow, useRTH, now)
+        bars = await pacer.req_historical(ib, contract, '', request, barSize, whatToShow,
+                                          useRTH=useRTH, formatDate=1, priority=priority)
+        merged = self.update(contract, request, barSize, whatToShow, bars, useRTH, now)
+        return self.window(merged, durationStr, now)
+
+    def get(self, ib, contract, durationStr, barSize, whatToShow, useRTH=True):
+        return ib.run(self.get_async(ib, contract, durationStr, barSize, whatToShow, useRTH))
+
+
+BAR_CACHE = BarCache()
@@ -0,0 +1,385 @@
+# benchmark_suite.py
+# Benchmarks for analytics hot paths on committed fixtures in fixtures/bench/:
+#   surface.*  build_vol_surface_df-stadierne (merge pr. expiry, filter, SVI/SSVI-fit + grid)
+#              og det gamle griddata-trin (cubic + nearest) som reference
+#   iv.*       implied_vol_batch på Black_Scholes_Calculator.py's grid (og et større grid)
+#   regime.*   rolling(252).rank vs RollingPercentile og linregress-analysen i Vol_Dashboard
+# Hver benchmark måler tid (median og best-of-N over flere gentagelser) og peak-hukommelse
+# (tracemalloc) og sammenlignes med fixtures/bench/baseline.json: er best-of-N over tærsklen
+# og mere end TIME_SLACK_MS langsommere end baselinens median – også efter CONFIRM nye
+# målinger – = regression (exit code 1).
+#
+#   python benchmark_suite.py                     # kør og sammenlign med baseline
+#   python benchmark_suite.py --save-baseline     # gem resultaterne som ny baseline
+#   python benchmark_suite.py --make-fixtures [--record]   # (gen)skab fixtures
+#
+# Baselinen er maskinafhængig – gem den på den maskine (CI-runner), der sammenlignes på.
+
+import argparse
+import datetime as dt
+import json
+import statistics
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+FIXTURE_DIR = Path(__file__).resolve().parent / "fixtures" / "bench"
+BASELINE_PATH = FIXTURE_DIR / "baseline.json"
+TICKERS = ("AAPL", "SPY", "TSLA")
+THRESHOLD = 0.25        # > 25 % langsommere (eller mere hukommelse) end baseline = regression
+REPEAT = 15             # gentagelser bag median (ms) og best-of-N (ms_min)
+TIME_SLACK_MS = 5.0     # absolutte forskelle under dette er timer-/scheduler-støj (delte CI-maskiner)
+CONFIRM = 2             # ekstra målinger af en mistænkt regression, før den tæller
+MEMORY_SLACK_MIB = 0.25     # små peak-forskelle (allokator-støj) tæller ikke som regression
+GRID_X, GRID_T = 200, 120   # samme grid som Streamlit_test / Vol_Surface
+
+CHAIN_COLUMNS = ['days', 'right', 'contractSymbol', 'strike', 'lastPrice', 'bid', 'ask', 'volume',
+                 'openInterest', 'impliedVolatility', 'inTheMoney']
+RESULT_COLUMNS = ['benchmark', 'ms', 'ms_min', 'peak_mib', 'base_ms', 'base_peak_mib', 'ratio', 'status']
+
+
+# ========== Fixtures ==========
+
+def _synthetic_chain(ticker, spot, seed):
+    """Yahoo-formateret chain (calls + puts) med SVI-smil, støj og de typiske Yahoo-skævheder."""
+    from bs_pricing import bs_price
+    from svi_surface import svi_total_variance
+
+    rng = np.random.default_rng(seed)
+    days = [2, 5, 9, 12, 16, 23, 30, 44, 58, 86, 121, 149, 184, 240, 331, 457, 576, 695]
+    step = 2.5 if spot < 150 else 5.0
+    rows = []
+    for d in days:
+        T = d / 365
+        strikes = np.arange(np.floor(spot * 0.5 / step), np.ceil(spot * 1.6 / step) + 1) * step
+        k = np.log(strikes / spot)
+        w = svi_total_variance(k, 0.02 * T + 0.001, 0.1 * np.sqrt(T) + 0.02, -0.6, 0.02, 0.15)
+        iv = np.sqrt(w / T)
+        for right in 'CP':
+            price = bs_price(spot, strikes, T, iv, 0.04, right=right)
+            noisy_iv = iv * (1 + rng.normal(0, 0.02, len(iv)))
+            itm = strikes < spot if right == 'C' else strikes > spot
+            # Yahoo: dybt ITM har ofte meningsløs IV (~0 eller enorm) og manglende open interest
+            deep = itm & (np.abs(k) > 0.25)
+            noisy_iv[deep & (rng.random(len(k)) < 0.5)] = 1e-5
+            noisy_iv[deep & (rng.random(len(k)) < 0.2)] = rng.uniform(2, 5)
+            oi = rng.poisson(2000 * np.exp(-8 * k ** 2) / (1 + d / 60)).astype(float)
+            oi[rng.random(len(k)) < 0.05] = np.nan
+            spread = np.maximum(price * 0.03, 0.01)
+            expiry = (dt.date(2026, 1, 1) + dt.timedelta(days=d)).strftime('%y%m%d')
+            rows.append(pd.DataFrame({
+                'days': d, 'right': right,
+                'contractSymbol': [f"{ticker}{expiry}{right}{int(s * 1000):08d}" for s in strikes],
+                'strike': strikes, 'lastPrice': price.round(2), 'bid': (price - spread / 2).clip(0).round(2),
+                'ask': (price + spread / 2).round(2), 'volume': rng.poisson(50, len(k)).astype(float),
+                'openInterest': oi, 'impliedVolatility': noisy_iv.round(5), 'inTheMoney': itm,
+            }))
+    return pd.concat(rows, ignore_index=True)[CHAIN_COLUMNS]
+
+
+def _record_chain(ticker):
+    """Optag den aktuelle Yahoo-chain (kræver yfinance og netværk)."""
+    import yfinance as yf
+    t = yf.Ticker(ticker)
+    spot = float(t.history(period="1d")["Close"].iloc[-1])
+    today = dt.date.today()
+    rows = []
+    for expiry in t.options:
+        chain = t.option_chain(expiry)
+        days = (dt.datetime.strptime(expiry, "%Y-%m-%d").date() - today).days
+        for right, df in (('C', chain.calls), ('P', chain.puts)):
+            rows.append(df.assign(days=days, right=right)[CHAIN_COLUMNS])
+    return spot, pd.concat(rows, ignore_index=True)
+
+
+def _synthetic_iv_bars(seed, n=1260):
+    """Fem års daglige IV-bars (OPTION_IMPLIED_VOLATILITY-format, ikke-annualiseret) med regimeskift."""
+    rng = np.random.default_rng(seed)
+    level = np.where(np.sin(np.arange(n) / 90) > 0.6, 0.035, 0.018)   # perioder med høj vol
+    iv = np.empty(n)
+    iv[0] = level[0]
+    for t in range(1, n):
+        iv[t] = max(iv[t - 1] + 0.06 * (level[t] - iv[t - 1]) + 0.0015 * rng.normal(), 0.004)
+    spread = np.abs(rng.normal(0, 0.0008, n))
+    dates = pd.bdate_range("2021-01-04", periods=n)
+    return pd.DataFrame({'date': dates.strftime('%Y-%m-%d'), 'open': iv.round(6), 'high': (iv + spread).round(6),
+                         'low': (iv - spread).clip(0.001).round(6), 'close': iv.round(6)})
+
+
+def make_fixtures(record=False):
+    FIXTURE_DIR.mkdir(parents=True, exist_ok=True)
+    spots = {}
+    for i, ticker in enumerate(TICKERS):
+        if record:
+            spots[ticker], chain = _record_chain(ticker)
+        else:
+            spots[ticker] = [230.0, 580.0, 340.0][i % 3]
+            chain = _synthetic_chain(ticker, spots[ticker], seed=i)
+        chain.to_csv(FIXTURE_DIR / f"chain_{ticker}.csv.gz", index=False)
+        _synthetic_iv_bars(seed=100 + i).to_csv(FIXTURE_DIR / f"iv_{ticker}.csv.gz", index=False)
+    meta = {'spots': spots, 'source': 'yahoo' if record else 'synthetic', 'created': f"{dt.date.today()}"}
+    (FIXTURE_DIR / "meta.json").write_text(json.dumps(meta, indent=2))
+    print(f"💾 Fixtures ({meta['source']}) gemt i {FIXTURE_DIR}")
+
+
+def load_chains():
+    """{ticker: (spot, [(expiry, Chain), ...])} – expiries lægges relativt til i dag (T er stabil)."""
+    from yahoo_chains import Chain
+    meta = json.loads((FIXTURE_DIR / "meta.json").read_text())
+    today = dt.date.today()
+    out = {}
+    for ticker, spot in meta['spots'].items():
+        df = pd.read_csv(FIXTURE_DIR / f"chain_{ticker}.csv.gz")
+        chains = []
+        for days, g in df.groupby('days'):
+            expiry = (today + dt.timedelta(days=int(days))).strftime("%Y-%m-%d")
+            chains.append((expiry, Chain(calls=g[g['right'] == 'C'].reset_index(drop=True),
+                                         puts=g[g['right'] == 'P'].reset_index(drop=True))))
+        out[ticker] = (spot, chains)
+    return out
+
+
+def load_iv_bars(ticker):
+    return pd.read_csv(FIXTURE_DIR / f"iv_{ticker}.csv.gz", index_col='date', parse_dates=True)
+
+
+# ========== Benchmarks ==========
+# Hver benchmark er en setup-funktion, der forbereder input (ikke timet) og returnerer
+# den nul-argument callable, der måles.
+
+BENCHMARKS = {}
+
+
+def bench(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def _surface_points():
+    from yahoo_chains import surface_points
+    return {ticker: pd.concat([surface_points(e, c, spot) for e, c in chains], ignore_index=True)
+            for ticker, (spot, chains) in load_chains().items()}
+
+
+def _filtered():
+    from yahoo_chains import filter_surface_points
+    return {t: filter_surface_points(p, n_sigma=3.0, iv_cap=1.0, min_open_interest=0)
+            for t, p in _surface_points().items()}
+
+
+def _grid_axes(df):
+    return np.linspace(df['x'].min(), df['x'].max(), GRID_X), np.linspace(df['T'].min(), df['T'].max(), GRID_T)
+
+
+@bench("surface.merge")
+def _bench_merge():
+    from yahoo_chains import surface_points
+    chains = load_chains()
+    return lambda: [surface_points(e, c, spot) for spot, cs in chains.values() for e, c in cs]
+
+
+@bench("surface.filter")
+def _bench_filter():
+    from yahoo_chains import filter_surface_points
+    points = _surface_points()
+    return lambda: [filter_surface_points(p, n_sigma=3.0, iv_cap=1.0, min_open_interest=0)
+                    for p in points.values()]
+
+
+def _bench_fit(model):
+    from svi_surface import fit_surface
+    frames = list(_filtered().values())
+
+    def run():
+        for df in frames:
+            fit_surface(df, model).grid(*_grid_axes(df))
+    return run
+
+
+@bench("surface.fit_svi")
+def _bench_svi():
+    return _bench_fit('svi')
+
+
+@bench("surface.fit_ssvi")
+def _bench_ssvi():
+    return _bench_fit('ssvi')
+
+
+@bench("surface.griddata")
+def _bench_griddata():
+    from scipy.interpolate import griddata
+    frames = list(_filtered().values())
+
+    def run():
+        for df in frames:
+            X, Y = np.meshgrid(*_grid_axes(df))
+            pts, vals = df[['x', 'T']].values, df['iv'].values
+            Z = griddata(pts, vals, (X, Y), method='cubic')
+            np.where(np.isnan(Z), griddata(pts, vals, (X, Y), method='nearest'), Z)
+    return run
+
+
+def _bs_calculator_grid(n):
+    from bs_pricing import bs_price
+    S, r = 100, 0.01
+    K, T = np.meshgrid(np.linspace(80, 120, n), np.linspace(0.05, 1, n))
+    true_iv = 0.25 + 0.0015 * (K - S) ** 2 / S
+    return bs_price(S, K, T, true_iv, r, right='C'), S, K, T, r
+
+
+@bench("iv.bs_calculator_20x20")
+def _bench_iv_small():
+    from iv_solver import implied_vol_batch
+    price, S, K, T, r = _bs_calculator_grid(20)
+    return lambda: implied_vol_batch(price, S, K, T, r, right='C')
+
+
+@bench("iv.grid_200x200")
+def _bench_iv_large():
+    from iv_solver import implied_vol_batch
+    price, S, K, T, r = _bs_calculator_grid(200)
+    return lambda: implied_vol_batch(price, S, K, T, r, right='C')
+
+
+def _dashboard_iv():
+    return {t: load_iv_bars(t)['close'] * np.sqrt(252) for t in TICKERS}
+
+
+@bench("regime.pandas_rank")
+def _bench_pandas_rank():
+    series = _dashboard_iv()
+    return lambda: [s.rolling(252).rank(pct=True) for s in series.values()]
+
+
+@bench("regime.rolling_percentile")
+def _bench_rolling_percentile():
+    from iv_regime import RegimeMonitor
+    series = {t: s.tolist() for t, s in _dashboard_iv().items()}
+
+    def run():
+        monitor = RegimeMonitor()
+        for t, values in series.items():
+            monitor.seed(t, values)
+    return run
+
+
+@bench("regime.linregress")
+def _bench_linregress():
+    from iv_regime import RegimeMonitor
+    from Vol_Dashboard import forward_vol_regression
+    frames = []
+    for t, s in _dashboard_iv().items():
+        frames.append(pd.DataFrame({'implied_vol': s, 'iv_percentile': RegimeMonitor().seed(t, s.tolist())},
+                                   index=s.index))
+    return lambda: [forward_vol_regression(f) for f in frames]
+
+
+@bench("plot.lttb")
+def _bench_lttb():
+    import matplotlib.dates as mdates
+    from downsample import lttb
+    series = [(mdates.date2num(s.index), s.to_numpy()) for s in _dashboard_iv().values()]
+    return lambda: [lttb(x, y, 600) for x, y in series]
+
+
+# ========== Runner ==========
+
+def measure(fn, repeat=REPEAT):
+    """(median ms, min ms, peak MiB) for ét kald af fn."""
+    fn()  # opvarmning (imports, caches)
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    times = [t / number * 1e3 for t in timer.repeat(repeat, number)]
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return statistics.median(times), min(times), peak / 2 ** 20
+
+
+def run(names=None, threshold=THRESHOLD, baseline_path=BASELINE_PATH, repeat=REPEAT):
+    baseline = json.loads(Path(baseline_path).read_text()) if Path(baseline_path).exists() else {}
+    rows = []
+    for name, setup in BENCHMARKS.items():
+        if names and not any(n in name for n in names):
+            continue
+        fn = setup()
+        ms, ms_min, peak = measure(fn, repeat)
+        base = baseline.get(name, {})
+        # Regression kun hvis selv bedste kørsel nu er langsommere end baselinens median (og
+        # omvendt for 'faster') – støj i enkelte gentagelser kan så ikke vælte gaten
+        base_ms = base.get('ms')
+        base_min = base.get('ms_min') or base_ms
+
+        def slower_than_base(t):
+            return bool(base_ms) and t > base_ms * (1 + threshold) and t - base_ms > TIME_SLACK_MS
+
+        # Mistænkt regression måles igen: en ægte overlever, et kort støjudbrud på maskinen gør ikke
+        for _ in range(CONFIRM):
+            if not slower_than_base(ms_min):
+                break
+            ms_min = min(ms_min, measure(fn, repeat)[1])
+        ratio = ms_min / base_ms if base_ms else np.nan
+        slower = slower_than_base(ms_min)
+        faster = bool(base_min) and ms < base_min * (1 - threshold) and base_min - ms > TIME_SLACK_MS
+        mem_ratio = peak / base['peak_mib'] if base.get('peak_mib') else np.nan
+        mem_grew = mem_ratio > 1 + threshold and peak - base.get('peak_mib', 0) > MEMORY_SLACK_MIB
+        if not base:
+            status = 'new'
+        elif slower or mem_grew:
+            status = 'REGRESSION'
+        elif faster:
+            status = 'faster'
+        else:
+            status = 'ok'
+        rows.append({'benchmark': name, 'ms': ms, 'ms_min': ms_min, 'peak_mib': peak,
+                     'base_ms': base_ms, 'base_peak_mib': base.get('peak_mib'), 'ratio': ratio,
+                     'status': status})
+        print(f"{name:<28} {ms:10.3f} ms  {peak:8.2f} MiB  {status}")
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    baseline = json.loads(Path(path).read_text()) if Path(path).exists() else {}
+    for r in results.itertuples():
+        baseline[r.benchmark] = {'ms': round(r.ms, 4), 'ms_min': round(r.ms_min, 4), 'peak_mib': round(r.peak_mib, 3)}
+    Path(path).write_text(json.dumps(dict(sorted(baseline.items())), indent=2) + "\n")
+    print(f"💾 Baseline gemt: {path}")
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Benchmarks for analytics hot paths")
+    parser.add_argument("names", nargs="*", help="kør kun benchmarks hvis navn indeholder en af disse")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--make-fixtures", action="store_true")
+    parser.add_argument("--record", action="store_true", help="optag chains fra Yahoo i stedet for syntetiske")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    if args.make_fixtures:
+        make_fixtures(record=args.record)
+        sys.exit(0)
+
+    results = run(args.names, args.threshold, args.baseline, args.repeat)
+    pd.set_option("display.width", 200)
+    print()
+    print(results.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+    elif (results['status'] == 'REGRESSION').any():
+        print(f"\n❌ {(results['status'] == 'REGRESSION').sum()} regression(er) over {args.threshold:.0%}")
+        sys.exit(1)
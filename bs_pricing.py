@@ -0,0 +1,140 @@
+# bs_pricing.py
+# Vektoriseret Black-Scholes(-Merton) prisfastsættelse og Greeks.
+# Alle input (S, K, T, sigma, r, q, right) må være skalarer eller NumPy-arrays
+# og broadcastes mod hinanden, så en hel kæde/grid prissættes i ét kald.
+
+import numpy as np
+from scipy.special import ndtr
+
+_INV_SQRT_2PI = 1.0 / np.sqrt(2.0 * np.pi)
+
+
+def _norm_pdf(x):
+    return _INV_SQRT_2PI * np.exp(-0.5 * x * x)
+
+
+def _is_call(right):
+    """'C'/'P' (eller True/False) -> bool-array, True for calls."""
+    right = np.asarray(right)
+    if right.dtype.kind == 'b':
+        return right
+    return np.char.upper(right.astype(str)) == 'C'
+
+
+def _prepare(S, K, T, sigma, r, q, right):
+    S, K, T, sigma, r, q = (np.asarray(a, dtype=float) for a in (S, K, T, sigma, r, q))
+    is_call = _is_call(right)
+    S, K, T, sigma, r, q, is_call = np.broadcast_arrays(S, K, T, sigma, r, q, is_call)
+    return S, K, T, sigma, r, q, is_call
+
+
+def _d1_d2(S, K, T, sigma, r, q):
+    # Ugyldige celler (T <= 0 eller sigma <= 0) får d1 = d2 = 0 og overskrives bagefter
+    valid = (T > 0) & (sigma > 0)
+    sqrt_T = np.sqrt(np.where(valid, T, 1.0))
+    vol_sqrt_T = np.where(valid, sigma, 1.0) * sqrt_T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d1 = (np.log(S / K) + (r - q + 0.5 * sigma * sigma) * T) / vol_sqrt_T
+    d1 = np.where(valid, d1, 0.0)
+    d2 = d1 - np.where(valid, vol_sqrt_T, 0.0)
+    return d1, d2, sqrt_T, valid
+
+
+def bs_price(S, K, T, sigma, r=0.0, q=0.0, right='C'):
+    """
+    Black-Scholes pris for calls/puts med kontinuert dividende q.
+    Ved T <= 0 eller sigma <= 0 returneres den diskonterede indre værdi.
+    """
+    S, K, T, sigma, r, q, is_call = _prepare(S, K, T, sigma, r, q, right)
+    d1, d2, _, valid = _d1_d2(S, K, T, sigma, r, q)
+
+    df_r = np.exp(-r * np.maximum(T, 0.0))
+    df_q = np.exp(-q * np.maximum(T, 0.0))
+    fwd = S * df_q
+    pv_k = K * df_r
+
+    call = fwd * ndtr(d1) - pv_k * ndtr(d2)
+    put = pv_k * ndtr(-d2) - fwd * ndtr(-d1)
+    price = np.where(is_call, call, put)
+
+    intrinsic = np.where(is_call, np.maximum(fwd - pv_k, 0.0), np.maximum(pv_k - fwd, 0.0))
+    return np.where(valid, price, intrinsic)
+
+
+def bs_greeks(S, K, T, sigma, r=0.0, q=0.0, right='C'):
+    """
+    Pris og Greeks i ét pass. Returnerer dict med arrays:
+    price, delta, gamma, vega, theta, rho.
+
+    vega og rho er pr. 1.0 (dvs. 100 %-point) ændring i sigma/r,
+    theta er pr. år (divider med 365 for pr. kalenderdag).
+    """
+    S, K, T, sigma, r, q, is_call = _prepare(S, K, T, sigma, r, q, right)
+    d1, d2, sqrt_T, valid = _d1_d2(S, K, T, sigma, r, q)
+
+    T_pos = np.maximum(T, 0.0)
+    df_r = np.exp(-r * T_pos)
+    df_q = np.exp(-q * T_pos)
+    fwd = S * df_q
+    pv_k = K * df_r
+
+    n_d1 = _norm_pdf(d1)
+    N_d1, N_d2 = ndtr(d1), ndtr(d2)
+    N_md1, N_md2 = ndtr(-d1), ndtr(-d2)
+    vol_sqrt_T = sigma * sqrt_T
+
+    price = np.where(is_call, fwd * N_d1 - pv_k * N_d2, pv_k * N_md2 - fwd * N_md1)
+    delta = np.where(is_call, df_q * N_d1, -df_q * N_md1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gamma = df_q * n_d1 / (S * vol_sqrt_T)
+    vega = fwd * n_d1 * sqrt_T
+
+    theta_common = -fwd * n_d1 * sigma / (2.0 * sqrt_T)
+    theta = np.where(
+        is_call,
+        theta_common + q * fwd * N_d1 - r * pv_k * N_d2,
+        theta_common - q * fwd * N_md1 + r * pv_k * N_md2,
+    )
+    rho = np.where(is_call, T_pos * pv_k * N_d2, -T_pos * pv_k * N_md2)
+
+    # Udløbne / nul-vol kontrakter: indre værdi og "step"-delta
+    itm = np.where(is_call, fwd > pv_k, pv_k > fwd)
+    intrinsic = np.where(is_call, np.maximum(fwd - pv_k, 0.0), np.maximum(pv_k - fwd, 0.0))
+    step_delta = np.where(itm, np.where(is_call, df_q, -df_q), 0.0)
+
+    return {
+        'price': np.where(valid, price, intrinsic),
+        'delta': np.where(valid, delta, step_delta),
+        'gamma': np.where(valid, gamma, 0.0),
+        'vega': np.where(valid, vega, 0.0),
+        'theta': np.where(valid, theta, 0.0),
+        'rho': np.where(valid, rho, 0.0),
+    }
+
+
+def bs_call(S, K, T, sigma, r=0.0, q=0.0):
+    return bs_price(S, K, T, sigma, r, q, 'C')
+
+
+def bs_put(S, K, T, sigma, r=0.0, q=0.0):
+    return bs_price(S, K, T, sigma, r, q, 'P')
+
+
+def bs_delta(S, K, T, sigma, r=0.0, q=0.0, right='C'):
+    return bs_greeks(S, K, T, sigma, r, q, right)['delta']
+
+
+def bs_gamma(S, K, T, sigma, r=0.0, q=0.0):
+    return bs_greeks(S, K, T, sigma, r, q, 'C')['gamma']
+
+
+def bs_vega(S, K, T, sigma, r=0.0, q=0.0):
+    return bs_greeks(S, K, T, sigma, r, q, 'C')['vega']
+
+
+def bs_theta(S, K, T, sigma, r=0.0, q=0.0, right='C'):
+    return bs_greeks(S, K, T, sigma, r, q, right)['theta']
+
+
+def bs_rho(S, K, T, sigma, r=0.0, q=0.0, right='C'):
+    return bs_greeks(S, K, T, sigma, r, q, right)['rho']
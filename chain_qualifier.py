@@ -0,0 +1,70 @@
+# chain_qualifier.py
+# Kvalificering af store option chains (fx hele SPY-kæden) uden error-200-spam:
+#   1) alle listede kontrakter pr. expiry hentes med ét reqContractDetails-kald pr. expiry
+#      (strike=0, right='') – cachet i CONTRACT_CACHE
+#   2) kandidaterne (strike x expiry x right) slås op i de listede kontrakter
+# reqContractDetails returnerer allerede fuldt kvalificerede kontrakter (med conId), så der
+# er ingen qualifyContracts-runde bagefter, og ugyldige kombinationer når aldrig frem til IB.
+
+import asyncio
+import time
+
+from ib_insync import Contract, Option, util
+
+from contract_cache import CONTRACT_CACHE
+
+RIGHTS = ('C', 'P')
+
+
+async def listed_contracts_async(ib, symbol, expirations, exchange='SMART', trading_class='', cache=CONTRACT_CACHE):
+    """{(expiry, right, strike): kvalificeret kontrakt} for alt, hvad IB lister pr. expiry."""
+    templates = [Option(symbol, expiry, 0.0, '', exchange, tradingClass=trading_class) for expiry in expirations]
+    results = await asyncio.gather(*(cache.find_contracts_async(ib, t) for t in templates))
+    listed = {}
+    for expiry, contracts in zip(expirations, results):
+        for c in contracts:
+            if c.conId:
+                # Details-kontrakter er generiske Contract-objekter – lav dem om til Option
+                listed.setdefault((expiry, c.right, c.strike), Contract.create(**util.dataclassAsDict(c)))
+    return listed
+
+
+def select_contracts(expirations, strikes, listed, rights=RIGHTS):
+    """De listede kontrakter for (expiry, strike, right)-kombinationerne, i den rækkefølge."""
+    return [
+        listed[(expiry, right, strike)]
+        for expiry in expirations
+        for strike in strikes
+        for right in rights
+        if (expiry, right, strike) in listed
+    ]
+
+
+async def qualify_chain_async(ib, symbol, expirations, strikes, rights=RIGHTS, exchange='SMART',
+                              trading_class=''):
+    """
+    Kvalificerede optioner for strikes x expirations x rights – kun de kombinationer, der findes.
+    Returnerer (optioner, rapport) hvor rapporten har antal kandidater, fundne og tidsforbrug.
+    """
+    t0 = time.perf_counter()
+    expirations = list(expirations)
+    listed = await listed_contracts_async(ib, symbol, expirations, exchange, trading_class)
+    options = select_contracts(expirations, strikes, listed, rights)
+    report = {
+        'requested': len(expirations) * len(strikes) * len(rights),
+        'listed': len(options),
+        'qualified': len(options),
+        'seconds': time.perf_counter() - t0,
+    }
+    return options, report
+
+
+def qualify_chain(ib, symbol, expirations, strikes, **kwargs):
+    """Synkron udgave (kører event-loopet via ib.run)."""
+    return ib.run(qualify_chain_async(ib, symbol, expirations, strikes, **kwargs))
+
+
+def print_report(report):
+    dropped = report['requested'] - report['listed']
+    print(f"🔎 {report['qualified']}/{report['requested']} kontrakter kvalificeret på {report['seconds']:.1f}s "
+          f"({dropped} kombinationer findes ikke og blev sorteret fra før IB)")
@@ -0,0 +1,128 @@
+# chain_store.py
+# Lokal on-disk store for option chain snapshots (Parquet).
+# Layout: <root>/<source>/underlying=<SYM>/date=<YYYY-MM-DD>/expiry=<YYYYMMDD>/<HHMMSSffffff>.parquet
+# Hver snapshot gemmes som en ny fil, så historikken bygges op af sig selv.
+# Kræver pyarrow (pandas' parquet-engine).
+
+import datetime as dt
+import os
+import shutil
+from pathlib import Path
+
+import pandas as pd
+
+STORE_DIR = Path(os.environ.get("CHAIN_STORE_DIR", Path(__file__).resolve().parent / "data" / "chains"))
+MAX_AGE = 300  # sekunder før en snapshot betragtes som forældet (samme som st.cache_data ttl)
+
+
+def _expiry_key(expiry) -> str:
+    """Yahoo ('YYYY-MM-DD') og IB ('YYYYMMDD') expiries gemmes under samme partitionsnøgle."""
+    return str(expiry).replace("-", "")[:8]
+
+
+class ChainStore:
+
+    def __init__(self, root=STORE_DIR, max_age=MAX_AGE):
+        self.root = Path(root)
+        self.max_age = max_age
+
+    def _underlying_dir(self, underlying, source):
+        return self.root / source / f"underlying={underlying.upper()}"
+
+    def _snapshots(self, underlying, source, expiry="*"):
+        """Alle snapshot-filer, sorteret kronologisk (dato-mappe + tidsstempel i filnavnet)."""
+        base = self._underlying_dir(underlying, source)
+        pattern = f"date=*/expiry={_expiry_key(expiry) if expiry != '*' else '*'}/*.parquet"
+        return sorted(base.glob(pattern), key=lambda p: (p.parent.parent.name, p.name))
+
+    def write(self, underlying, df, source="yahoo", ts=None):
+        """
+        Gem en snapshot. df skal have kolonnerne 'expiry', 'strike' og 'right';
+        der skrives én fil pr. expiry. Returnerer listen af skrevne stier.
+        """
+        if df is None or df.empty:
+            return []
+        ts = ts or dt.datetime.now()
+        out = df.copy()
+        out["underlying"] = underlying.upper()
+        out["snapshot_ts"] = pd.Timestamp(ts)
+        out["source"] = source
+
+        paths = []
+        for expiry, part in out.groupby(out["expiry"].map(_expiry_key), sort=False):
+            folder = (self._underlying_dir(underlying, source)
+                      / f"date={ts:%Y-%m-%d}" / f"expiry={expiry}")
+            folder.mkdir(parents=True, exist_ok=True)
+            path = folder / f"{ts:%H%M%S%f}.parquet"
+            part.to_parquet(path, index=False)
+            paths.append(path)
+        return paths
+
+    @staticmethod
+    def _snapshot_time(path):
+        """Tidsstemplet i stien (date=-mappen + filnavnet)."""
+        return dt.datetime.strptime(f"{path.parent.parent.name[5:]} {path.stem}", "%Y-%m-%d %H%M%S%f")
+
+    def _latest(self, underlying, source, max_age=None):
+        """
+        {expiry-nøgle: seneste snapshot-fil}. Kun date=-mapper, der kan indeholde snapshots
+        inden for max_age, globbes – så prisen følger det ønskede vindue, ikke hele historikken.
+        """
+        base = self._underlying_dir(underlying, source)
+        if not base.is_dir():
+            return {}
+        days = sorted(d for d in os.listdir(base) if d.startswith("date="))
+        if max_age is not None and max_age != float("inf"):
+            oldest = f"date={(dt.datetime.now() - dt.timedelta(seconds=max_age)).date():%Y-%m-%d}"
+            days = [d for d in days if d >= oldest]
+        latest = {}
+        for day in days:   # kronologisk, så den sidste fil pr. expiry vinder
+            for path in sorted((base / day).glob("expiry=*/*.parquet"), key=lambda p: p.name):
+                latest[path.parent.name[7:]] = path
+        return latest
+
+    def age(self, underlying, expiry, source="yahoo"):
+        """Alder i sekunder af seneste snapshot for en expiry (None hvis ingen findes)."""
+        files = self._snapshots(underlying, source, expiry)
+        if not files:
+            return None
+        return (dt.datetime.now() - self._snapshot_time(files[-1])).total_seconds()
+
+    def read(self, underlying, source="yahoo", expiries=None, max_age=None):
+        """
+        Seneste snapshot pr. expiry. Med staleness-politikken (max_age, default self.max_age)
+        udelades expiries, hvis seneste snapshot er ældre; max_age=float('inf') læser alt.
+        """
+        max_age = self.max_age if max_age is None else max_age
+        latest = self._latest(underlying, source, max_age)
+        keys = latest.keys() if expiries is None else {_expiry_key(e) for e in expiries} & latest.keys()
+
+        now = dt.datetime.now()
+        frames = []
+        for key in sorted(keys):
+            path = latest[key]
+            if (now - self._snapshot_time(path)).total_seconds() > max_age:
+                continue
+            frames.append(pd.read_parquet(path))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    def prune(self, keep_days, underlying=None, source=None):
+        """Slet date=-partitioner ældre end keep_days (evt. kun for én underlying/source)."""
+        cutoff = f"date={dt.date.today() - dt.timedelta(days=keep_days):%Y-%m-%d}"
+        pattern = f"{source or '*'}/underlying={underlying.upper() if underlying else '*'}/date=*"
+        removed = 0
+        for day in self.root.glob(pattern):
+            if day.name < cutoff:
+                shutil.rmtree(day)
+                removed += 1
+        return removed
+
+    def history(self, underlying, source="yahoo", expiry="*", start=None, end=None):
+        """Alle gemte snapshots (evt. for én expiry og et datointerval) som én DataFrame."""
+        frames = []
+        for path in self._snapshots(underlying, source, expiry):
+            day = path.parent.parent.name[5:]
+            if (start and day < str(start)) or (end and day > str(end)):
+                continue
+            frames.append(pd.read_parquet(path))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
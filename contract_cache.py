@@ -0,0 +1,204 @@
+# contract_cache.py
+# Lokal SQLite-cache for kontrakt-metadata, så qualifyContracts / reqContractDetails /
+# reqSecDefOptParams kun rammer IB første gang (inden for TTL).
+#   contracts: kvalificerede kontrakter, nøgle = (symbol, secType, expiry, strike, right, exchange, currency)
+#              – også negative svar (kontrakten findes ikke), med kortere TTL
+#   details:   kontraktlister fra reqContractDetails (fx hele kæden for strike=0)
+#   secdef:    reqSecDefOptParams-resultater pr. underliggende conId
+# Virker både synkront (scripts) og med asyncio (ib_insync *Async-metoderne).
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from ib_insync import Contract, OptionChain, util
+
+from metrics import METRICS
+
+CACHE_PATH = Path(os.environ.get("CONTRACT_CACHE_PATH",
+                                 Path(__file__).resolve().parent / "data" / "contracts.sqlite"))
+CONTRACT_TTL = 24 * 3600      # kontrakt-metadata ændrer sig sjældent intradag
+SECDEF_TTL = 12 * 3600        # nye expiries (weeklies) lægges til løbende
+MISSING_TTL = 3600            # "findes ikke" huskes kortere (kan skyldes en midlertidig fejl)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS contracts (key TEXT PRIMARY KEY, conId INTEGER, data TEXT, fetched REAL);
+CREATE TABLE IF NOT EXISTS details (key TEXT PRIMARY KEY, data TEXT, fetched REAL);
+CREATE TABLE IF NOT EXISTS secdef (key TEXT PRIMARY KEY, data TEXT, fetched REAL);
+"""
+
+
+def contract_key(contract) -> str:
+    """Opslagsnøgle for en (evt. ukvalificeret) kontrakt."""
+    return "|".join(str(v) for v in (
+        contract.symbol, contract.secType, contract.lastTradeDateOrContractMonth,
+        float(contract.strike or 0.0), contract.right, contract.exchange, contract.currency,
+        contract.tradingClass,
+    ))
+
+
+def _dump(contract) -> str:
+    return json.dumps(util.dataclassAsDict(contract))
+
+
+def _load(data) -> Contract:
+    return Contract.create(**json.loads(data))
+
+
+class ContractCache:
+
+    def __init__(self, path=CACHE_PATH, ttl=CONTRACT_TTL, secdef_ttl=SECDEF_TTL, missing_ttl=MISSING_TTL):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.secdef_ttl = secdef_ttl
+        self.missing_ttl = missing_ttl
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.misses = 0
+
+    def _conn(self):
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.executescript(_SCHEMA)
+        return self._db
+
+    def _get(self, table, key):
+        """(data, alder i sekunder) eller None."""
+        with self._lock:
+            row = self._conn().execute(f"SELECT data, fetched FROM {table} WHERE key = ?", (key,)).fetchone()
+        return None if row is None else (row[0], time.time() - row[1])
+
+    def _put_many(self, table, rows):
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            if table == "contracts":
+                db.executemany("INSERT OR REPLACE INTO contracts VALUES (?, ?, ?, ?)",
+                               [(k, conId, data, now) for k, conId, data in rows])
+            else:
+                db.executemany(f"INSERT OR REPLACE INTO {table} VALUES (?, ?, ?)",
+                               [(k, data, now) for k, data in rows])
+            db.commit()
+
+    # ---------- qualifyContracts ----------
+
+    def _lookup(self, contracts):
+        """Del kontrakterne i (opdaterede fra cachen, kendt ugyldige, mangler)."""
+        found, invalid, missing = [], [], []
+        keys = [contract_key(c) for c in contracts]
+        with self._lock:
+            db = self._conn()
+            rows = {}
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows.update({k: (conId, data, fetched) for k, conId, data, fetched in db.execute(
+                    f"SELECT key, conId, data, fetched FROM contracts WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk)})
+        now = time.time()
+        for contract, key in zip(contracts, keys):
+            row = rows.get(key)
+            if row is not None and row[0] and now - row[2] <= self.ttl:
+                util.dataclassUpdate(contract, _load(row[1]))
+                found.append(contract)
+            elif row is not None and not row[0] and now - row[2] <= self.missing_ttl:
+                invalid.append(contract)
+            else:
+                missing.append(contract)
+        return found, invalid, missing
+
+    def _store_qualified(self, missing, keys):
+        self._put_many("contracts", [(k, c.conId, _dump(c) if c.conId else None) for c, k in zip(missing, keys)])
+
+    async def qualify_async(self, ib, *contracts):
+        """Som ib.qualifyContractsAsync: opdaterer kontrakterne in-place og returnerer de gyldige."""
+        found, invalid, missing = self._lookup(contracts)
+        self.hits += len(found) + len(invalid)
+        self.misses += len(missing)
+        METRICS.count('contract_cache_hits_total', len(found) + len(invalid), call='qualify')
+        METRICS.count('contract_cache_misses_total', len(missing), call='qualify')
+        if missing:
+            keys = [contract_key(c) for c in missing]   # før IB udfylder felterne
+            with METRICS.span('ib_qualify'):
+                await ib.qualifyContractsAsync(*missing)
+            self._store_qualified(missing, keys)
+        return [c for c in contracts if c.conId]
+
+    def qualify(self, ib, *contracts):
+        return ib.run(self.qualify_async(ib, *contracts))
+
+    # ---------- reqContractDetails ----------
+
+    async def find_contracts_async(self, ib, contract):
+        """Kontrakterne fra reqContractDetails (fx alle strikes for strike=0.0), cachet."""
+        key = contract_key(contract)
+        row = self._get("details", key)
+        if row is not None:
+            contracts = [Contract.create(**d) for d in json.loads(row[0])]
+            if row[1] <= (self.ttl if contracts else self.missing_ttl):
+                self.hits += 1
+                METRICS.count('contract_cache_hits_total', call='details')
+                return contracts
+        self.misses += 1
+        METRICS.count('contract_cache_misses_total', call='details')
+        with METRICS.span('ib_contract_details'):
+            details = await ib.reqContractDetailsAsync(contract)
+        contracts = [d.contract for d in details if d.contract]
+        self._put_many("details", [(key, json.dumps([util.dataclassAsDict(c) for c in contracts]))])
+        return contracts
+
+    def find_contracts(self, ib, contract):
+        return ib.run(self.find_contracts_async(ib, contract))
+
+    # ---------- reqSecDefOptParams ----------
+
+    async def sec_def_opt_params_async(self, ib, underlyingSymbol, futFopExchange, underlyingSecType,
+                                       underlyingConId):
+        key = f"{underlyingSymbol}|{futFopExchange}|{underlyingSecType}|{underlyingConId}"
+        row = self._get("secdef", key)
+        if row is not None and row[1] <= self.secdef_ttl:
+            self.hits += 1
+            METRICS.count('contract_cache_hits_total', call='secdef')
+            return [OptionChain(**c) for c in json.loads(row[0])]
+        self.misses += 1
+        METRICS.count('contract_cache_misses_total', call='secdef')
+        with METRICS.span('ib_secdef_opt_params'):
+            chains = await ib.reqSecDefOptParamsAsync(underlyingSymbol, futFopExchange, underlyingSecType,
+                                                      underlyingConId)
+        if chains:
+            self._put_many("secdef", [(key, json.dumps([
+                {'exchange': c.exchange, 'underlyingConId': c.underlyingConId, 'tradingClass': c.tradingClass,
+                 'multiplier': c.multiplier, 'expirations': list(c.expirations), 'strikes': list(c.strikes)}
+                for c in chains
+            ]))])
+        return chains
+
+    def sec_def_opt_params(self, ib, underlyingSymbol, futFopExchange, underlyingSecType, underlyingConId):
+        return ib.run(self.sec_def_opt_params_async(ib, underlyingSymbol, futFopExchange, underlyingSecType,
+                                                    underlyingConId))
+
+    # ---------- vedligehold ----------
+
+    def clear(self, older_than=None):
+        """Slet alle entries (eller kun dem ældre end older_than sekunder)."""
+        cutoff = time.time() - (older_than or 0)
+        with self._lock:
+            db = self._conn()
+            for table in ("contracts", "details", "secdef"):
+                db.execute(f"DELETE FROM {table} WHERE fetched <= ?", (cutoff,))
+            db.commit()
+
+    def stats(self):
+        with self._lock:
+            db = self._conn()
+            sizes = {t: db.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+                     for t in ("contracts", "details", "secdef")}
+        return {'hits': self.hits, 'misses': self.misses, **sizes}
+
+
+# Én cache pr. proces (SQLite-filen deles mellem scripts)
+CONTRACT_CACHE = ContractCache()
@@ -0,0 +1,76 @@
+# downsample.py
+# Nedsampling af lange serier før plotning, så tegnetiden afhænger af skærmens bredde
+# og ikke af hvor meget historik der er hentet.
+#   lttb:  Largest-Triangle-Three-Buckets – bevarer formen (toppe/bunde) på en tidsserie
+#   thin:  jævnt fordelte indekser – til scatter-plots, hvor rækkefølgen ikke betyder noget
+# Begge returnerer indekser, så x/y (og evt. farver) kan skæres ens.
+
+import time
+
+import numpy as np
+
+
+def lttb(x, y, n_out):
+    """
+    Indekser for de n_out punkter, LTTB vælger (første og sidste punkt er altid med).
+    x skal være stigende og numerisk (fx matplotlib date2num). n_out >= len(x) giver alle.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # n_out - 2 buckets mellem første og sidste punkt; hver har mindst ét punkt, da n_out < n
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Gennemsnit af alle buckets på én gang; "næste bucket" efter den sidste er sidste punkt
+    sizes = np.diff(np.append(edges, n))
+    avg_x = (np.add.reduceat(x, edges) / sizes)[1:]
+    avg_y = (np.add.reduceat(y, edges) / sizes)[1:]
+
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i, (lo, hi) in enumerate(zip(edges[:-1].tolist(), edges[1:].tolist())):
+        xa, ya = x[a], y[a]
+        # Trekantens areal (x2) mellem det valgte punkt a, kandidaten og næste buckets gennemsnit
+        area = np.abs((xa - avg_x[i]) * (y[lo:hi] - ya) - (xa - x[lo:hi]) * (avg_y[i] - ya))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def thin(n, max_points):
+    """Højst max_points jævnt fordelte indekser i range(n)."""
+    if n <= max_points:
+        return np.arange(n)
+    return np.unique(np.linspace(0, n - 1, max_points).round().astype(np.int64))
+
+
+# === Benchmark: tegnetid for hele serien vs. LTTB ned til skærmbredden ===
+def benchmark(width=600):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    rng = np.random.default_rng(0)
+    fig, ax = plt.subplots(figsize=(width / 100, 4), dpi=100)
+    line, = ax.plot([], [], linewidth=1)
+    for n in (10_000, 100_000, 1_000_000):
+        x = np.arange(n, dtype=float)
+        y = 0.3 + np.cumsum(rng.normal(scale=1e-3, size=n))
+        timings = []
+        for label, idx_fn in (('fuld', lambda: slice(None)), ('lttb', lambda: lttb(x, y, width))):
+            t0 = time.perf_counter()
+            idx = idx_fn()
+            line.set_data(x[idx], y[idx])
+            ax.relim()
+            ax.autoscale_view()
+            fig.canvas.draw()
+            timings.append(f"{label} {(time.perf_counter() - t0) * 1e3:7.1f} ms")
+        print(f"{n:>9} punkter: " + " | ".join(timings))
+    plt.close(fig)
+
+
+if __name__ == "__main__":
+    benchmark()
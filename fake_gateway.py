@@ -0,0 +1,699 @@
+# fake_gateway.py
+# Offline stand-in for TWS / IB Gateway: taler IB's socket-protokol (server version 157, som
+# både ib_insync og ibapi accepterer), så scripts og Vol_Dashboard kan køres, benchmarkes og
+# regressionstestes uden en rigtig forbindelse. Data kommer fra fixtures (optaget fra TWS med
+# --record eller genereret deterministisk med --synthetic).
+# Dækker: handshake/startApi, kontrakt-detaljer, secdef option params, historiske bars
+# (inkl. keepUpToDate), snapshot- og streaming market data med modelGreeks samt fejl
+# (200 ukendt kontrakt, 101 linjegrænse, 162 pacing, 326 clientId i brug).
+# Latency, jitter og pacing-fejl kan konfigureres; tilfældighed styres af et seed.
+#
+#   python fake_gateway.py --synthetic AAPL SPY --port 4002 --latency 0.02
+#   python fake_gateway.py --fixtures fixtures/ib/sample.json --pacing
+#   IB_PORT=4002 python analyze_volatility.py
+
+import argparse
+import asyncio
+import datetime as dt
+import gzip
+import json
+import math
+import random
+import struct
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from bs_pricing import bs_greeks
+from ib_pacing import IDENTICAL_COOLDOWN, BURST_WINDOW, BURST_LIMIT, ROLLING_WINDOW, ROLLING_LIMIT
+
+SERVER_VERSION = 157       # ib_insync kræver >= 157, ibapi 9.81 kender højst 157
+DEFAULT_PORT = 4002
+ACCOUNT = "DU0000000"
+MAX_LINES = 100
+STREAM_INTERVAL = 0.25     # sekunder mellem streaming-ticks
+UPDATE_INTERVAL = 1.0      # sekunder mellem keepUpToDate-bars
+
+CONTRACT_FIELDS = ('conId', 'symbol', 'secType', 'lastTradeDateOrContractMonth', 'strike', 'right',
+                   'multiplier', 'exchange', 'primaryExchange', 'currency', 'localSymbol', 'tradingClass')
+DETAIL_DEFAULTS = {'marketName': '', 'minTick': 0.01, 'orderTypes': '', 'validExchanges': 'SMART',
+                   'priceMagnifier': 1, 'underConId': 0, 'longName': '', 'contractMonth': '',
+                   'industry': '', 'category': '', 'subcategory': '', 'timeZoneId': 'US/Eastern',
+                   'tradingHours': '', 'liquidHours': '', 'stockType': ''}
+GREEK_FIELDS = ('impliedVol', 'delta', 'optPrice', 'pvDividend', 'gamma', 'vega', 'theta', 'undPrice')
+
+# Tick-typer (samme numre som TWS)
+PRICE_TICKS = (('bid', 1), ('ask', 2), ('last', 4), ('high', 6), ('low', 7), ('close', 9))
+SIZE_TICKS = (('bidSize', 0), ('askSize', 3), ('lastSize', 5), ('volume', 8))
+MODEL_OPTION = 13
+
+# Udgående beskeder (server -> klient)
+TICK_PRICE, TICK_SIZE, ERR_MSG, NEXT_VALID_ID, CONTRACT_DATA, MANAGED_ACCTS, HISTORICAL_DATA = 1, 2, 4, 9, 10, 15, 17
+TICK_OPTION_COMPUTATION, CURRENT_TIME, CONTRACT_DATA_END, OPEN_ORDER_END, ACCOUNT_DOWNLOAD_END = 21, 49, 52, 53, 54
+EXECUTION_DATA_END, TICK_SNAPSHOT_END, MARKET_DATA_TYPE, POSITION_END, ACCOUNT_SUMMARY = 55, 57, 58, 62, 63
+ACCOUNT_SUMMARY_END, ACCOUNT_UPDATE_MULTI_END, SECDEF_OPT_PARAMS, SECDEF_OPT_PARAMS_END = 64, 74, 75, 76
+HISTORICAL_DATA_UPDATE, COMPLETED_ORDERS_END = 90, 102
+
+
+def _fmt(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return str(value)
+
+
+def _encode(*fields):
+    payload = ''.join(_fmt(f) + '\0' for f in fields).encode()
+    return struct.pack('>I', len(payload)) + payload
+
+
+# ========== Fixtures ==========
+
+class Fixtures:
+    """
+    Fixture-data indekseret til opslag:
+      contracts: liste af kontrakter (CONTRACT_FIELDS + detaljefelter)
+      secdef:    {underliggende conId: [{exchange, tradingClass, multiplier, expirations, strikes}]}
+      bars:      {"conId|whatToShow|barSize": [[dato, open, high, low, close, volume], ...]}
+      quotes:    {conId: {bid, ask, last, close, ..., greeks: {impliedVol, delta, ...}}}
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.contracts = {int(c['conId']): c for c in data.get('contracts', [])}
+        self._by_symbol = defaultdict(list)
+        for c in self.contracts.values():
+            self._by_symbol[(c['symbol'], c['secType'])].append(c)
+        self.secdef = {int(k): v for k, v in data.get('secdef', {}).items()}
+        self.bars = data.get('bars', {})
+        self.quotes = {int(k): v for k, v in data.get('quotes', {}).items()}
+
+    @classmethod
+    def load(cls, path):
+        path = Path(path)
+        opener = gzip.open if path.suffix == '.gz' else open
+        with opener(path, 'rt') as fh:
+            return cls(json.load(fh))
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        opener = gzip.open if path.suffix == '.gz' else open
+        with opener(path, 'wt') as fh:
+            json.dump(self.data, fh, separators=(',', ':'))
+
+    def match(self, req):
+        """Kontrakter der matcher en request (tomme felter = vilkårlig), som TWS' reqContractDetails."""
+        con_id = int(req['conId'] or 0)
+        if con_id:
+            c = self.contracts.get(con_id)
+            return [c] if c else []
+        strike = float(req['strike'] or 0)
+        found = []
+        for c in self._by_symbol.get((req['symbol'], req['secType']), ()):
+            if req['lastTradeDateOrContractMonth'] and \
+                    not c['lastTradeDateOrContractMonth'].startswith(req['lastTradeDateOrContractMonth']):
+                continue
+            if strike and abs(strike - c['strike']) > 1e-6:
+                continue
+            if req['right'] and req['right'][0] != c['right'][0]:
+                continue
+            if any(req[f] and str(req[f]) != str(c[f]) for f in ('currency', 'tradingClass', 'multiplier')):
+                continue
+            if req['exchange'] and req['exchange'] not in (c['exchange'], *c['validExchanges'].split(',')):
+                continue
+            found.append(c)
+        return found
+
+    def bars_for(self, con_id, what_to_show, bar_size):
+        return self.bars.get(f"{con_id}|{what_to_show}|{bar_size}")
+
+
+def _duration_days(duration):
+    """IB-varighed ('30 D', '2 W', '6 M', '3 Y', '3600 S') -> kalenderdage."""
+    n, unit = duration.split()
+    return max(int(n) * {'S': 1 / 86400, 'D': 1, 'W': 7, 'M': 31, 'Y': 366}[unit.upper()], 1)
+
+
+def _end_date(end_date_time, bars):
+    if not end_date_time:
+        return bars[-1][0][:8]
+    return end_date_time.replace('-', ' ')[:8]
+
+
+# ========== Server ==========
+
+class _Session:
+    """Én klientforbindelse: læser requests og skriver svar (hver request i sin egen task)."""
+
+    def __init__(self, gateway, reader, writer):
+        self.gw = gateway
+        self.reader = reader
+        self.writer = writer
+        self.client_id = None
+        self.market_data_type = 1
+        self.tasks = {}          # ('mkt' | 'hist', reqId) -> task
+        self.lines = set()       # reqIds der optager en market data-linje
+
+    def send(self, *fields):
+        if not self.writer.is_closing():
+            self.writer.write(_encode(*fields))
+            self.gw._counts['sent'] += 1
+
+    def error(self, req_id, code, msg):
+        self.send(ERR_MSG, 2, req_id, code, msg)
+
+    async def run(self):
+        try:
+            if await self.reader.readexactly(4) != b'API\0':
+                return
+            size, = struct.unpack('>I', await self.reader.readexactly(4))
+            versions = (await self.reader.readexactly(size)).decode().split()[0]
+            lo, hi = (int(v) for v in versions.lstrip('v').split('..'))
+            if not lo <= SERVER_VERSION <= hi:
+                return
+            self.send(SERVER_VERSION, f"{dt.datetime.now():%Y%m%d %H:%M:%S} EST")
+            while True:
+                size, = struct.unpack('>I', await self.reader.readexactly(4))
+                fields = (await self.reader.readexactly(size)).decode().split('\0')[:-1]
+                self.gw._counts[f"msg_{fields[0]}"] += 1
+                try:
+                    self.handle(fields)
+                except (ValueError, IndexError):
+                    self.gw._counts['bad_messages'] += 1
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for task in self.tasks.values():
+                task.cancel()
+            if self.client_id is not None:
+                self.gw._client_ids.discard(self.client_id)
+            self.writer.close()
+
+    def spawn(self, kind, req_id, coro):
+        task = asyncio.ensure_future(coro)
+        self.tasks[(kind, req_id)] = task
+        task.add_done_callback(lambda _: self.tasks.pop((kind, req_id), None))
+
+    # ---------- dispatch ----------
+
+    def handle(self, f):
+        msg = int(f[0])
+        if msg == 71:                                   # startApi
+            self.start_api(int(f[2]))
+        elif msg == 1:                                  # reqMktData
+            req = dict(zip(CONTRACT_FIELDS, f[3:15]))
+            rest = f[15:]
+            if req['secType'] == 'BAG':
+                rest = rest[1 + 4 * int(rest[0]):]
+            rest = rest[4:] if rest[0] == '1' else rest[1:]
+            self.spawn('mkt', int(f[2]), self.mkt_data(int(f[2]), req, snapshot=rest[1] == '1'))
+        elif msg == 2:                                  # cancelMktData
+            self.cancel('mkt', int(f[2]))
+        elif msg == 9:                                  # reqContractDetails
+            self.spawn('details', int(f[2]), self.contract_details(int(f[2]), dict(zip(CONTRACT_FIELDS, f[3:15]))))
+        elif msg == 20:                                 # reqHistoricalData
+            req_id = int(f[1])
+            req = dict(zip(CONTRACT_FIELDS, f[2:14]))
+            end, bar_size, duration, _, what, _ = f[15:21]
+            keep = f[-2] == '1'                         # keepUpToDate (sidste felt er chartOptions)
+            self.spawn('hist', req_id, self.historical(req_id, req, end, bar_size, duration, what, keep))
+        elif msg == 25:                                 # cancelHistoricalData
+            self.cancel('hist', int(f[2]))
+        elif msg == 78:                                 # reqSecDefOptParams
+            self.spawn('secdef', int(f[1]), self.secdef(int(f[1]), int(f[5] or 0)))
+        elif msg == 59:                                 # reqMarketDataType
+            self.market_data_type = int(f[2])
+        elif msg == 49:
+            self.send(CURRENT_TIME, 1, int(time.time()))
+        elif msg == 8:
+            self.send(NEXT_VALID_ID, 1, 1)
+        elif msg == 61:
+            self.send(POSITION_END, 1)
+        elif msg == 5:
+            self.send(OPEN_ORDER_END, 1)
+        elif msg == 99:
+            self.send(COMPLETED_ORDERS_END)
+        elif msg == 6:
+            self.send(ACCOUNT_DOWNLOAD_END, 1, f[3] or ACCOUNT)
+        elif msg == 76:
+            self.send(ACCOUNT_UPDATE_MULTI_END, 1, int(f[2]))
+        elif msg == 7:
+            self.send(EXECUTION_DATA_END, 1, int(f[2]))
+        elif msg == 62:                                 # reqAccountSummary
+            for tag, value in (('NetLiquidation', '100000'), ('BuyingPower', '400000')):
+                self.send(ACCOUNT_SUMMARY, 1, int(f[2]), ACCOUNT, tag, value, 'USD')
+            self.send(ACCOUNT_SUMMARY_END, 1, int(f[2]))
+        else:
+            self.gw._counts['unhandled'] += 1
+
+    def start_api(self, client_id):
+        if client_id in self.gw._client_ids:
+            self.error(-1, 326, "Unable to connect as the client id is already in use. "
+                                "Retry with a unique client id.")
+            self.writer.close()
+            return
+        self.client_id = client_id
+        self.gw._client_ids.add(client_id)
+        self.send(NEXT_VALID_ID, 1, 1)
+        self.send(MANAGED_ACCTS, 1, ACCOUNT)
+
+    def cancel(self, kind, req_id):
+        task = self.tasks.pop((kind, req_id), None)
+        if task is not None:
+            task.cancel()
+        self.lines.discard(req_id)
+
+    # ---------- requests ----------
+
+    async def contract_details(self, req_id, req):
+        await self.gw.delay()
+        matches = self.gw.fixtures.match(req)
+        if not matches:
+            self.error(req_id, 200, "No security definition has been found for the request")
+            return
+        for c in matches:
+            d = {**DETAIL_DEFAULTS, **c}
+            self.send(CONTRACT_DATA, 8, req_id, c['symbol'], c['secType'], c['lastTradeDateOrContractMonth'],
+                      c['strike'], c['right'], req['exchange'] or c['exchange'], c['currency'],
+                      c['localSymbol'], d['marketName'], c['tradingClass'], c['conId'], d['minTick'], 1,
+                      c['multiplier'], d['orderTypes'], d['validExchanges'], d['priceMagnifier'],
+                      d['underConId'], d['longName'], c['primaryExchange'], d['contractMonth'],
+                      d['industry'], d['category'], d['subcategory'], d['timeZoneId'], d['tradingHours'],
+                      d['liquidHours'], '', '', 0, 1, c['symbol'] if c['secType'] == 'OPT' else '',
+                      'STK' if c['secType'] == 'OPT' else '', '26', c['lastTradeDateOrContractMonth'],
+                      d['stockType'])
+        self.send(CONTRACT_DATA_END, 1, req_id)
+
+    async def secdef(self, req_id, con_id):
+        await self.gw.delay()
+        for chain in self.gw.fixtures.secdef.get(con_id, ()):
+            self.send(SECDEF_OPT_PARAMS, req_id, chain['exchange'], con_id, chain['tradingClass'],
+                      chain['multiplier'], len(chain['expirations']), *chain['expirations'],
+                      len(chain['strikes']), *chain['strikes'])
+        self.send(SECDEF_OPT_PARAMS_END, req_id)
+
+    async def historical(self, req_id, req, end, bar_size, duration, what, keep):
+        await self.gw.delay()
+        matches = self.gw.fixtures.match(req)
+        if len(matches) != 1:
+            self.error(req_id, 200, "No security definition has been found for the request")
+            return
+        contract = matches[0]
+        if self.gw.pacing_violation(contract['conId'], what, (end, bar_size, duration)):
+            self.error(req_id, 162, "Historical Market Data Service error message:"
+                                    "Pacing violation")
+            return
+        bars = self.gw.fixtures.bars_for(contract['conId'], what, bar_size)
+        if not bars:
+            self.error(req_id, 162, "Historical Market Data Service error message:HMDS query returned no data")
+            return
+        end_day = _end_date(end, bars)
+        start_day = (dt.datetime.strptime(end_day, '%Y%m%d') -
+                     dt.timedelta(days=_duration_days(duration))).strftime('%Y%m%d')
+        window = [b for b in bars if start_day < b[0][:8] <= end_day]
+        fields = []
+        for date, o, h, l, c, v in window:
+            fields += [date, o, h, l, c, int(v), round((o + h + l + c) / 4, 6), 1]
+        self.send(HISTORICAL_DATA, req_id, start_day, end_day, len(window), *fields)
+        self.gw._counts['bars'] += len(window)
+        if not keep or not window:
+            return
+        # keepUpToDate: den seneste bar opdateres løbende (random walk), indtil den afmeldes
+        date, o, h, l, c, v = window[-1]
+        rng = self.gw.rng
+        while True:
+            await asyncio.sleep(self.gw.update_interval)
+            c = round(c * math.exp(rng.gauss(0, 0.002)), 6)
+            h, l = max(h, c), min(l, c)
+            self.send(HISTORICAL_DATA_UPDATE, req_id, -1, date, o, c, h, l, round((o + h + l + c) / 4, 6), int(v))
+
+    async def mkt_data(self, req_id, req, snapshot):
+        matches = self.gw.fixtures.match(req)
+        if len(matches) != 1:
+            await self.gw.delay()
+            self.error(req_id, 200, "No security definition has been found for the request")
+            return
+        if len(self.lines) >= self.gw.max_lines:
+            self.error(req_id, 101, "Max number of tickers has been reached")
+            return
+        self.lines.add(req_id)
+        try:
+            await self.gw.delay()
+            contract = matches[0]
+            quote = dict(self.gw.fixtures.quotes.get(contract['conId'], {}))
+            self.send(MARKET_DATA_TYPE, 1, req_id, self.market_data_type)
+            self.send_quote(req_id, quote)
+            self.gw._counts['snapshots' if snapshot else 'streams'] += 1
+            if snapshot:
+                self.send(TICK_SNAPSHOT_END, 1, req_id)
+                return
+            rng = self.gw.rng
+            while quote.get('last'):
+                await asyncio.sleep(self.gw.stream_interval)
+                move = math.exp(rng.gauss(0, 0.0005))
+                half = max((quote.get('ask', quote['last']) - quote.get('bid', quote['last'])) / 2, 0.01)
+                quote['last'] = round(quote['last'] * move, 4)
+                quote['bid'], quote['ask'] = round(quote['last'] - half, 4), round(quote['last'] + half, 4)
+                self.send_quote(req_id, {k: quote[k] for k in ('bid', 'ask', 'last')})
+        finally:
+            self.lines.discard(req_id)
+
+    def send_quote(self, req_id, quote):
+        for name, tick in PRICE_TICKS:
+            if quote.get(name):
+                self.send(TICK_PRICE, 6, req_id, tick, quote[name], 0, 0)
+        for name, tick in SIZE_TICKS:
+            if quote.get(name) is not None:
+                self.send(TICK_SIZE, 6, req_id, tick, int(quote[name]))
+        greeks = quote.get('greeks')
+        if greeks:
+            self.send(TICK_OPTION_COMPUTATION, req_id, MODEL_OPTION, 0, *(greeks[g] for g in GREEK_FIELDS))
+
+
+class FakeGateway:
+    """
+    asyncio-server der svarer fra Fixtures. latency + uniform(0, jitter) sekunder pr. svar;
+    pacing=True håndhæver IB's regler for historiske requests (samme grænser som ib_pacing),
+    pacing_error_rate afviser derudover en andel af dem tilfældigt (fejl 162).
+    """
+
+    def __init__(self, fixtures, latency=0.0, jitter=0.0, pacing=False, pacing_error_rate=0.0,
+                 max_lines=MAX_LINES, stream_interval=STREAM_INTERVAL, update_interval=UPDATE_INTERVAL,
+                 seed=0):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.pacing = pacing
+        self.pacing_error_rate = pacing_error_rate
+        self.max_lines = max_lines
+        self.stream_interval = stream_interval
+        self.update_interval = update_interval
+        self.rng = random.Random(seed)
+        self.port = None
+        self._server = None
+        self._sessions = {}           # _Session -> task
+        self._client_ids = set()
+        self._counts = Counter()
+        self._sent = deque()
+        self._by_contract = defaultdict(deque)
+        self._last_identical = {}
+
+    async def start(self, host='127.0.0.1', port=DEFAULT_PORT):
+        self._server = await asyncio.start_server(self._serve_client, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def _serve_client(self, reader, writer):
+        session = _Session(self, reader, writer)
+        self._sessions[session] = asyncio.current_task()
+        try:
+            await session.run()
+        finally:
+            self._sessions.pop(session, None)
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            # Luk forbindelserne (klienten ser et disconnect) og vent, til sessionerne er ryddet op
+            for session in list(self._sessions):
+                session.writer.close()
+            await asyncio.gather(*self._sessions.values(), return_exceptions=True)
+            await self._server.wait_closed()
+
+    async def delay(self):
+        wait = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pacing_violation(self, con_id, what, params):
+        """True hvis en historisk request skal afvises (regel-brud eller tilfældig pacing-fejl)."""
+        if self.pacing_error_rate and self.rng.random() < self.pacing_error_rate:
+            self._counts['pacing_errors'] += 1
+            return True
+        if not self.pacing:
+            return False
+        now = time.monotonic()
+        key, identical = (con_id, what), (con_id, what) + tuple(params)
+        burst = self._by_contract[key]
+        while burst and burst[0] <= now - BURST_WINDOW:
+            burst.popleft()
+        while self._sent and self._sent[0] <= now - ROLLING_WINDOW:
+            self._sent.popleft()
+        last = self._last_identical.get(identical)
+        violated = (last is not None and now - last < IDENTICAL_COOLDOWN) or \
+            len(burst) >= BURST_LIMIT or len(self._sent) >= ROLLING_LIMIT
+        self._sent.append(now)
+        burst.append(now)
+        self._last_identical[identical] = now
+        if violated:
+            self._counts['pacing_errors'] += 1
+        return violated
+
+    def stats(self):
+        return dict(self._counts)
+
+
+@contextmanager
+def running_gateway(fixtures=None, port=0, **kwargs):
+    """
+    Kør en FakeGateway i en baggrundstråd (eget event-loop) og giv porten:
+
+        with running_gateway(synthetic_fixtures(["AAPL"])) as port:
+            ib.connect("127.0.0.1", port, clientId=1)
+    """
+    gateway = FakeGateway(fixtures or synthetic_fixtures(), **kwargs)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    def serve():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(gateway.start(port=port))
+        ready.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=serve, name="fake-gateway", daemon=True)
+    thread.start()
+    ready.wait()
+    try:
+        yield gateway.port
+    finally:
+        asyncio.run_coroutine_threadsafe(gateway.close(), loop).result(timeout=5)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+
+
+# ========== Fixture-generering ==========
+
+def _contract(**fields):
+    c = {'strike': 0.0, 'right': '', 'lastTradeDateOrContractMonth': '', 'multiplier': '',
+         'exchange': 'SMART', 'primaryExchange': '', 'currency': 'USD', 'localSymbol': '', 'tradingClass': ''}
+    c.update(fields)
+    return c
+
+
+def synthetic_fixtures(symbols=("AAPL", "SPY"), days=756, n_expiries=6, n_strikes=41, seed=0, today=None):
+    """
+    Deterministiske fixtures: GBM-kurser (TRADES), mean-reverting IV (OPTION_IMPLIED_VOLATILITY),
+    ugentlige expiries fra `today` og Black-Scholes quotes/greeks med en simpel skew.
+    """
+    rng = np.random.default_rng(seed)
+    today = pd.Timestamp(today or dt.date.today()).normalize()
+    dates = pd.bdate_range(end=today - pd.Timedelta(days=1), periods=days)
+    data = {'contracts': [], 'secdef': {}, 'bars': {}, 'quotes': {}}
+
+    for i, symbol in enumerate(symbols):
+        con_id = 100000 * (i + 1)
+        spot0 = float(rng.uniform(50, 500))
+        vol = float(rng.uniform(0.15, 0.45))
+
+        # Kurser og IV
+        close = spot0 * np.exp(np.cumsum(rng.normal(0, vol / np.sqrt(252), days)))
+        open_ = close * np.exp(rng.normal(0, vol / np.sqrt(252) / 3, days))
+        high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, vol / np.sqrt(252) / 2, days)))
+        low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, vol / np.sqrt(252) / 2, days)))
+        volume = rng.integers(1_000_000, 50_000_000, days)
+        iv = np.empty(days)
+        iv[0] = vol
+        for t in range(1, days):
+            iv[t] = max(iv[t - 1] + 0.05 * (vol - iv[t - 1]) + 0.015 * rng.normal(), 0.05)
+        date_str = dates.strftime('%Y%m%d')
+        data['bars'][f"{con_id}|TRADES|1 day"] = [
+            [d, round(o, 4), round(h, 4), round(l, 4), round(c, 4), int(v)]
+            for d, o, h, l, c, v in zip(date_str, open_, high, low, close, volume)]
+        iv_spread = np.abs(rng.normal(0, 0.01, days))
+        data['bars'][f"{con_id}|OPTION_IMPLIED_VOLATILITY|1 day"] = [
+            [d, round(v, 6), round(v + s, 6), round(max(v - s, 0.01), 6), round(v, 6), 0]
+            for d, v, s in zip(date_str, iv, iv_spread)]
+
+        spot = round(float(close[-1]), 2)
+        data['contracts'].append(_contract(
+            conId=con_id, symbol=symbol, secType='STK', primaryExchange='ARCA' if symbol == 'SPY' else 'NASDAQ',
+            localSymbol=symbol, tradingClass=symbol, validExchanges='SMART,ARCA,NASDAQ,BATS,IEX',
+            longName=f"{symbol} (synthetic)", stockType='COMMON'))
+        data['quotes'][str(con_id)] = {'bid': round(spot - 0.01, 2), 'ask': round(spot + 0.01, 2), 'last': spot,
+                                       'close': round(float(close[-2]), 2), 'high': round(float(high[-1]), 2),
+                                       'low': round(float(low[-1]), 2), 'bidSize': 300, 'askSize': 300,
+                                       'lastSize': 100, 'volume': int(volume[-1]) // 100}
+
+        # Option chain: ugentlige fredage og strikes omkring spot
+        step = 1.0 if spot < 200 else 5.0
+        atm = round(spot / step) * step
+        strikes = [atm + step * (k - n_strikes // 2) for k in range(n_strikes)]
+        strikes = [k for k in strikes if k > 0]
+        first_friday = today + pd.Timedelta(days=(4 - today.weekday()) % 7 or 7)
+        expiries = [(first_friday + pd.Timedelta(weeks=w)).strftime('%Y%m%d') for w in range(n_expiries)]
+        data['secdef'][str(con_id)] = [
+            {'exchange': exchange, 'tradingClass': symbol, 'multiplier': '100',
+             'expirations': expiries, 'strikes': strikes}
+            for exchange in ('SMART', 'CBOE')]
+
+        K, E, R = zip(*[(k, e, r) for e in expiries for k in strikes for r in 'CP'])
+        K = np.array(K)
+        T = np.array([(pd.Timestamp(e) - today).days / 365 for e in E])
+        x = np.log(K / spot)
+        sigma = np.clip(iv[-1] * (1 - 0.6 * x + 1.5 * x * x), 0.05, 3.0)
+        g = bs_greeks(spot, K, T, sigma, r=0.0, q=0.0, right=R)
+        for n, (k, e, r) in enumerate(zip(K, E, R)):
+            opt_id = con_id + n + 1
+            price = max(float(g['price'][n]), 0.01)
+            spread = max(round(price * 0.02, 2), 0.01)
+            data['contracts'].append(_contract(
+                conId=opt_id, symbol=symbol, secType='OPT', lastTradeDateOrContractMonth=e,
+                strike=float(k), right=r, multiplier='100', tradingClass=symbol,
+                localSymbol=f"{symbol:<6}{e[2:]}{r}{int(round(k * 1000)):08d}",
+                validExchanges='SMART,CBOE,AMEX,ISE,PHLX', underConId=con_id, minTick=0.01,
+                longName=symbol))
+            data['quotes'][str(opt_id)] = {
+                'bid': round(price - spread / 2, 2) or 0.01, 'ask': round(price + spread / 2, 2),
+                'last': round(price, 2), 'close': round(price, 2), 'bidSize': 10, 'askSize': 10, 'volume': 100,
+                'greeks': {'impliedVol': round(float(sigma[n]), 6), 'delta': round(float(g['delta'][n]), 6),
+                           'optPrice': round(price, 4), 'pvDividend': 0.0,
+                           'gamma': round(float(g['gamma'][n]), 6), 'vega': round(float(g['vega'][n]) / 100, 6),
+                           'theta': round(float(g['theta'][n]) / 365, 6), 'undPrice': spot},
+            }
+    return Fixtures(data)
+
+
+# ========== Optagelse fra TWS ==========
+
+async def record_fixtures_async(ib, symbols, n_expiries=4, strike_pct=0.10, duration="3 Y"):
+    """Optag fixtures fra en rigtig forbindelse: kontrakter, chains, daglige bars og quotes."""
+    from ib_insync import Stock
+    from chain_qualifier import qualify_chain_async
+    from ib_pacing import PACER
+    from ib_snapshots import gather_snapshots_async, OPTION_FIELDS
+    from mkt_data_lines import LINES
+
+    data = {'contracts': [], 'secdef': {}, 'bars': {}, 'quotes': {}}
+
+    def add_contract(c, details=None):
+        row = {f: getattr(c, f) for f in CONTRACT_FIELDS}
+        row['strike'] = float(row['strike'] or 0.0)
+        if details is not None:
+            row.update({f: getattr(details, f) for f in DETAIL_DEFAULTS if getattr(details, f, None)})
+        if c.secType == 'STK' and not row.get('validExchanges'):
+            row['validExchanges'] = 'SMART'
+        data['contracts'].append(row)
+
+    recorded = []
+    for symbol in symbols:
+        details = await ib.reqContractDetailsAsync(Stock(symbol, 'SMART', 'USD'))
+        if not details:
+            print(f"⚠️ {symbol}: ukendt kontrakt")
+            continue
+        stock = details[0].contract
+        add_contract(stock, details[0])
+
+        for what in ('TRADES', 'OPTION_IMPLIED_VOLATILITY'):
+            bars = await PACER.req_historical(ib, stock, '', duration, '1 day', what, True, 1)
+            data['bars'][f"{stock.conId}|{what}|1 day"] = [
+                [b.date.strftime('%Y%m%d') if hasattr(b.date, 'strftime') else str(b.date),
+                 b.open, b.high, b.low, b.close, int(b.volume or 0)] for b in bars]
+        spot = data['bars'][f"{stock.conId}|TRADES|1 day"][-1][4]
+
+        chains = await ib.reqSecDefOptParamsAsync(symbol, '', 'STK', stock.conId)
+        data['secdef'][str(stock.conId)] = [
+            {'exchange': c.exchange, 'tradingClass': c.tradingClass, 'multiplier': c.multiplier,
+             'expirations': sorted(c.expirations), 'strikes': sorted(c.strikes)} for c in chains]
+        smart = next((c for c in chains if c.exchange == 'SMART'), None)
+        options = []
+        if smart is not None:
+            strikes = [k for k in sorted(smart.strikes) if abs(k / spot - 1) <= strike_pct]
+            options, _ = await qualify_chain_async(ib, symbol, sorted(smart.expirations)[:n_expiries], strikes,
+                                                   trading_class=smart.tradingClass)
+        for o in options:
+            add_contract(o)
+        recorded += [stock, *options]
+
+    tickers, _ = await gather_snapshots_async(ib, recorded, fields=OPTION_FIELDS, timeout=15, lines=LINES)
+    for t in tickers:
+        quote = {f: getattr(t, f) for f in ('bid', 'ask', 'last', 'close', 'high', 'low', 'bidSize', 'askSize',
+                                            'lastSize', 'volume')
+                 if isinstance(getattr(t, f), (int, float)) and getattr(t, f) == getattr(t, f)
+                 and getattr(t, f) != -1}
+        if t.modelGreeks:
+            quote['greeks'] = {g: getattr(t.modelGreeks, g) or 0.0 for g in GREEK_FIELDS}
+        data['quotes'][str(t.contract.conId)] = quote
+    return Fixtures(data)
+
+
+def record_fixtures(ib, symbols, **kwargs):
+    return ib.run(record_fixtures_async(ib, symbols, **kwargs))
+
+
+# ========== CLI ==========
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Offline fake TWS/IB Gateway")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--fixtures", help="fixture-fil (.json eller .json.gz)")
+    parser.add_argument("--synthetic", nargs="*", metavar="SYMBOL", help="generér syntetiske fixtures")
+    parser.add_argument("--record", nargs="*", metavar="SYMBOL", help="optag fixtures fra TWS (config.CONFIG)")
+    parser.add_argument("--save", help="gem fixtures (fra --synthetic/--record) og afslut")
+    parser.add_argument("--latency", type=float, default=0.0, help="sekunder pr. svar")
+    parser.add_argument("--jitter", type=float, default=0.0, help="ekstra tilfældig latency (0..jitter s)")
+    parser.add_argument("--pacing", action="store_true", help="håndhæv IB's pacing-regler (fejl 162)")
+    parser.add_argument("--pacing-error-rate", type=float, default=0.0)
+    parser.add_argument("--max-lines", type=int, default=MAX_LINES)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+async def _serve(gateway, host, port):
+    await gateway.start(host, port)
+    print(f"🧪 Fake gateway på {host}:{gateway.port} (server version {SERVER_VERSION}) – Ctrl+C for at stoppe")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        print(f"📊 {gateway.stats()}")
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    if args.record:
+        from helpers import get_ib, disconnect_ib
+        fixtures = record_fixtures(get_ib(), args.record)
+        disconnect_ib()
+    elif args.fixtures:
+        fixtures = Fixtures.load(args.fixtures)
+    else:
+        fixtures = synthetic_fixtures(args.synthetic or ("AAPL", "SPY"), seed=args.seed)
+
+    if args.save:
+        fixtures.save(args.save)
+        print(f"💾 Fixtures gemt: {args.save} ({len(fixtures.contracts)} kontrakter)")
+    else:
+        gateway = FakeGateway(fixtures, latency=args.latency, jitter=args.jitter, pacing=args.pacing,
+                              pacing_error_rate=args.pacing_error_rate, max_lines=args.max_lines, seed=args.seed)
+        try:
+            asyncio.run(_serve(gateway, args.host, args.port))
+        except KeyboardInterrupt:
+            pass
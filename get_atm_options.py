@@ -1,49 +1,42 @@
-from ib_insync import IB, Stock
-import pandas as pd
-import numpy as np
+import asyncio
+from ib_insync import Stock
 import matplotlib.pyplot as plt
+from ib_pacing import PACER
+from bar_cache import BAR_CACHE
+from realized_vol import estimate
+from helpers import get_ib, disconnect_ib
 
 # === INPUT VARIABLER ===
 TICKER = "INTC"   # <- skriv din ønskede ticker her (f.eks. "MSFT", "TSLA")
 YEARS = 3         # <- antal års historik (f.eks. 1, 2, 5)
+RV_METHOD = "yang_zhang"  # <- 'close', 'parkinson', 'garman_klass', 'rogers_satchell', 'yang_zhang' eller 'ewma'
 
 # === CONNECT ===
-ib = IB()
-ib.connect('127.0.0.1', 7497, clientId=1)
-print("Connected:", ib.isConnected())
+ib = get_ib()
 
 ib.reqMarketDataType(3)  # Brug delayed data (3 = delayed)
 contract = Stock(TICKER, 'SMART', 'USD')
 durationStr = f"{YEARS} Y"
 
-# Hent historiske priser
-price_bars = ib.reqHistoricalData(
-    contract, '', durationStr, '1 day', 'TRADES', useRTH=True, formatDate=1
-)
-
-# Hent implied volatility
-iv_bars = ib.reqHistoricalData(
-    contract, '', durationStr, '1 day', 'OPTION_IMPLIED_VOLATILITY', useRTH=True, formatDate=1
-)
+# Hent historiske priser og implied volatility parallelt – gennem pacing-scheduleren,
+# så løkker over mange tickers ikke rammer IB's pacing violations.
+# Bar-cachen henter kun de dage, der mangler siden sidste kørsel (data/bars/).
+df_price, df_iv = ib.run(asyncio.gather(
+    BAR_CACHE.get_async(ib, contract, durationStr, '1 day', 'TRADES'),
+    BAR_CACHE.get_async(ib, contract, durationStr, '1 day', 'OPTION_IMPLIED_VOLATILITY'),
+))
+print("Pacing:", PACER.metrics())
 
-# Konverter til DataFrames
-df_price = pd.DataFrame(price_bars)
-df_iv = pd.DataFrame(iv_bars)
-df_price['date'] = pd.to_datetime(df_price['date'])
-df_iv['date'] = pd.to_datetime(df_iv['date'])
-df_price.set_index('date', inplace=True)
-df_iv.set_index('date', inplace=True)
+# === REALIZED VOLATILITY ===
+# OHLC-estimator over hele prisserien (før merge, så huller i IV-serien ikke påvirker vinduet)
+df_price = df_price.assign(rv_30d=estimate(df_price, RV_METHOD, window=30))
 
 # Merge
-df = df_price[['close']].rename(columns={'close': 'price'}).merge(
+df = df_price[['close', 'rv_30d']].rename(columns={'close': 'price'}).merge(
     df_iv[['close']].rename(columns={'close': 'iv'}),
     left_index=True, right_index=True, how='inner'
 )
 
-# === REALIZED VOLATILITY ===
-df['returns'] = np.log(df['price'] / df['price'].shift(1))
-df['rv_30d'] = df['returns'].rolling(window=30).std() * np.sqrt(252)
-
 # Beregn gennemsnit
 mean_iv = df['iv'].mean()
 mean_rv = df['rv_30d'].mean()
@@ -66,7 +59,7 @@ ax1a.tick_params(axis='y', labelcolor='blue')
 
 # IV og RV
 ax1b.plot(df.index, df['iv'], color='red', label='Implied Volatility')
-ax1b.plot(df.index, df['rv_30d'], color='green', linestyle='--', label='30D Realized Volatility')
+ax1b.plot(df.index, df['rv_30d'], color='green', linestyle='--', label=f'30D Realized Volatility ({RV_METHOD})')
 ax1b.axhline(mean_iv, color='red', linestyle=':', alpha=0.7, label=f'Mean IV ({mean_iv:.2%})')
 ax1b.axhline(mean_rv, color='green', linestyle=':', alpha=0.7, label=f'Mean RV ({mean_rv:.2%})')
 
@@ -97,4 +90,4 @@ ax2.set_title(f'{TICKER}: IV - RV Spread')
 plt.tight_layout()
 plt.show()
 
-ib.disconnect()
+disconnect_ib()
@@ -0,0 +1,243 @@
+# helpers.py
+# Fælles IB-session for alle scripts, styret af config.CONFIG.
+# Én langlivet forbindelse pr. proces, genbrugt på tværs af kald, automatisk reconnect
+# med backoff, og clientId-allokering så scripts, der kører side om side, ikke smider
+# hinanden af (TWS tillader kun én forbindelse pr. clientId).
+
+import asyncio
+import os
+import tempfile
+import time
+
+from ib_insync import IB, Stock, MarketOrder
+
+from config import CONFIG
+from ib_snapshots import gather_snapshots, STOCK_FIELDS
+from contract_cache import CONTRACT_CACHE
+from ib_pacing import PACER
+from metrics import METRICS
+
+CLIENT_ID_RANGE = 10              # prøv CONFIG["clientId"] .. CONFIG["clientId"] + 9
+RECONNECT_BACKOFF = (1, 2, 4, 8, 16, 30)
+CONNECT_TIMEOUT = 4
+CLIENT_ID_IN_USE = 326            # TWS-fejlkode; ib_insync rejser selv kun en tom TimeoutError
+
+_LOCK_DIR = os.path.join(tempfile.gettempdir(), "ibkr_client_ids")
+_held_locks = {}                  # clientId -> åben fil (låsen holdes, til processen slutter)
+
+
+def _try_lock(path):
+    """Ikke-blokerende eksklusiv fil-lås. OS'et frigiver den automatisk, når processen dør."""
+    fh = open(path, "a+")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        fh.close()
+        return None
+    return fh
+
+
+def allocate_client_id(base=None, count=CLIENT_ID_RANGE, skip=()):
+    """Første clientId i [base, base + count), som ingen anden lokal proces har reserveret."""
+    base = CONFIG["clientId"] if base is None else base
+    os.makedirs(_LOCK_DIR, exist_ok=True)
+    for client_id in range(base, base + count):
+        if client_id in skip:
+            continue
+        if client_id in _held_locks:
+            return client_id
+        fh = _try_lock(os.path.join(_LOCK_DIR, f"{CONFIG['port']}_{client_id}.lock"))
+        if fh is not None:
+            _held_locks[client_id] = fh
+            return client_id
+    raise RuntimeError(f"Ingen ledige clientIds i {base}-{base + count - 1}")
+
+
+def release_client_id(client_id):
+    fh = _held_locks.pop(client_id, None)
+    if fh is not None:
+        fh.close()
+
+
+class IBSession:
+
+    def __init__(self, config=CONFIG):
+        self.config = config
+        self.ib = IB()
+        self.client_id = None
+        self._wanted = False          # False efter disconnect() – så reconnecter vi ikke
+        self._reconnect_task = None
+        self._connecting = False      # fejlede forsøg udløser også disconnectedEvent
+        self._id_in_use = False       # sat af errorEvent (326) under et forbindelsesforsøg
+        self.ib.disconnectedEvent += self._on_disconnected
+        self.ib.errorEvent += self._on_error
+
+    def connect(self):
+        """Returnér den forbundne IB-instans (forbinder/reconnecter efter behov)."""
+        if self.ib.isConnected():
+            return self.ib
+        self._wanted = True
+
+        rejected = set()
+        self._connecting = True
+        try:
+            for attempt, delay in enumerate((0,) + RECONNECT_BACKOFF):
+                if delay:
+                    print(f"🔁 Forbindelse fejlede – prøver igen om {delay}s (forsøg {attempt + 1})")
+                    time.sleep(delay)
+                while True:
+                    # allocate_client_id rejser RuntimeError, når alle id'er i intervallet er afvist
+                    client_id = allocate_client_id(skip=rejected)
+                    self._id_in_use = False
+                    try:
+                        with METRICS.span('ib_connect'):
+                            self.ib.connect(self.config["host"], self.config["port"],
+                                            clientId=client_id, timeout=CONNECT_TIMEOUT)
+                    except (ConnectionError, OSError, asyncio.TimeoutError):
+                        if self._id_in_use:
+                            # En anden applikation (uden vores lås) bruger id'et – tag det næste med det samme
+                            self._reject_client_id(client_id, rejected)
+                            continue
+                        break
+                    self._on_connected(client_id)
+                    return self.ib
+        finally:
+            self._connecting = False
+        raise ConnectionError(f"Kunne ikke forbinde til IB på {self.config['host']}:{self.config['port']}")
+
+    async def connect_async(self):
+        if self.ib.isConnected():
+            return self.ib
+        self._wanted = True
+        self._connecting = True
+        try:
+            rejected = set()
+            for delay in (0,) + RECONNECT_BACKOFF:
+                await asyncio.sleep(delay)
+                if not self._wanted:
+                    return self.ib
+                while True:
+                    client_id = self.client_id or allocate_client_id(skip=rejected)
+                    self._id_in_use = False
+                    try:
+                        with METRICS.span('ib_connect', reconnect=True):
+                            await self.ib.connectAsync(self.config["host"], self.config["port"],
+                                                       clientId=client_id, timeout=CONNECT_TIMEOUT)
+                    except (ConnectionError, OSError, asyncio.TimeoutError):
+                        if self._id_in_use:
+                            # Id'et er overtaget, mens vi var væk – genbrug det ikke
+                            if client_id == self.client_id:
+                                self.client_id = None
+                            self._reject_client_id(client_id, rejected)
+                            continue
+                        break
+                    self._on_connected(client_id)
+                    return self.ib
+        finally:
+            self._connecting = False
+        raise ConnectionError(f"Kunne ikke genforbinde til IB på {self.config['host']}:{self.config['port']}")
+
+    def _on_error(self, reqId, errorCode, errorString, contract):
+        if errorCode == CLIENT_ID_IN_USE:
+            self._id_in_use = True
+
+    @staticmethod
+    def _reject_client_id(client_id, rejected):
+        release_client_id(client_id)
+        rejected.add(client_id)
+        print(f"⚠️ clientId {client_id} er allerede i brug – prøver det næste")
+
+    def _on_connected(self, client_id):
+        self.client_id = client_id
+        self.ib.reqMarketDataType(self.config.get("marketDataType", 1))
+        print(f"✅ Forbundet til IBKR ({self.config['host']}:{self.config['port']}, clientId={client_id})")
+
+    def _on_disconnected(self):
+        if not self._wanted or self._connecting:
+            return
+        print("⚠️ Forbindelsen til IBKR blev afbrudt – reconnecter...")
+        METRICS.count('ib_disconnects_total')
+        # Kører event-loopet (async kode), reconnectes i baggrunden; ellers ved næste connect()
+        try:
+            loop = asyncio.get_event_loop()
+        except RuntimeError:
+            return
+        if loop.is_running() and (self._reconnect_task is None or self._reconnect_task.done()):
+            self._reconnect_task = asyncio.ensure_future(self.connect_async())
+
+    def disconnect(self):
+        self._wanted = False
+        if self.ib.isConnected():
+            self.ib.disconnect()
+            print("🔌 Forbindelse afbrudt.")
+        if METRICS.enabled:
+            METRICS.collect('ib_pacing', PACER.metrics())
+            METRICS.collect('contract_cache', CONTRACT_CACHE.stats())
+            METRICS.print_summary()
+            METRICS.flush()
+        if self.client_id is not None:
+            release_client_id(self.client_id)
+            self.client_id = None
+
+
+# Én session pr. proces
+SESSION = IBSession()
+
+
+def get_ib() -> IB:
+    return SESSION.connect()
+
+
+def connect_ib() -> IB:
+    return SESSION.connect()
+
+
+def disconnect_ib():
+    SESSION.disconnect()
+
+
+def get_market_price(symbol, exchange="SMART", currency="USD"):
+    ib = get_ib()
+    contract = Stock(symbol, exchange, currency)
+    CONTRACT_CACHE.qualify(ib, contract)
+    (ticker,), _ = gather_snapshots(ib, [contract], fields=STOCK_FIELDS, timeout=5)
+    price = ticker.marketPrice()
+    if price != price:  # NaN -> brug seneste close
+        price = ticker.close
+    return price
+
+
+def get_account_summary():
+    ib = get_ib()
+    summary = ib.accountSummary()
+    for item in summary:
+        print(f"{item.account:>10} {item.tag:<30} {item.value:>18} {item.currency}")
+    return summary
+
+
+def get_positions():
+    ib = get_ib()
+    positions = ib.positions()
+    if not positions:
+        print("Ingen positioner.")
+    for p in positions:
+        print(f"{p.account:>10} {p.contract.symbol:<8} {p.position:>10} @ {p.avgCost:.2f}")
+    return positions
+
+
+def place_test_order(symbol, quantity, action="BUY"):
+    """Markedsordre – kun tilladt mod paper trading-porten (7497)."""
+    if CONFIG["port"] != 7497:
+        raise RuntimeError("place_test_order må kun bruges mod paper trading (port 7497)")
+    ib = get_ib()
+    contract = Stock(symbol, "SMART", "USD")
+    ib.qualifyContracts(contract)
+    trade = ib.placeOrder(contract, MarketOrder(action, quantity))
+    print(f"📝 Ordre sendt: {action} {quantity} {symbol} – status: {trade.orderStatus.status}")
+    return trade
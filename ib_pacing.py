@@ -0,0 +1,253 @@
+# ib_pacing.py
+# Scheduler for IB historical data requests, der overholder IB's pacing-regler:
+#   * identiske requests: mindst 15 s imellem
+#   * samme kontrakt/børs/whatToShow: højst 5 requests inden for 2 s (6 = violation)
+#   * højst 60 requests i et rullende 10-minutters vindue
+#   * højst 50 samtidige åbne historiske requests
+# Requests køes med prioritet (lavt tal = først), og så mange som reglerne tillader kører parallelt.
+# Virker både med asyncio (ib_insync) og med blokerende tråde (ibapi / Vol_Dashboard).
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from metrics import METRICS
+
+IDENTICAL_COOLDOWN = 15.0
+BURST_WINDOW = 2.0
+BURST_LIMIT = 5
+ROLLING_WINDOW = 600.0
+ROLLING_LIMIT = 60
+MAX_CONCURRENT = 50
+
+
+def request_key(contract, whatToShow, durationStr='', barSizeSetting='', endDateTime='', useRTH=True):
+    """
+    (contract_key, identical_key) for en historisk request.
+    Virker for både ib_insync- og ibapi-Contract (samme attributnavne).
+    """
+    contract_key = (
+        getattr(contract, 'conId', 0) or contract.symbol,
+        contract.secType,
+        contract.exchange,
+        whatToShow,
+    )
+    identical_key = contract_key + (str(endDateTime), durationStr, barSizeSetting, bool(useRTH))
+    return contract_key, identical_key
+
+
+class HistoricalPacer:
+
+    def __init__(self, identical_cooldown=IDENTICAL_COOLDOWN, burst_window=BURST_WINDOW,
+                 burst_limit=BURST_LIMIT, rolling_window=ROLLING_WINDOW, rolling_limit=ROLLING_LIMIT,
+                 max_concurrent=MAX_CONCURRENT):
+        self.identical_cooldown = identical_cooldown
+        self.burst_window = burst_window
+        self.burst_limit = burst_limit
+        self.rolling_window = rolling_window
+        self.rolling_limit = rolling_limit
+        self.max_concurrent = max_concurrent
+
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._sent = deque()                      # tidspunkter for alle requests (rullende vindue)
+        self._by_contract = defaultdict(deque)    # contract_key -> tidspunkter
+        self._last_identical = {}                 # identical_key -> tidspunkt
+        self._active = 0
+
+        # asyncio-kø
+        self._queue = []
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._loop = None
+        self._dispatcher = None
+
+        # metrics
+        self._submitted = 0
+        self._completed = 0
+        self._paced = 0
+        self._waits = deque(maxlen=1000)
+        self._max_depth = 0
+        self._blocking_waiters = 0
+
+    # ---------- regler ----------
+
+    def _ready_at(self, contract_key, identical_key, now):
+        """Tidligste tidspunkt hvor requesten må sendes (<= now betyder 'nu')."""
+        t = now
+        last = self._last_identical.get(identical_key)
+        if last is not None:
+            t = max(t, last + self.identical_cooldown)
+
+        burst = self._by_contract[contract_key]
+        while burst and burst[0] <= now - self.burst_window:
+            burst.popleft()
+        if len(burst) >= self.burst_limit:
+            t = max(t, burst[-self.burst_limit] + self.burst_window)
+
+        while self._sent and self._sent[0] <= now - self.rolling_window:
+            self._sent.popleft()
+        if len(self._sent) >= self.rolling_limit:
+            t = max(t, self._sent[-self.rolling_limit] + self.rolling_window)
+        return t
+
+    def _record(self, contract_key, identical_key, now):
+        self._sent.append(now)
+        self._by_contract[contract_key].append(now)
+        self._last_identical[identical_key] = now
+        self._active += 1
+
+    def _release(self):
+        with self._cond:
+            self._active -= 1
+            self._completed += 1
+            self._cond.notify_all()
+        if self._wakeup is not None:
+            # _release kan kaldes fra en anden tråd end event-loopet
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _note_wait(self, waited):
+        self._waits.append(waited)
+        if waited > 0.001:
+            self._paced += 1
+        METRICS.observe('ib_pacing_wait_seconds', waited)
+
+    # ---------- blokerende (tråde) ----------
+
+    @contextmanager
+    def slot(self, contract, whatToShow, durationStr='', barSizeSetting='', endDateTime='', useRTH=True):
+        """
+        Vent (blokerende) til requesten må sendes og hold en plads, til blokken forlades:
+
+            with pacer.slot(contract, 'TRADES', '1 Y', '1 day'):
+                app.reqHistoricalData(...)  # og vent på historicalDataEnd
+        """
+        ck, ik = request_key(contract, whatToShow, durationStr, barSizeSetting, endDateTime, useRTH)
+        start = time.monotonic()
+        with self._cond:
+            self._submitted += 1
+            self._blocking_waiters += 1
+            while True:
+                now = time.monotonic()
+                ready = self._ready_at(ck, ik, now)
+                if ready <= now and self._active < self.max_concurrent:
+                    break
+                self._cond.wait(timeout=max(ready - now, 0.05) if ready > now else None)
+            self._blocking_waiters -= 1
+            self._record(ck, ik, now)
+            self._note_wait(now - start)
+        try:
+            with METRICS.span('ib_historical', barSize=barSizeSetting, whatToShow=whatToShow):
+                yield
+        finally:
+            self._release()
+
+    # ---------- asyncio (ib_insync) ----------
+
+    async def submit(self, fn, contract, whatToShow, durationStr='', barSizeSetting='', endDateTime='',
+                     useRTH=True, priority=10):
+        """Kø en coroutine-fabrik fn() og returner dens resultat, når den har fået lov at køre."""
+        ck, ik = request_key(contract, whatToShow, durationStr, barSizeSetting, endDateTime, useRTH)
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), time.monotonic(), ck, ik, fn, future))
+        self._submitted += 1
+        self._max_depth = max(self._max_depth, len(self._queue))
+
+        if self._wakeup is None or self._loop is not loop:
+            self._wakeup = asyncio.Event()
+            self._loop = loop
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        self._wakeup.set()
+        return await future
+
+    async def req_historical(self, ib, contract, endDateTime, durationStr, barSizeSetting, whatToShow,
+                             useRTH=True, formatDate=1, priority=10, **kwargs):
+        """Paced udgave af ib.reqHistoricalDataAsync."""
+        async def fetch():
+            # Måles fra requesten sendes – ventetid i køen tæller i ib_pacing_wait_seconds
+            with METRICS.span('ib_historical', barSize=barSizeSetting, whatToShow=whatToShow):
+                t0 = time.perf_counter()
+                bars = await ib.reqHistoricalDataAsync(contract, endDateTime, durationStr, barSizeSetting,
+                                                       whatToShow, useRTH, formatDate, **kwargs)
+            if METRICS.enabled and bars:
+                METRICS.count('ib_bars_total', len(bars), barSize=barSizeSetting)
+                METRICS.gauge('ib_bars_per_second', len(bars) / max(time.perf_counter() - t0, 1e-6),
+                              barSize=barSizeSetting)
+            return bars
+
+        return await self.submit(fetch, contract, whatToShow, durationStr, barSizeSetting, endDateTime,
+                                 useRTH, priority)
+
+    async def _run(self, fn, future):
+        try:
+            result = await fn()
+            if not future.done():
+                future.set_result(result)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        finally:
+            self._release()
+
+    async def _dispatch(self):
+        while self._queue:
+            self._wakeup.clear()
+            next_ready = None
+            with self._lock:
+                now = time.monotonic()
+                deferred = []
+                # Gå køen igennem i prioritetsorden og start alt, der må køre nu
+                while self._queue and self._active < self.max_concurrent:
+                    item = heapq.heappop(self._queue)
+                    _, _, queued_at, ck, ik, fn, future = item
+                    if future.cancelled():
+                        continue
+                    ready = self._ready_at(ck, ik, now)
+                    if ready > now:
+                        deferred.append(item)
+                        next_ready = ready if next_ready is None else min(next_ready, ready)
+                        continue
+                    self._record(ck, ik, now)
+                    self._note_wait(now - queued_at)
+                    asyncio.ensure_future(self._run(fn, future))
+                for item in deferred:
+                    heapq.heappush(self._queue, item)
+
+            if not self._queue:
+                break
+            timeout = None if next_ready is None else max(next_ready - time.monotonic(), 0.01)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    # ---------- metrics ----------
+
+    def metrics(self):
+        """Kø-dybde, aktive requests og ventetider (sekunder)."""
+        with self._lock:
+            waits = sorted(self._waits)
+            now = time.monotonic()
+            in_window = sum(1 for t in self._sent if t > now - self.rolling_window)
+            return {
+                'queue_depth': len(self._queue) + self._blocking_waiters,
+                'max_queue_depth': self._max_depth,
+                'active': self._active,
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'paced': self._paced,
+                'requests_last_10min': in_window,
+                'wait_mean': sum(waits) / len(waits) if waits else 0.0,
+                'wait_p95': waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+                'wait_max': waits[-1] if waits else 0.0,
+            }
+
+
+# Én fælles pacer pr. proces – IB's grænser gælder for hele forbindelsen
+PACER = HistoricalPacer()
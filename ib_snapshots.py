@@ -0,0 +1,187 @@
+# ib_snapshots.py
+# "Gather snapshots": vent på market data, præcis så længe det er nødvendigt.
+# Hver ticker afsluttes, så snart de krævede felter er udfyldt, eller når IB sender
+# snapshot-end (tickSnapshotEnd). Én samlet deadline for hele batchen, og en rapport
+# over hvilke kontrakter der timede ud eller fejlede.
+
+import asyncio
+import math
+import time
+
+import pandas as pd
+
+from metrics import METRICS
+
+OPTION_FIELDS = ('bid', 'ask', 'modelGreeks')
+STOCK_FIELDS = ('last',)
+DEFAULT_TIMEOUT = 10.0
+
+REPORT_COLUMNS = ['contract', 'status', 'elapsed']
+
+# Samme opdeling som ib_insync: disse fejlkoder er kun advarsler
+_WARNING_CODES = {110, 165, 202, 399, 404, 434, 492, 10167}
+
+
+def _is_warning(code):
+    return code in _WARNING_CODES or 2100 <= code < 2200
+
+
+def has_fields(ticker, fields) -> bool:
+    """True når alle felter er sat (ikke None/NaN og ikke IB's -1 'ingen data')."""
+    for f in fields:
+        v = getattr(ticker, f, None)
+        if v is None:
+            return False
+        if isinstance(v, float) and (math.isnan(v) or v == -1):
+            return False
+    return True
+
+
+def _describe(contract):
+    parts = [contract.symbol, contract.lastTradeDateOrContractMonth,
+             contract.strike or '', contract.right]
+    return ' '.join(str(p) for p in parts if p)
+
+
+async def gather_snapshots_async(ib, contracts, fields=OPTION_FIELDS, timeout=DEFAULT_TIMEOUT,
+                                 snapshot=True, generic_ticks='', lines=None):
+    """
+    Request market data for alle kontrakter og vent, til hver enkelt er færdig.
+
+    snapshot=True bruger IB-snapshots (afsluttes senest ved snapshot-end);
+    snapshot=False streamer og afmelder hver kontrakt, så snart felterne er udfyldt.
+    lines (LineBudget): højst lines.max_lines åbne requests ad gangen – resten roteres ind,
+    efterhånden som linjer frigives, og timeout gælder så pr. kontrakt fra dens request.
+    Returnerer (tickers i samme rækkefølge som contracts, rapport-DataFrame).
+    Status i rapporten: 'complete', 'snapshot_end', 'error' eller 'timeout'.
+    """
+    loop = asyncio.get_event_loop()
+    t0 = time.monotonic()
+    contracts = list(contracts)
+    tickers = [None] * len(contracts)
+    waiters = {}     # ticker-id -> future der afsluttes når tickeren er færdig
+    status = {}
+    elapsed = {}
+    req_ids = {}
+    started = {}     # ticker-id -> hvornår requesten blev sendt (til first-tick latency)
+
+    def finish(ticker, state):
+        fut = waiters.get(id(ticker))
+        if fut is not None and not fut.done():
+            status[id(ticker)] = state
+            elapsed[id(ticker)] = time.monotonic() - t0
+            fut.set_result(ticker)
+            if not snapshot:
+                # Streaming: frigiv market data-linjen med det samme
+                ib.cancelMktData(ticker.contract)
+
+    def on_snapshot_end(fut, ticker):
+        if not fut.cancelled():
+            fut.exception()  # fejl rapporteres via errorEvent; undgå "never retrieved"
+        finish(ticker, 'snapshot_end')
+
+    def on_pending(pending):
+        for ticker in pending:
+            if id(ticker) in waiters:
+                if METRICS.enabled and id(ticker) in started:
+                    METRICS.observe('ib_first_tick_seconds', time.monotonic() - started.pop(id(ticker)))
+                if has_fields(ticker, fields):
+                    finish(ticker, 'complete')
+
+    def on_error(reqId, errorCode, errorString, contract):
+        ticker = req_ids.get(reqId)
+        if ticker is not None and not _is_warning(errorCode):
+            finish(ticker, 'error')
+
+    def start(contract):
+        if snapshot:
+            # Samme mønster som ib_insync.reqTickersAsync: future på snapshot-end
+            reqId = ib.client.getReqId()
+            end = ib.wrapper.startReq(reqId, contract)
+            ticker = ib.wrapper.startTicker(reqId, contract, 'snapshot')
+            ib.client.reqMktData(reqId, contract, '', True, False, [])
+            end.add_done_callback(lambda f, t=ticker: on_snapshot_end(f, t))
+        else:
+            ticker = ib.reqMktData(contract, generic_ticks, False, False)
+            reqId = ib.wrapper.ticker2ReqId['mktData'].get(ticker)
+        req_ids[reqId] = ticker
+        waiters[id(ticker)] = loop.create_future()
+        if METRICS.enabled:
+            started[id(ticker)] = time.monotonic()
+        if has_fields(ticker, fields):
+            finish(ticker, 'complete')
+        return reqId, ticker
+
+    def stop(reqId, ticker):
+        state = status.get(id(ticker))
+        if snapshot:
+            ib.wrapper.endTicker(ticker, 'snapshot')
+            # En snapshot holder linjen til snapshot-end – afmeld den, hvis vi er færdige før
+            if state not in ('snapshot_end', 'error'):
+                ib.client.cancelMktData(reqId)
+        elif state is None:
+            ib.cancelMktData(ticker.contract)
+
+    async def run(i, contract):
+        reqId = None
+        await lines.acquire()
+        try:
+            reqId, tickers[i] = start(contract)
+            await asyncio.wait([waiters[id(tickers[i])]], timeout=timeout)
+        finally:
+            if reqId is not None:
+                stop(reqId, tickers[i])
+            lines.release()
+
+    ib.pendingTickersEvent += on_pending
+    ib.errorEvent += on_error
+    try:
+        if lines is None:
+            for i, contract in enumerate(contracts):
+                tickers[i] = start(contract)[1]
+            remaining = max(timeout - (time.monotonic() - t0), 0)
+            await asyncio.wait(list(waiters.values()), timeout=remaining)
+        else:
+            await asyncio.gather(*(run(i, c) for i, c in enumerate(contracts)))
+    finally:
+        ib.pendingTickersEvent -= on_pending
+        ib.errorEvent -= on_error
+        if lines is None:
+            for reqId, ticker in req_ids.items():
+                stop(reqId, ticker)
+
+    report = pd.DataFrame([
+        {'contract': _describe(t.contract),
+         'status': status.get(id(t), 'timeout'),
+         'elapsed': elapsed.get(id(t), time.monotonic() - t0)}
+        for t in tickers
+    ], columns=REPORT_COLUMNS)
+    if METRICS.enabled:
+        _record_report(report, lines)
+    return tickers, report
+
+
+def _record_report(report, lines=None):
+    """Status-tællere, latency pr. status og fill ratio (andel 'complete') for batchen."""
+    for state, elapsed in zip(report['status'], report['elapsed']):
+        METRICS.count('ib_snapshots_total', status=state)
+        METRICS.observe('ib_snapshot_seconds', elapsed, status=state)
+    if len(report):
+        METRICS.gauge('ib_snapshot_fill_ratio', float((report['status'] == 'complete').mean()))
+    if lines is not None:
+        METRICS.collect('ib_lines', lines.metrics())
+
+
+def gather_snapshots(ib, contracts, fields=OPTION_FIELDS, timeout=DEFAULT_TIMEOUT,
+                     snapshot=True, generic_ticks='', lines=None):
+    """Synkron udgave til scripts (kører event-loopet via ib.run)."""
+    return ib.run(gather_snapshots_async(ib, contracts, fields, timeout, snapshot, generic_ticks, lines))
+
+
+def print_timeouts(report):
+    """Udskriv kontrakter der ikke nåede at levere data."""
+    missing = report[report['status'].isin(['timeout', 'error'])]
+    if not missing.empty:
+        print(f"⚠️ {len(missing)}/{len(report)} kontrakter uden komplette data:")
+        for _, row in missing.iterrows():
+            print(f"   {row['contract']}: {row['status']}")
@@ -0,0 +1,132 @@
+# iv_regime.py
+# Streaming IV-regime: rullende percentil over de seneste N bars med en sorteret
+# order-statistic-struktur (SortedList), så hver ny bar koster O(log n) i stedet for en
+# ny rolling().rank() over hele historikken. RegimeMonitor holder én percentil pr. symbol
+# og melder kun tilbage, når regime-bucket'en faktisk skifter.
+
+import math
+from collections import deque
+
+from sortedcontainers import SortedList
+
+WINDOW = 252
+
+# (nedre grænse, regime, farve) – percentil > grænse giver regimet
+REGIMES = (
+    (0.8, "HIGH iVOL", "red"),
+    (0.6, "ABOVE AVG iVOL", "orange"),
+    (0.4, "NORMAL iVOL", "black"),
+    (0.2, "BELOW AVG iVOL", "blue"),
+    (-math.inf, "LOW iVOL", "green"),
+)
+
+
+def regime_for(percentile):
+    """(regime, farve) for en percentil i [0, 1]; (None, None) hvis percentilen mangler."""
+    if percentile is None or math.isnan(percentile):
+        return None, None
+    for lower, regime, color in REGIMES:
+        if percentile > lower:
+            return regime, color
+
+
+class RollingPercentile:
+    """
+    Percentil-rang af seneste værdi blandt de seneste `window` værdier.
+    Samme definition som pandas rolling(window).rank(pct=True): gennemsnitlig rang ved
+    lighed, NaN indtil vinduet er fyldt.
+    """
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self._values = deque()
+        self._sorted = SortedList()
+
+    def __len__(self):
+        return len(self._values)
+
+    def _rank(self, value):
+        n = len(self._values)
+        if n < self.window:
+            return math.nan
+        below = self._sorted.bisect_left(value)
+        at_or_below = self._sorted.bisect_right(value)
+        return (below + at_or_below + 1) / 2 / n
+
+    def push(self, value):
+        """Ny bar: tilføj værdien (og fjern den ældste). Returnerer percentilen."""
+        if value != value:  # NaN kan ikke sorteres – springes over
+            return math.nan
+        self._values.append(value)
+        self._sorted.add(value)
+        if len(self._values) > self.window:
+            self._sorted.remove(self._values.popleft())
+        return self._rank(value)
+
+    def replace_last(self, value):
+        """Opdatering af den seneste (ufuldstændige) bar. Returnerer percentilen."""
+        if value != value:
+            return math.nan
+        if not self._values:
+            return self.push(value)
+        self._sorted.remove(self._values[-1])
+        self._values[-1] = value
+        self._sorted.add(value)
+        return self._rank(value)
+
+    @property
+    def last(self):
+        return self._values[-1] if self._values else None
+
+
+class RegimeMonitor:
+    """
+    Én RollingPercentile pr. symbol. update() tager bars i tidsorden (samme dato som
+    sidste bar = opdatering af den bar) og kalder on_change(symbol, regime, color, percentile),
+    kun når symbolets regime skifter.
+    """
+
+    def __init__(self, window=WINDOW, on_change=None):
+        self.window = window
+        self.on_change = on_change
+        self._pct = {}
+        self._last_date = {}
+        self._percentile = {}
+        self._regime = {}
+
+    def seed(self, symbol, values, dates=None):
+        """Fyld historik for et symbol (uden callbacks). Returnerer percentilen for hver værdi."""
+        rp = RollingPercentile(self.window)
+        self._pct[symbol] = rp
+        pcts = [rp.push(v) for v in values]
+        self._last_date[symbol] = dates[-1] if dates is not None and len(dates) else None
+        self._percentile[symbol] = pcts[-1] if pcts else math.nan
+        self._regime[symbol] = regime_for(self._percentile[symbol])[0]
+        return pcts
+
+    def update(self, symbol, date, value):
+        """Returnerer (percentil, regime-skift?)."""
+        rp = self._pct.setdefault(symbol, RollingPercentile(self.window))
+        if date is not None and date == self._last_date.get(symbol):
+            pct = rp.replace_last(value)
+        else:
+            pct = rp.push(value)
+            self._last_date[symbol] = date
+        self._percentile[symbol] = pct
+
+        regime, color = regime_for(pct)
+        changed = regime is not None and regime != self._regime.get(symbol)
+        if changed:
+            self._regime[symbol] = regime
+            if self.on_change is not None:
+                self.on_change(symbol, regime, color, pct)
+        return pct, changed
+
+    def percentile(self, symbol):
+        return self._percentile.get(symbol, math.nan)
+
+    def regime(self, symbol):
+        return self._regime.get(symbol)
+
+    def symbols(self):
+        return list(self._pct)
@@ -0,0 +1,157 @@
+# iv_solver.py
+# Batched implied volatility: inverterer en hel kæde/grid af optionspriser på én gang.
+# Rationelt startgæt (Corrado-Miller) + få sikrede Halley-skridt med bisektion som fallback.
+
+import time
+
+import numpy as np
+from scipy.optimize import brentq
+from scipy.special import ndtr
+
+from bs_pricing import bs_price, _is_call, _norm_pdf
+from metrics import METRICS
+
+SIGMA_LO = 1e-6   # samme søgeinterval som den gamle brentq-løsning
+SIGMA_HI = 5.0
+
+
+def _initial_guess(C, F, K, T):
+    """Corrado-Miller på forward-basis (udiskonterede call-priser), klippet til [LO, HI]."""
+    a = C - 0.5 * (F - K)
+    disc = a * a - (F - K) ** 2 / np.pi
+    cm = np.sqrt(2.0 * np.pi / T) / (F + K) * (a + np.sqrt(np.maximum(disc, 0.0)))
+    # Brenner-Subrahmanyam når diskriminanten er negativ (langt ude af pengene)
+    bs = np.sqrt(2.0 * np.pi / T) * C / F
+    guess = np.where(disc > 0, cm, bs)
+    guess = np.where(np.isfinite(guess) & (guess > 0), guess, 0.3)
+    return np.clip(guess, 0.01, SIGMA_HI)
+
+
+def _black_otm(F, K, T, sigma, use_call):
+    """Udiskonteret Black-pris for den out-of-the-money side samt vega og volga."""
+    sqrt_T = np.sqrt(T)
+    v = sigma * sqrt_T
+    d1 = (np.log(F / K) + 0.5 * v * v) / v
+    d2 = d1 - v
+    price = np.where(use_call, F * ndtr(d1) - K * ndtr(d2), K * ndtr(-d2) - F * ndtr(-d1))
+    vega = F * _norm_pdf(d1) * sqrt_T
+    volga = vega * d1 * d2 / sigma
+    return price, vega, volga
+
+
+@METRICS.timed('analytics_implied_vol')
+def implied_vol_batch(price, S, K, T, r=0.0, q=0.0, right='C', tol=1e-10, max_iter=30):
+    """
+    Implied volatility for arrays af optionspriser (broadcastes som i bs_pricing).
+
+    Returnerer (iv, converged). Priser uden for no-arbitrage grænserne,
+    T <= 0 eller løsninger uden for [1e-6, 5] giver NaN og converged=False
+    i stedet for en exception.
+    """
+    price, S, K, T, r, q = (np.asarray(a, dtype=float) for a in (price, S, K, T, r, q))
+    is_call = _is_call(right)
+    price, S, K, T, r, q, is_call = np.broadcast_arrays(price, S, K, T, r, q, is_call)
+
+    valid_T = T > 0
+    T_safe = np.where(valid_T, T, 1.0)
+    df_r = np.exp(-r * T_safe)
+    F = S * np.exp((r - q) * T_safe)
+
+    # Udiskonteret call-pris (put-call parity for puts) til grænser og startgæt
+    undisc = price / df_r
+    C = np.where(is_call, undisc, undisc + (F - K))
+    ok = valid_T & np.isfinite(C) & (C > np.maximum(F - K, 0.0)) & (C < F) & (K > 0) & (S > 0)
+
+    # Inaktive celler får harmløse værdier, så der ikke opstår warnings undervejs
+    C = np.where(ok, C, 0.5 * F)
+    Kc = np.where(ok, K, F)
+    Tc = np.where(ok, T_safe, 1.0)
+
+    # Der itereres på OTM-siden, hvor prisen er følsom over for sigma
+    use_call = Kc >= F
+    target = np.where(use_call, C, C - (F - Kc))
+    # ITM-priser konverteret via parity mister tidsværdien i afrundingsstøj
+    noise = 1e-13 * (np.abs(undisc) + np.abs(F - Kc))
+    ok &= (use_call == is_call) | (target > noise)
+    target = np.where(ok, target, 0.5 * F)
+    log_target = np.log(target)
+
+    sigma = _initial_guess(C, F, Kc, Tc)
+    lo = np.full_like(sigma, SIGMA_LO)
+    hi = np.full_like(sigma, SIGMA_HI)
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore', under='ignore'):
+        # Løsning skal ligge i [LO, HI] – ellers NaN som ved brentq
+        p_lo, _, _ = _black_otm(F, Kc, Tc, lo, use_call)
+        p_hi, _, _ = _black_otm(F, Kc, Tc, hi, use_call)
+        ok &= (target >= p_lo) & (target <= p_hi)
+
+        converged = ~ok
+        for _ in range(max_iter):
+            # Newton/Halley på log-prisen: robust også for dybt OTM (meget små priser)
+            p, vega, volga = _black_otm(F, Kc, Tc, sigma, use_call)
+            f = np.log(p) - log_target
+            converged |= np.abs(f) <= tol
+            if converged.all():
+                break
+
+            # Opdater bracket: prisen er voksende i sigma
+            hi = np.where(f > 0, sigma, hi)
+            lo = np.where(f < 0, sigma, lo)
+
+            d1f = vega / p
+            d2f = volga / p - d1f * d1f
+            newton = f / d1f
+            halley = newton / (1.0 - 0.5 * newton * d2f / d1f)
+            step = np.where(np.isfinite(halley), halley, newton)
+            candidate = sigma - step
+
+            # Sikring: hop uden for bracket -> bisektion
+            safe = np.isfinite(candidate) & (candidate > lo) & (candidate < hi)
+            candidate = np.where(safe, candidate, 0.5 * (lo + hi))
+            converged |= ok & (hi - lo <= 1e-14 * hi)
+            sigma = np.where(converged, sigma, candidate)
+
+    iv = np.where(ok, sigma, np.nan)
+    return iv, converged & ok
+
+
+# === Reference: den oprindelige per-option brentq-tilgang ===
+def implied_vol_brentq(price, S, K, T, r, q=0.0, right='C'):
+    def objective(sigma):
+        return float(bs_price(S, K, T, sigma, r, q, right)) - price
+
+    try:
+        return brentq(objective, SIGMA_LO, SIGMA_HI)
+    except ValueError:
+        return np.nan
+
+
+def benchmark(n_strikes=50, n_maturities=40, S=100.0, r=0.01):
+    """Sammenlign batch-solveren med brentq-løkken på et syntetisk smile-grid."""
+    strikes = np.linspace(0.6 * S, 1.4 * S, n_strikes)
+    maturities = np.linspace(0.02, 2.0, n_maturities)
+    K, T = np.meshgrid(strikes, maturities)
+    true_iv = 0.25 + 0.0015 * (K - S) ** 2 / S
+    prices = bs_price(S, K, T, true_iv, r)
+
+    t0 = time.perf_counter()
+    loop_iv = np.array([implied_vol_brentq(p, S, k, t, r)
+                        for p, k, t in zip(prices.ravel(), K.ravel(), T.ravel())]).reshape(K.shape)
+    t_loop = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    batch_iv, conv = implied_vol_batch(prices, S, K, T, r)
+    t_batch = time.perf_counter() - t0
+
+    both = np.isfinite(loop_iv) & np.isfinite(batch_iv)
+    print(f"Grid: {K.size} optioner")
+    print(f"brentq-løkke : {t_loop*1e3:9.2f} ms")
+    print(f"batch-solver : {t_batch*1e3:9.2f} ms  ({t_loop / t_batch:.0f}x hurtigere)")
+    print(f"Konvergeret  : {conv.sum()}/{conv.size}")
+    print(f"Max |batch - brentq|: {np.nanmax(np.abs(batch_iv[both] - loop_iv[both])):.2e}")
+    print(f"Max |batch - sand IV|: {np.nanmax(np.abs(batch_iv[conv] - true_iv[conv])):.2e}")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,345 @@
+# metrics.py
+# Instrumentering af hot paths: timing-spans, tællere og histogrammer for IB- og Yahoo-kald
+# og analytics-stadierne (connect, qualify, reqSecDefOptParams, første market data-tick,
+# historiske bars, pandas-behandling).
+#
+# Slået fra som standard – så koster et span kun et flag-tjek og et fælles no-op objekt.
+# Slås til med miljøvariabler (læses ved import) eller METRICS.enable(...):
+#   IBKR_METRICS=data/metrics.prom    Prometheus-tekst, skrives ved exit (og ved METRICS.flush())
+#   IBKR_METRICS=data/metrics.jsonl   én JSON-linje pr. hændelse, skrives løbende
+#   IBKR_METRICS_PORT=9108            HTTP-endpoint: /metrics (Prometheus) og /metrics.json
+#
+#   with METRICS.span('ib_qualify', n=len(contracts)):   # -> ib_qualify_seconds (histogram)
+#       ...
+#   METRICS.count('ib_bars_total', len(bars), barSize='1 day')
+#
+# Labels med få mulige værdier (barSize, status, model) – aldrig symboler/strikes pr. kontrakt.
+
+import asyncio
+import atexit
+import functools
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Sekunder – fra et cache-hit i SQLite til en langsom historisk request
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _NullSpan:
+    """Det fælles span, når instrumenteringen er slået fra."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **labels):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('_metrics', 'name', 'labels', '_t0')
+
+    def __init__(self, metrics, name, labels):
+        self._metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def set(self, **labels):
+        """Tilføj labels, der først kendes undervejs (fx status)."""
+        self.labels.update(labels)
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._t0
+        if exc_type is not None:
+            self.labels.setdefault('status', 'error')
+        self._metrics.observe(f"{self.name}_seconds", elapsed, **self.labels)
+        return False
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)    # sidste = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Groft estimat ud fra buckets (øvre grænse for den bucket, kvantilen lander i)."""
+        if not self.count:
+            return 0.0
+        target, seen = q * self.count, 0
+        for bound, n in zip(self.buckets + (math.inf,), self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return math.inf
+
+
+def _key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value):
+    """Label-værdi efter Prometheus' tekstformat: \\ -> \\\\, " -> \\" og linjeskift -> \\n."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _fmt_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ''
+    body = ','.join(f'{k}="{_escape(v)}"' for k, v in items)
+    return '{' + body + '}'
+
+
+class Metrics:
+
+    def __init__(self, buckets=BUCKETS):
+        self.enabled = False
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}      # (navn, labels) -> værdi
+        self._gauges = {}
+        self._hists = {}
+        self._jsonl = None
+        self._prom_path = None
+        self._server = None
+        self._atexit = False
+
+    # ---------- til/fra ----------
+
+    def enable(self, path=None, port=None):
+        """
+        Slå instrumenteringen til. path: '.jsonl' = hændelseslog, ellers Prometheus-tekst ved exit.
+        port: start et HTTP-endpoint (/metrics og /metrics.json) i en baggrundstråd.
+        """
+        self.enabled = True
+        if path:
+            path = Path(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if path.suffix == '.jsonl':
+                self._jsonl = open(path, 'a', buffering=1, encoding='utf-8')
+            else:
+                self._prom_path = path
+        if port:
+            self.serve(int(port))
+        if not self._atexit:
+            atexit.register(self.close)
+            self._atexit = True
+        return self
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._hists.clear()
+
+    # ---------- registrering ----------
+
+    def span(self, name, **labels):
+        """Context manager der måler varigheden som histogrammet <name>_seconds."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, labels)
+
+    def timed(self, name, **labels):
+        """Decorator-udgave af span() – virker på både almindelige funktioner og coroutines."""
+        def decorate(fn):
+            if asyncio.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        return await fn(*args, **kwargs)
+                    with _Span(self, name, dict(labels)):
+                        return await fn(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with _Span(self, name, dict(labels)):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def count(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        k = (name, _key(labels))
+        with self._lock:
+            self._counters[k] = self._counters.get(k, 0) + value
+        self._event('counter', name, value, labels)
+
+    def gauge(self, name, value, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[(name, _key(labels))] = value
+        self._event('gauge', name, value, labels)
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        k = (name, _key(labels))
+        with self._lock:
+            hist = self._hists.get(k)
+            if hist is None:
+                hist = self._hists[k] = _Histogram(self.buckets)
+            hist.observe(value)
+        self._event('histogram', name, value, labels)
+
+    def collect(self, prefix, values, **labels):
+        """Læg et metrics-dict (PACER.metrics(), LINES.metrics(), CONTRACT_CACHE.stats()) ind som gauges."""
+        for k, v in values.items():
+            if isinstance(v, (int, float)) and not isinstance(v, bool):
+                self.gauge(f"{prefix}_{k}", v, **labels)
+
+    def _event(self, kind, name, value, labels):
+        fh = self._jsonl
+        if fh is not None:
+            line = json.dumps({'ts': time.time(), 'type': kind, 'name': name, 'value': value,
+                               'labels': {k: str(v) for k, v in labels.items()}})
+            with self._lock:
+                fh.write(line + '\n')
+
+    # ---------- eksport ----------
+
+    def snapshot(self):
+        """Alle metrics som et JSON-venligt dict."""
+        with self._lock:
+            return {
+                'counters': [{'name': n, 'labels': dict(k), 'value': v} for (n, k), v in self._counters.items()],
+                'gauges': [{'name': n, 'labels': dict(k), 'value': v} for (n, k), v in self._gauges.items()],
+                'histograms': [
+                    {'name': n, 'labels': dict(k), 'count': h.count, 'sum': h.sum,
+                     'p50': h.quantile(0.5), 'p95': h.quantile(0.95),
+                     'buckets': dict(zip([str(b) for b in h.buckets] + ['+Inf'], h.counts))}
+                    for (n, k), h in self._hists.items()
+                ],
+            }
+
+    def prometheus(self):
+        """Prometheus text exposition format (0.0.4)."""
+        out = []
+        with self._lock:
+            typed = set()
+
+            def header(name, kind):
+                if name not in typed:
+                    typed.add(name)
+                    out.append(f"# TYPE {name} {kind}")
+
+            for (name, key), v in sorted(self._counters.items()):
+                header(name, 'counter')
+                out.append(f"{name}{_fmt_labels(key)} {v:g}")
+            for (name, key), v in sorted(self._gauges.items()):
+                header(name, 'gauge')
+                out.append(f"{name}{_fmt_labels(key)} {v:g}")
+            for (name, key), h in sorted(self._hists.items()):
+                header(name, 'histogram')
+                cumulative = 0
+                for bound, n in zip(h.buckets + ('+Inf',), h.counts):
+                    cumulative += n
+                    out.append(f"{name}_bucket{_fmt_labels(key, [('le', f'{bound:g}' if bound != '+Inf' else bound)])} "
+                               f"{cumulative}")
+                out.append(f"{name}_sum{_fmt_labels(key)} {h.sum:.6g}")
+                out.append(f"{name}_count{_fmt_labels(key)} {h.count}")
+        return '\n'.join(out) + '\n'
+
+    def write_prometheus(self, path):
+        """Skriv atomisk (tmp + rename), så en node_exporter textfile-collector aldrig læser en halv fil."""
+        path = Path(path)
+        tmp = path.with_suffix(path.suffix + '.tmp')
+        tmp.write_text(self.prometheus(), encoding='utf-8')
+        os.replace(tmp, path)
+
+    def flush(self):
+        if self._prom_path is not None:
+            self.write_prometheus(self._prom_path)
+        if self._jsonl is not None:
+            self._jsonl.flush()
+
+    def close(self):
+        self.flush()
+        if self._jsonl is not None:
+            self._jsonl.close()
+            self._jsonl = None
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+
+    def serve(self, port, host='127.0.0.1'):
+        """HTTP-endpoint i en daemon-tråd: /metrics (Prometheus) og /metrics.json."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith('/metrics.json'):
+                    body, ctype = json.dumps(metrics.snapshot()).encode(), 'application/json'
+                elif self.path.startswith('/metrics'):
+                    body, ctype = metrics.prometheus().encode(), 'text/plain; version=0.0.4'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', ctype)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"📈 Metrics på http://{host}:{self._server.server_address[1]}/metrics")
+        return self._server
+
+    # ---------- oversigt ----------
+
+    def print_summary(self):
+        """Kort tekstoversigt over spans (antal, sum, p50/p95) – til slutningen af et script."""
+        snap = self.snapshot()
+        spans = sorted((h for h in snap['histograms'] if h['name'].endswith('_seconds')),
+                       key=lambda h: -h['sum'])
+        if not spans:
+            return
+        print("⏱️ Tidsforbrug:")
+        for h in spans:
+            labels = ' '.join(f"{k}={v}" for k, v in h['labels'].items())
+            print(f"   {h['name'][:-8]:<28} {labels:<24} n={h['count']:<5} sum={h['sum']:.3f}s "
+                  f"p50≤{h['p50']:g}s p95≤{h['p95']:g}s")
+
+
+# Én registry pr. proces
+METRICS = Metrics()
+
+if os.environ.get("IBKR_METRICS") or os.environ.get("IBKR_METRICS_PORT"):
+    METRICS.enable(os.environ.get("IBKR_METRICS"), os.environ.get("IBKR_METRICS_PORT"))
@@ -0,0 +1,98 @@
+# mkt_data_lines.py
+# Budget for samtidige market data-linjer. IB giver en konto et fast antal linjer
+# (standard 100); ligger man over, kommer tickers bare tomt tilbage uden fejl.
+# LineBudget holder højst max_lines abonnementer åbne og lader resten vente i kø –
+# så snart en snapshot er færdig, overtager den næste kontrakt linjen (rotation).
+# Bruges af ib_snapshots.gather_snapshots(..., lines=LINES).
+
+import asyncio
+import time
+from collections import deque
+
+from config import CONFIG
+
+ACCOUNT_LINES = CONFIG.get("marketDataLines", 100)
+RESERVED_LINES = 10      # holdes fri til andre scripts / streaming på samme konto
+RATE_WINDOW = 10.0       # sekunder bag throughput-målingen
+
+
+class LineBudget:
+
+    def __init__(self, max_lines=ACCOUNT_LINES - RESERVED_LINES):
+        self.max_lines = max_lines
+        self._in_use = 0
+        self._waiters = deque()
+        self._done_at = deque()     # tidspunkter for afsluttede abonnementer (til throughput)
+
+        # metrics
+        self._peak = 0
+        self._started = 0
+        self._completed = 0
+        self._first_start = None
+
+    async def acquire(self):
+        """Vent på en ledig linje."""
+        if self._in_use < self.max_lines and not self._waiters:
+            self._take()
+            return
+        fut = asyncio.get_event_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release()     # linjen blev tildelt, lige før vi blev afbrudt
+            raise
+
+    def _take(self):
+        self._in_use += 1
+        self._started += 1
+        self._peak = max(self._peak, self._in_use)
+        if self._first_start is None:
+            self._first_start = time.monotonic()
+
+    def release(self):
+        """Frigiv en linje og giv den videre til den næste i køen."""
+        self._in_use -= 1
+        self._completed += 1
+        self._done_at.append(time.monotonic())
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                self._take()
+                fut.set_result(None)
+                break
+
+    # ---------- metrics ----------
+
+    def throughput(self):
+        """Afsluttede kontrakter pr. sekund over de seneste RATE_WINDOW sekunder."""
+        now = time.monotonic()
+        while self._done_at and self._done_at[0] <= now - RATE_WINDOW:
+            self._done_at.popleft()
+        if not self._done_at:
+            return 0.0
+        span = min(RATE_WINDOW, now - self._first_start) if self._first_start else RATE_WINDOW
+        return len(self._done_at) / max(span, 1e-3)
+
+    def metrics(self):
+        return {
+            'max_lines': self.max_lines,
+            'in_use': self._in_use,
+            'peak_in_use': self._peak,
+            'waiting': sum(1 for f in self._waiters if not f.done()),
+            'started': self._started,
+            'completed': self._completed,
+            'contracts_per_s': self.throughput(),
+        }
+
+
+def print_line_usage(lines, elapsed=None):
+    m = lines.metrics()
+    rate = m['completed'] / elapsed if elapsed else m['contracts_per_s']
+    print(f"📡 {m['completed']} kontrakter, {rate:.1f}/s | linjer i brug {m['in_use']}/{m['max_lines']} "
+          f"(maks {m['peak_in_use']})")
+
+
+# Ét fælles budget pr. proces – grænsen gælder for hele kontoen
+LINES = LineBudget()
@@ -0,0 +1,186 @@
+# realized_vol.py
+# Realiseret volatilitet fra OHLC-bars: close-to-close, Parkinson, Garman-Klass,
+# Rogers-Satchell, Yang-Zhang og EWMA. Alle estimatorer virker på 1-D arrays (én ticker)
+# eller 2-D arrays (datoer x symboler) i ét vektoriseret gennemløb – rullende vinduer via
+# kumulerede summer, ingen Python-løkke over datoer eller symboler.
+# Resultatet er annualiseret (periods=252 for daglige bars); NaN indtil vinduet er fyldt.
+
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+from metrics import METRICS
+
+WINDOW = 30
+PERIODS = 252
+EWMA_LAMBDA = 0.94   # RiskMetrics
+
+OHLC = ('open', 'high', 'low', 'close')
+
+
+def _rolling_mean(x, window):
+    """Rullende gennemsnit langs akse 0; NaN hvis vinduet indeholder NaN eller ikke er fyldt."""
+    valid = np.isfinite(x)
+    gaps = not valid.all()
+    csum = np.cumsum(np.where(valid, x, 0.0) if gaps else x, axis=0)
+    total = csum[window - 1:].copy()
+    total[1:] -= csum[:-window]
+    out = np.full(x.shape, np.nan)
+    out[window - 1:] = total / window
+    if gaps:
+        ccount = np.cumsum(valid, axis=0, dtype=np.int32)
+        count = ccount[window - 1:].copy()
+        count[1:] -= ccount[:-window]
+        out[window - 1:][count < window] = np.nan
+    return out
+
+
+def _rolling_var(x, window):
+    """Rullende stikprøvevarians (ddof=1) – samme som pandas rolling(window).var()."""
+    mean = _rolling_mean(x, window)
+    mean_sq = _rolling_mean(x * x, window)
+    return np.maximum(mean_sq - mean * mean, 0.0) * window / (window - 1)
+
+
+def _prev(x):
+    """x forskudt én dato frem (første række NaN)."""
+    out = np.empty_like(x)
+    out[0] = np.nan
+    out[1:] = x[:-1]
+    return out
+
+
+def _annualize(var, periods):
+    return np.sqrt(var * periods)
+
+
+def close_to_close(open_, high, low, close, window=WINDOW, periods=PERIODS):
+    r = np.log(close / _prev(close))
+    return _annualize(_rolling_var(r, window), periods)
+
+
+def parkinson(open_, high, low, close, window=WINDOW, periods=PERIODS):
+    hl = np.log(high / low)
+    return _annualize(_rolling_mean(hl * hl, window) / (4 * np.log(2)), periods)
+
+
+def garman_klass(open_, high, low, close, window=WINDOW, periods=PERIODS):
+    hl = np.log(high / low)
+    co = np.log(close / open_)
+    return _annualize(np.maximum(_rolling_mean(0.5 * hl * hl - (2 * np.log(2) - 1) * co * co, window), 0.0),
+                      periods)
+
+
+def _rs_terms(open_, high, low, close):
+    return np.log(high / close) * np.log(high / open_) + np.log(low / close) * np.log(low / open_)
+
+
+def rogers_satchell(open_, high, low, close, window=WINDOW, periods=PERIODS):
+    return _annualize(_rolling_mean(_rs_terms(open_, high, low, close), window), periods)
+
+
+def yang_zhang(open_, high, low, close, window=WINDOW, periods=PERIODS):
+    overnight = np.log(open_ / _prev(close))
+    open_close = np.log(close / open_)
+    k = 0.34 / (1.34 + (window + 1) / (window - 1))
+    var = (_rolling_var(overnight, window) + k * _rolling_var(open_close, window)
+           + (1 - k) * _rolling_mean(_rs_terms(open_, high, low, close), window))
+    return _annualize(var, periods)
+
+
+def ewma_vol(close, lam=EWMA_LAMBDA, periods=PERIODS, seed_window=WINDOW):
+    """
+    EWMA (RiskMetrics): var_t = lam * var_{t-1} + (1 - lam) * r_t^2, filtreret langs akse 0
+    for alle symboler på én gang. Startværdi = gennemsnit af de første seed_window r^2.
+    Manglende afkast (NaN) bidrager med 0.
+    """
+    close = np.asarray(close, dtype=float)
+    r2 = np.log(close / _prev(close)) ** 2
+    missing = ~np.isfinite(r2)
+    seed = np.nanmean(r2[1:seed_window + 1], axis=0)
+    r2 = np.where(missing, 0.0, r2)
+    zi = np.expand_dims(lam * np.nan_to_num(seed), 0)
+    var, _ = lfilter([1 - lam], [1, -lam], r2, axis=0, zi=zi)
+    var[0] = np.nan
+    return _annualize(var, periods)
+
+
+ESTIMATORS = {
+    'close': close_to_close,
+    'parkinson': parkinson,
+    'garman_klass': garman_klass,
+    'rogers_satchell': rogers_satchell,
+    'yang_zhang': yang_zhang,
+}
+
+
+# ========== pandas-indgang ==========
+
+def ohlc_panel(frames):
+    """{symbol: DataFrame med open/high/low/close} -> dict af (datoer x symboler)-DataFrames."""
+    return {f: pd.DataFrame({sym: df[f] for sym, df in frames.items()}).sort_index() for f in OHLC}
+
+
+def estimate(ohlc, method='yang_zhang', window=WINDOW, periods=PERIODS):
+    """
+    Realiseret vol for én ticker (DataFrame med OHLC-kolonner -> Series) eller et panel
+    (dict fra ohlc_panel -> DataFrame datoer x symboler). method: en af ESTIMATORS eller 'ewma'
+    (med lam = 1 - 2 / (window + 1)).
+    """
+    if isinstance(ohlc, pd.DataFrame):
+        index, columns = ohlc.index, None
+    else:
+        index, columns = ohlc['close'].index, ohlc['close'].columns
+    arrays = [ohlc[f].to_numpy(dtype=float) for f in OHLC]
+
+    with np.errstate(divide='ignore', invalid='ignore'), METRICS.span('analytics_realized_vol', method=method):
+        if method == 'ewma':
+            values = ewma_vol(arrays[3], lam=1 - 2 / (window + 1), periods=periods, seed_window=window)
+        else:
+            values = ESTIMATORS[method](*arrays, window=window, periods=periods)
+
+    if columns is None:
+        return pd.Series(values, index=index, name=f'rv_{method}')
+    return pd.DataFrame(values, index=index, columns=columns)
+
+
+def rv_panel(frames, method='yang_zhang', window=WINDOW, periods=PERIODS):
+    """Rullende RV for hele universet: {symbol: OHLC-DataFrame} -> DataFrame (datoer x symboler)."""
+    return estimate(ohlc_panel(frames), method, window, periods)
+
+
+# === Benchmark: hele universet i ét gennemløb vs pandas pr. ticker ===
+def _synthetic_panel(n_days=2520, n_symbols=500, seed=0):
+    rng = np.random.default_rng(seed)
+    ret = rng.normal(0, 0.02, (n_days, n_symbols))
+    close = 100 * np.exp(np.cumsum(ret, axis=0))
+    open_ = close * np.exp(rng.normal(0, 0.005, close.shape))
+    spread = np.abs(rng.normal(0, 0.01, close.shape))
+    high = np.maximum(open_, close) * np.exp(spread)
+    low = np.minimum(open_, close) * np.exp(-spread)
+    return open_, high, low, close
+
+
+def benchmark(n_days=2520, n_symbols=500):
+    o, h, l, c = _synthetic_panel(n_days, n_symbols)
+    print(f"Panel {n_days} dage x {n_symbols} symboler")
+    for name, fn in ESTIMATORS.items():
+        t0 = time.perf_counter()
+        fn(o, h, l, c)
+        print(f"{name:>16}: {(time.perf_counter() - t0) * 1e3:8.1f} ms")
+    t0 = time.perf_counter()
+    ewma_vol(c)
+    print(f"{'ewma':>16}: {(time.perf_counter() - t0) * 1e3:8.1f} ms")
+
+    # Reference: pandas close-to-close, én ticker ad gangen
+    t0 = time.perf_counter()
+    for j in range(n_symbols):
+        s = pd.Series(c[:, j])
+        (np.log(s / s.shift(1))).rolling(WINDOW).std() * np.sqrt(PERIODS)
+    print(f"{'pandas pr. ticker':>16}: {(time.perf_counter() - t0) * 1e3:8.1f} ms (kun close-to-close)")
+
+
+if __name__ == "__main__":
+    benchmark()
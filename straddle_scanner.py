@@ -0,0 +1,169 @@
+# straddle_scanner.py
+# ATM straddle-scanner for en hel ticker-liste: alle expiries inden for MAX_DAYS dage.
+# Strikes findes fra chain-parametrene (reqSecDefOptParams, ét kald pr. ticker) i stedet for
+# reqContractDetails pr. børs, og alle ATM calls/puts hentes samtidigt – roteret gennem et
+# linjebudget, så der aldrig er flere åbne market data-linjer end MAX_LINES.
+# Output: straddle-summary (implied move, breakevens, vega-vægtet IV) for hele universet.
+
+import asyncio
+import datetime as dt
+import math
+from pathlib import Path
+
+import pandas as pd
+from ib_insync import Stock, Option
+
+from ib_snapshots import gather_snapshots_async, print_timeouts, STOCK_FIELDS
+from helpers import get_ib, disconnect_ib
+from mkt_data_lines import LineBudget, print_line_usage
+from contract_cache import CONTRACT_CACHE
+
+# ========= INPUT =========
+TICKERS = ["AAPL", "MSFT", "NVDA", "AMZN", "SPY", "QQQ"]
+MAX_DAYS = 60         # alle expiries med 0 < dage til udløb <= MAX_DAYS
+MAX_LINES = 90        # samtidige market data-linjer (IB's standardgrænse er 100)
+ATM_CANDIDATES = 2    # nærmeste strikes der prøves, hvis den nærmeste ikke findes for en expiry
+USE_DELAYED = True
+OUT_DIR = Path(__file__).resolve().parent / "data" / "straddles"
+
+SUMMARY_COLUMNS = ["Underlying", "Expiry", "DaysToExpiry", "Strike(ATM)", "Spot", "StraddlePrice",
+                   "StraddlePctOfSpot", "Breakeven_Down", "Breakeven_Up", "CombinedIV_VegaWeighted",
+                   "AnnualizedImpliedMove", "ImpliedDailyMovePct", "ImpliedDailyMoveUSD"]
+
+
+def straddle_summary(ticker, expiry, spot, strike, gc, gp, call_price, put_price, today=None):
+    """Én række straddle-metrics (samme kolonner som ATM Straddle Analysis.py)."""
+    today = today or dt.date.today()
+    straddle_price = call_price + put_price
+    straddle_pct = straddle_price / spot
+    expiry_date = dt.datetime.strptime(expiry, "%Y%m%d").date()
+    days_to_expiry = max((expiry_date - today).days, 1)
+
+    # Vega-vægtet kombineret IV
+    combined_iv = (
+        (gc.impliedVol * gc.vega + gp.impliedVol * gp.vega) / (gc.vega + gp.vega)
+        if (gc.vega + gp.vega) != 0 else (gc.impliedVol + gp.impliedVol) / 2
+    )
+    daily_move_pct = straddle_pct / (days_to_expiry ** 0.5)
+    return {
+        "Underlying": ticker,
+        "Expiry": expiry,
+        "DaysToExpiry": days_to_expiry,
+        "Strike(ATM)": strike,
+        "Spot": round(spot, 4),
+        "StraddlePrice": round(straddle_price, 4),
+        "StraddlePctOfSpot": round(straddle_pct, 4),
+        "Breakeven_Down": round(spot - straddle_price, 4),
+        "Breakeven_Up": round(spot + straddle_price, 4),
+        "CombinedIV_VegaWeighted": round(combined_iv, 6),
+        "AnnualizedImpliedMove": round(daily_move_pct * (252 ** 0.5), 4),
+        "ImpliedDailyMovePct": round(daily_move_pct, 4),
+        "ImpliedDailyMoveUSD": round(daily_move_pct * spot, 4),
+    }
+
+
+def spot_price(ticker):
+    price = ticker.last
+    if price is None or math.isnan(price) or price <= 0:
+        price = ticker.marketPrice()
+    if price is None or math.isnan(price) or price <= 0:
+        price = ticker.close
+    return price if price and not math.isnan(price) and price > 0 else None
+
+
+async def chain_params(ib, stock):
+    """SMART-chain (expirations, strikes, tradingClass, multiplier) for en kvalificeret aktie."""
+    chains = await CONTRACT_CACHE.sec_def_opt_params_async(ib, stock.symbol, "", stock.secType, stock.conId)
+    if not chains:
+        return None
+    return next((c for c in chains if c.exchange == "SMART"), chains[0])
+
+
+async def scan_async(ib, tickers, max_days=MAX_DAYS, max_lines=MAX_LINES, today=None):
+    today = today or dt.date.today()
+
+    # 1) Aktier og spot – alle på én gang
+    stocks = [Stock(t, "SMART", "USD") for t in tickers]
+    await CONTRACT_CACHE.qualify_async(ib, *stocks)
+    stocks = [s for s in stocks if s.conId]
+    lines = LineBudget(max_lines)
+    tickers_, _ = await gather_snapshots_async(ib, stocks, fields=STOCK_FIELDS, timeout=5, lines=lines)
+    spots = {t.contract.symbol: spot_price(t) for t in tickers_}
+
+    # 2) Chain-parametre – ét kald pr. ticker, samtidigt
+    chains = await asyncio.gather(*(chain_params(ib, s) for s in stocks))
+
+    # 3) ATM-kandidater for hver (ticker, expiry) – de nærmeste strikes fra chain-parametrene
+    candidates = {}
+    for stock, chain in zip(stocks, chains):
+        spot = spots.get(stock.symbol)
+        if chain is None or spot is None:
+            print(f"⚠️ {stock.symbol}: ingen spot eller option chain")
+            continue
+        strikes = sorted(chain.strikes, key=lambda k: abs(k - spot))[:ATM_CANDIDATES]
+        for expiry in sorted(chain.expirations):
+            days = (dt.datetime.strptime(expiry, "%Y%m%d").date() - today).days
+            if not 0 < days <= max_days:
+                continue
+            candidates[(stock.symbol, expiry)] = [
+                (Option(stock.symbol, expiry, k, "C", "SMART", chain.multiplier, "USD", tradingClass=chain.tradingClass),
+                 Option(stock.symbol, expiry, k, "P", "SMART", chain.multiplier, "USD", tradingClass=chain.tradingClass))
+                for k in strikes
+            ]
+
+    # 4) Kvalificér alle kandidater samtidigt; behold den nærmeste strike, der findes for expiry'en
+    await CONTRACT_CACHE.qualify_async(ib, *(o for legs in candidates.values() for pair in legs for o in pair))
+    straddles = {}
+    for key, legs in candidates.items():
+        pair = next(((c, p) for c, p in legs if c.conId and p.conId), None)
+        if pair is None:
+            print(f"⚠️ {key[0]} {key[1]}: ingen ATM strike fundet")
+            continue
+        straddles[key] = pair
+
+    # 5) Greeks for alle ben – streames og roteres inden for market data-linjegrænsen
+    legs = [o for pair in straddles.values() for o in pair]
+    tickers_, report = await gather_snapshots_async(ib, legs, fields=("modelGreeks",), timeout=10,
+                                                    snapshot=False, lines=lines)
+    print_timeouts(report)
+    print_line_usage(lines)
+    ticks = {id(c): t for c, t in zip(legs, tickers_)}
+
+    # 6) Summary
+    rows = []
+    for (symbol, expiry), (call, put) in straddles.items():
+        tc, tp = ticks.get(id(call)), ticks.get(id(put))
+        gc = tc.modelGreeks if tc else None
+        gp = tp.modelGreeks if tp else None
+        if not gc or not gp or gc.impliedVol is None or gp.impliedVol is None:
+            continue
+        call_price = tc.last if tc.last and not math.isnan(tc.last) else gc.optPrice
+        put_price = tp.last if tp.last and not math.isnan(tp.last) else gp.optPrice
+        rows.append(straddle_summary(symbol, expiry, spots[symbol], call.strike, gc, gp,
+                                     call_price, put_price, today))
+    return pd.DataFrame(rows, columns=SUMMARY_COLUMNS)
+
+
+def scan(ib, tickers, max_days=MAX_DAYS, max_lines=MAX_LINES):
+    """Synkron udgave (kører event-loopet via ib.run)."""
+    return ib.run(scan_async(ib, tickers, max_days, max_lines))
+
+
+if __name__ == "__main__":
+    ib = get_ib()
+    ib.reqMarketDataType(3 if USE_DELAYED else 1)
+
+    started = dt.datetime.now()
+    summary = scan(ib, TICKERS)
+    elapsed = (dt.datetime.now() - started).total_seconds()
+
+    pd.set_option("display.width", 200)
+    print(f"\n=== ATM Straddle Summary – {len(summary)} straddles, {len(TICKERS)} tickers, {elapsed:.1f}s ===")
+    print(summary.to_string(index=False))
+
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    path = OUT_DIR / f"{started:%Y-%m-%d_%H%M}.csv"
+    summary.to_csv(path, index=False)
+    print(f"💾 Gemt: {path}")
+
+    disconnect_ib()
@@ -0,0 +1,223 @@
+# svi_surface.py
+# Parametrisk vol surface: en SVI-slice pr. expiry (eller en global SSVI) fittet til
+# (log-moneyness, T, iv)-rækkerne. Erstatter dobbelt griddata (cubic + nearest) –
+# fittet laves én gang, og overfladen kan derefter evalueres på et vilkårligt grid.
+#
+#   SVI (raw):  w(k) = a + b * (rho * (k - m) + sqrt((k - m)^2 + sigma^2))
+#   SSVI:       w(k, theta) = theta / 2 * (1 + rho*phi*k + sqrt((phi*k + rho)^2 + 1 - rho^2)),
+#               phi(theta) = eta / theta^gamma
+# hvor w = iv^2 * T er total varians. Mellem expiries interpoleres w lineært i T
+# ved fast k; uden for [T_min, T_max] holdes iv flad.
+
+import time
+
+import numpy as np
+from scipy.optimize import least_squares, minimize
+
+from metrics import METRICS
+
+MIN_POINTS = 5       # SVI har 5 parametre
+_RHO_MAX = 0.999
+
+
+def svi_total_variance(k, a, b, rho, m, sigma):
+    k = np.asarray(k, dtype=float)
+    return a + b * (rho * (k - m) + np.sqrt((k - m) ** 2 + sigma ** 2))
+
+
+def ssvi_total_variance(k, theta, rho, eta, gamma):
+    k = np.asarray(k, dtype=float)
+    theta = np.asarray(theta, dtype=float)
+    phi = eta / theta ** gamma
+    return theta / 2 * (1 + rho * phi * k + np.sqrt((phi * k + rho) ** 2 + 1 - rho ** 2))
+
+
+# ========== SVI pr. expiry ==========
+
+def _svi_linear(k, w, m, sigma):
+    """
+    For faste (m, sigma) er SVI lineær i (a, b*rho, b) – løs least squares for
+    alle (m, sigma)-kandidater på én gang. Returnerer (params (n, 3), SSE (n,)).
+    """
+    m = np.atleast_1d(m)[:, None]
+    sigma = np.atleast_1d(sigma)[:, None]
+    km = k[None, :] - m
+    X = np.stack([np.ones_like(km), km, np.sqrt(km ** 2 + sigma ** 2)], axis=-1)  # (n, pts, 3)
+    XtX = np.einsum('npi,npj->nij', X, X)
+    Xty = np.einsum('npi,p->ni', X, w)
+    params = np.linalg.solve(XtX + 1e-12 * np.eye(3), Xty[..., None])[..., 0]
+    a, d, c = params.T
+    # No-arbitrage krav: b >= 0, |rho| < 1 og ikke-negativ minimumsvarians
+    c = np.maximum(c, 0.0)
+    d = np.clip(d, -_RHO_MAX * c, _RHO_MAX * c)
+    a = np.maximum(a, -c * sigma[:, 0] * np.sqrt(np.maximum(1 - (d / np.where(c > 0, c, 1)) ** 2, 0)))
+    fitted = a[:, None] + d[:, None] * km + c[:, None] * X[..., 2]
+    sse = ((fitted - w[None, :]) ** 2).sum(axis=1)
+    return np.stack([a, d, c], axis=1), sse
+
+
+def fit_svi_slice(k, w):
+    """Fit raw SVI til én expiry. Returnerer (a, b, rho, m, sigma) og RMSE i total varians."""
+    k = np.asarray(k, dtype=float)
+    w = np.asarray(w, dtype=float)
+
+    # Grov søgning over (m, sigma) – vektoriseret
+    span = max(k.max() - k.min(), 1e-3)
+    M, S = np.meshgrid(np.linspace(k.min(), k.max(), 15), np.geomspace(0.01, 1.0, 15) * span)
+    _, sse = _svi_linear(k, w, M.ravel(), S.ravel())
+    best = np.argmin(sse)
+
+    # Finpuds (m, log sigma) med den lineære del løst eksakt i hvert skridt
+    def objective(z):
+        return _svi_linear(k, w, z[0], np.exp(z[1]))[1][0]
+
+    res = minimize(objective, [M.ravel()[best], np.log(S.ravel()[best])], method='Nelder-Mead',
+                   options={'xatol': 1e-4, 'fatol': 1e-10, 'maxiter': 200})
+    m, sigma = res.x[0], np.exp(res.x[1])
+    params, sse = _svi_linear(k, w, m, sigma)
+    a, d, c = params[0]
+    sse = sse[0]
+    rho = d / c if c > 0 else 0.0
+    return (a, c, rho, m, sigma), np.sqrt(sse / len(k))
+
+
+# ========== Overflade ==========
+
+class VolSurface:
+    """Fittet overflade. slices: total varians-funktion pr. expiry-knude (sorteret på T)."""
+
+    def __init__(self, T, slice_fn, params, rmse, model):
+        self.T = np.asarray(T, dtype=float)
+        self._slice_fn = slice_fn
+        self.params = params
+        self.rmse = rmse
+        self.model = model
+
+    def total_variance(self, k, T):
+        """w på gridet (len(T), len(k))."""
+        k = np.atleast_1d(np.asarray(k, dtype=float))
+        T = np.atleast_1d(np.asarray(T, dtype=float))
+        W = self._slice_fn(k)                        # (n_slices, len(k))
+        Tn = self.T
+        if len(Tn) == 1:
+            return W[0][None, :] * (T / Tn[0])[:, None]
+
+        idx = np.clip(np.searchsorted(Tn, T), 1, len(Tn) - 1)
+        t = ((T - Tn[idx - 1]) / (Tn[idx] - Tn[idx - 1]))[:, None]
+        w = (1 - t) * W[idx - 1] + t * W[idx]
+        # Flad iv uden for de fittede expiries
+        w = np.where((T < Tn[0])[:, None], W[0][None, :] * (T / Tn[0])[:, None], w)
+        w = np.where((T > Tn[-1])[:, None], W[-1][None, :] * (T / Tn[-1])[:, None], w)
+        return w
+
+    def iv(self, k, T):
+        T_arr = np.atleast_1d(np.asarray(T, dtype=float))
+        return np.sqrt(np.maximum(self.total_variance(k, T_arr), 0) / T_arr[:, None])
+
+    def grid(self, x_lin, T_lin):
+        """Samme form som griddata på np.meshgrid(x_lin, T_lin): (len(T_lin), len(x_lin))."""
+        return self.iv(x_lin, T_lin)
+
+
+def _slices(df, min_points):
+    for T, g in df.groupby('T', sort=True):
+        if len(g) >= min_points and T > 0:
+            yield T, g['x'].to_numpy(float), (g['iv'].to_numpy(float) ** 2) * T
+
+
+def fit_svi_surface(df, min_points=MIN_POINTS):
+    """SVI pr. expiry. df med kolonnerne x (log-moneyness), T og iv."""
+    Ts, params, rmse = [], [], []
+    for T, k, w in _slices(df, min_points):
+        p, err = fit_svi_slice(k, w)
+        Ts.append(T)
+        params.append(p)
+        rmse.append(err)
+    if not Ts:
+        raise ValueError(f"Ingen expiries med mindst {min_points} strikes")
+    P = np.array(params)
+
+    def slice_fn(k):
+        a, b, rho, m, sigma = (P[:, i][:, None] for i in range(5))
+        return svi_total_variance(k[None, :], a, b, rho, m, sigma)
+
+    return VolSurface(Ts, slice_fn, P, np.array(rmse), 'svi')
+
+
+def fit_ssvi_surface(df, min_points=3):
+    """Global SSVI (3 parametre for hele overfladen + ATM total varians pr. expiry)."""
+    Ts, thetas, ks, ws, slice_id = [], [], [], [], []
+    for T, k, w in _slices(df, min_points):
+        order = np.argsort(k)
+        # ATM total varians: lineær interpolation til k = 0
+        thetas.append(max(np.interp(0.0, k[order], w[order]), 1e-8))
+        Ts.append(T)
+        ks.append(k)
+        ws.append(w)
+        slice_id.append(np.full(len(k), len(Ts) - 1))
+    if not Ts:
+        raise ValueError(f"Ingen expiries med mindst {min_points} strikes")
+    theta = np.maximum.accumulate(np.array(thetas))   # theta skal være ikke-faldende i T
+    k_all, w_all, sid = np.concatenate(ks), np.concatenate(ws), np.concatenate(slice_id)
+    theta_pts = theta[sid]
+
+    def residuals(p):
+        return ssvi_total_variance(k_all, theta_pts, *p) - w_all
+
+    fit = least_squares(residuals, x0=[-0.3, 1.0, 0.5],
+                        bounds=([-_RHO_MAX, 1e-4, 0.0], [_RHO_MAX, 10.0, 1.0]))
+    rho, eta, gamma = fit.x
+    rmse = np.array([np.sqrt(np.mean(fit.fun[sid == i] ** 2)) for i in range(len(Ts))])
+
+    def slice_fn(k):
+        return ssvi_total_variance(k[None, :], theta[:, None], rho, eta, gamma)
+
+    return VolSurface(Ts, slice_fn, {'theta': theta, 'rho': rho, 'eta': eta, 'gamma': gamma}, rmse, 'ssvi')
+
+
+def fit_surface(df, model='svi'):
+    with METRICS.span('analytics_fit_surface', model=model):
+        return fit_ssvi_surface(df) if model == 'ssvi' else fit_svi_surface(df)
+
+
+# === Benchmark: dobbelt griddata vs SVI-fit + evaluering ===
+def _synthetic_chain(n_expiries=12, n_strikes=60, seed=0):
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    rows = []
+    for T in np.geomspace(0.02, 2.0, n_expiries):
+        k = np.sort(rng.uniform(-0.5, 0.4, n_strikes)) * np.sqrt(T / 0.25) ** 0.5
+        w = svi_total_variance(k, 0.03 * T, 0.12 * np.sqrt(T), -0.5, 0.02, 0.2)
+        rows.append(pd.DataFrame({'x': k, 'T': T, 'iv': np.sqrt(w / T) + rng.normal(0, 0.003, len(k))}))
+    return pd.concat(rows, ignore_index=True)
+
+
+def benchmark(nx=80, nT=60):
+    from scipy.interpolate import griddata
+    df = _synthetic_chain()
+    x_lin = np.linspace(df['x'].min(), df['x'].max(), nx)
+    T_lin = np.linspace(df['T'].min(), df['T'].max(), nT)
+    X, Y = np.meshgrid(x_lin, T_lin)
+
+    t0 = time.perf_counter()
+    Z_cubic = griddata(df[['x', 'T']].values, df['iv'].values, (X, Y), method='cubic')
+    Z_near = griddata(df[['x', 'T']].values, df['iv'].values, (X, Y), method='nearest')
+    np.where(np.isnan(Z_cubic), Z_near, Z_cubic)
+    t_grid = time.perf_counter() - t0
+
+    print(f"{len(df)} punkter, grid {nx}x{nT}")
+    print(f"{'griddata x2':>12}: {t_grid * 1e3:8.2f} ms pr. opdatering")
+    for model in ('svi', 'ssvi'):
+        t0 = time.perf_counter()
+        surface = fit_surface(df, model)
+        t_fit = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for _ in range(100):
+            surface.grid(x_lin, T_lin)
+        t_eval = (time.perf_counter() - t0) / 100
+        print(f"{model:>12}: fit {t_fit * 1e3:8.2f} ms | evaluering {t_eval * 1e6:8.1f} µs"
+              f" | RMSE (total varians) {surface.rmse.mean():.2e}")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,177 @@
+# swr_cache.py
+# Proces-delt cache med stale-while-revalidate og invalidering pr. nøgle/ticker.
+# * frisk entry (alder < ttl): returneres direkte
+# * forældet entry (alder < ttl + max_stale) eller invalideret: den gamle værdi returneres
+#   straks, og én baggrundstråd henter en ny
+# * manglende entry: beregnes af den første kalder; samtidige kaldere med samme nøgle
+#   venter på samme resultat i stedet for at ramme datakilden hver for sig
+# refresh(tag) opdaterer kun én tickers entries – ingen global clear(). Entries med en
+# force_loader (memoize(force_kwarg=...)) hentes da forfra uden om underliggende caches.
+
+import functools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pandas as pd
+
+TTL = 300            # sekunder før en entry er forældet
+MAX_STALE = 3600     # hvor længe en forældet værdi må serveres, mens den opdateres
+REFRESH_WORKERS = 4
+
+STATS_COLUMNS = ['function', 'args', 'age', 'state', 'hits', 'stale_hits', 'refreshes', 'error']
+
+
+class _Entry:
+    __slots__ = ('value', 'created', 'loader', 'force_loader', 'ttl', 'tag', 'invalid',
+                 'hits', 'stale_hits', 'refreshes', 'error')
+
+    def __init__(self, value, loader, ttl, tag, force_loader=None):
+        self.value = value
+        self.created = time.time()
+        self.loader = loader
+        self.force_loader = force_loader or loader
+        self.ttl = ttl
+        self.tag = tag
+        self.invalid = False
+        self.hits = 0
+        self.stale_hits = 0
+        self.refreshes = 0
+        self.error = None
+
+
+class SWRCache:
+
+    def __init__(self, ttl=TTL, max_stale=MAX_STALE, workers=REFRESH_WORKERS):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._entries = {}
+        self._inflight = {}          # nøgle -> Future (første beregning eller baggrundsopdatering)
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="swr-refresh")
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.waits = 0               # kaldere der ventede på en igangværende beregning
+
+    def get(self, key, loader, ttl=None, tag=None, force_loader=None):
+        """
+        Værdien for key; loader() kaldes ved miss og i baggrunden ved forældet/invalideret entry.
+        force_loader() bruges i stedet, når entry'en opdateres via refresh().
+        """
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = time.time() - entry.created
+                if not entry.invalid and age < ttl:
+                    entry.hits += 1
+                    self.hits += 1
+                    return entry.value
+                if age < ttl + self.max_stale or entry.invalid:
+                    entry.stale_hits += 1
+                    self.stale_hits += 1
+                    self._revalidate(key, entry)
+                    return entry.value
+
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+                self.misses += 1
+            else:
+                self.waits += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._entries[key] = _Entry(value, loader, ttl, tag, force_loader)
+            self._inflight.pop(key, None)
+        future.set_result(value)
+        return value
+
+    def _revalidate(self, key, entry, force=False):
+        # Kaldes med self._lock holdt; højst én opdatering pr. nøgle ad gangen
+        if key in self._inflight:
+            return
+        future = Future()
+        self._inflight[key] = future
+        self._pool.submit(self._refresh_entry, key, entry, future, force)
+
+    def _refresh_entry(self, key, entry, future, force=False):
+        try:
+            value = (entry.force_loader if force else entry.loader)()
+        except Exception as e:
+            # Behold den gamle værdi; næste kald forsøger igen
+            with self._lock:
+                entry.error = f"{type(e).__name__}: {e}"
+                self._inflight.pop(key, None)
+            future.set_result(entry.value)
+            return
+        with self._lock:
+            fresh = _Entry(value, entry.loader, entry.ttl, entry.tag, entry.force_loader)
+            fresh.hits, fresh.stale_hits, fresh.refreshes = entry.hits, entry.stale_hits, entry.refreshes + 1
+            self._entries[key] = fresh
+            self._inflight.pop(key, None)
+        future.set_result(value)
+
+    def refresh(self, tag):
+        """Markér alle entries for tag (fx en ticker) som forældede og hent dem forfra i baggrunden."""
+        with self._lock:
+            keys = [k for k, e in self._entries.items() if e.tag == tag]
+            for key in keys:
+                entry = self._entries[key]
+                entry.invalid = True
+                self._revalidate(key, entry, force=True)
+        return len(keys)
+
+    def is_refreshing(self, tag):
+        with self._lock:
+            return any(k in self._inflight for k, e in self._entries.items() if e.tag == tag)
+
+    def memoize(self, ttl=None, force_kwarg=None):
+        """
+        Decorator: nøgle = (funktionsnavn, args, kwargs), tag = første argument (ticker).
+        force_kwarg: navnet på et keyword, der sættes til True, når refresh() genindlæser entry'en
+        (så funktionen kan gå uden om sine egne caches); det indgår ikke i nøglen.
+        """
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                key = (fn.__qualname__, args, tuple(sorted(kwargs.items())))
+                force_loader = functools.partial(fn, *args, **kwargs, **{force_kwarg: True}) if force_kwarg else None
+                return self.get(key, functools.partial(fn, *args, **kwargs), ttl=ttl,
+                                tag=args[0] if args else None, force_loader=force_loader)
+            return wrapper
+        return decorator
+
+    def stats(self, tag=None):
+        """(totaler, DataFrame med alder og hit-tal pr. entry)."""
+        now = time.time()
+        rows = []
+        with self._lock:
+            for key, e in self._entries.items():
+                if tag is not None and e.tag != tag:
+                    continue
+                age = now - e.created
+                if key in self._inflight:
+                    state = 'refreshing'
+                elif e.invalid or age >= e.ttl:
+                    state = 'stale'
+                else:
+                    state = 'fresh'
+                rows.append({'function': key[0], 'args': ', '.join(map(str, key[1])), 'age': round(age, 1),
+                             'state': state, 'hits': e.hits, 'stale_hits': e.stale_hits,
+                             'refreshes': e.refreshes, 'error': e.error})
+            totals = {'hits': self.hits, 'stale_hits': self.stale_hits, 'misses': self.misses,
+                      'waits': self.waits, 'entries': len(self._entries)}
+        return totals, pd.DataFrame(rows, columns=STATS_COLUMNS)
@@ -0,0 +1,173 @@
+# vol_surface_screener.py
+# Batch-udgave af Vol_Surface_Yahoo_Finance.py: vol surfaces for en hel ticker-liste.
+# Netværks-I/O (spot, expiries, option chains) kører i en thread pool, og hver ticker sendes
+# videre til en process pool (SVI-fit + nøgletal), så snart dens chains er hentet – så
+# download og CPU-arbejde overlapper.
+# Output i data/screener/<dato>/: results.csv (rangeret) og surfaces/<TICKER>.parquet.
+#
+#   python vol_surface_screener.py AAPL MSFT NVDA
+#   python vol_surface_screener.py --file tickers.txt --processes 8
+
+import argparse
+import datetime as dt
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+from chain_store import ChainStore
+from svi_surface import fit_surface
+from yahoo_chains import fetch_chains, surface_points, filter_surface_points, EXPIRY_TIMEOUT
+
+# === INPUT VARIABLER ===
+TICKERS = ["AAPL", "MSFT", "NVDA", "AMZN", "META", "GOOGL", "TSLA", "INTC"]
+N_SIGMA = 2.0              # strikes inden for +/- N_SIGMA * ATM-IV * sqrt(T)
+MODEL = "svi"              # eller "ssvi"
+IO_WORKERS = 4             # tickers der hentes samtidigt
+CHAIN_WORKERS = 4          # expiries pr. ticker der hentes samtidigt
+PROCESSES = os.cpu_count() or 2
+OUT_DIR = Path(__file__).resolve().parent / "data" / "screener"
+
+ATM_T = 30 / 365           # nøgletal aflæses ved 30 dage ...
+TERM_T = 180 / 365         # ... og term-struktur mellem 30 og 180 dage
+GRID_X, GRID_T = 200, 120
+
+RESULT_COLUMNS = ['ticker', 'spot', 'atm_iv', 'skew_25d', 'term_slope', 'fit_rmse_iv', 'n_points',
+                  'n_expiries', 'fetch_s', 'fit_s', 'total_s', 'error']
+
+
+# ========== I/O (tråde) ==========
+
+def fetch_points(ticker, store):
+    """Spot + ufiltrerede surface-punkter for én ticker (kører i en I/O-tråd)."""
+    import yfinance as yf
+    t0 = time.perf_counter()
+    ticker_obj = yf.Ticker(ticker)
+    spot = float(ticker_obj.history(period="1d")["Close"].iloc[-1])
+    rows, skipped = fetch_chains(ticker_obj, ticker_obj.options,
+                                 lambda expiry, chain: surface_points(expiry, chain, spot),
+                                 max_workers=CHAIN_WORKERS, timeout=EXPIRY_TIMEOUT, store=store)
+    points = pd.concat(rows, ignore_index=True) if rows else pd.DataFrame()
+    return spot, points, time.perf_counter() - t0
+
+
+# ========== Beregning (processer) ==========
+
+def _iv(surface, k, T):
+    return float(surface.iv([k], [T])[0, 0])
+
+
+def _delta_strike(surface, T, delta):
+    """Log-moneyness for en forward-delta (0.25 = 25-delta call, -0.25 = 25-delta put)."""
+    d1 = norm.ppf(delta if delta > 0 else 1 + delta)
+    k = 0.0
+    for _ in range(6):  # fixpunkt: sigma afhænger af k
+        sigma = _iv(surface, k, T)
+        k = 0.5 * sigma ** 2 * T - d1 * sigma * np.sqrt(T)
+    return k
+
+
+def analyze_surface(ticker, spot, points, out_dir, n_sigma=N_SIGMA, model=MODEL):
+    """SVI-fit og nøgletal for én ticker; overfladen gemmes som Parquet. Kører i en worker-proces."""
+    t0 = time.perf_counter()
+    df = filter_surface_points(points, n_sigma=n_sigma, min_open_interest=0)
+    surface = fit_surface(df, model)
+
+    # Fit-kvalitet i IV-enheder over de punkter, der blev fittet
+    errors = [surface.iv(g['x'].to_numpy(), [T])[0] - g['iv'].to_numpy() for T, g in df.groupby('T')]
+    fit_rmse = float(np.sqrt(np.mean(np.concatenate(errors) ** 2)))
+
+    atm = _iv(surface, 0.0, ATM_T)
+    skew = _iv(surface, _delta_strike(surface, ATM_T, -0.25), ATM_T) - \
+        _iv(surface, _delta_strike(surface, ATM_T, 0.25), ATM_T)
+    slope = (_iv(surface, 0.0, TERM_T) - atm) / (TERM_T - ATM_T)
+
+    x_lin = np.linspace(df['x'].min(), df['x'].max(), GRID_X)
+    T_lin = np.linspace(df['T'].min(), df['T'].max(), GRID_T)
+    X, Y = np.meshgrid(x_lin, T_lin)
+    grid = pd.DataFrame({'x': X.ravel(), 'strike': spot * np.exp(X.ravel()), 'T': Y.ravel(),
+                         'iv': surface.grid(x_lin, T_lin).ravel()})
+    grid.to_parquet(Path(out_dir) / "surfaces" / f"{ticker}.parquet", index=False)
+
+    return {'ticker': ticker, 'spot': spot, 'atm_iv': atm, 'skew_25d': skew, 'term_slope': slope,
+            'fit_rmse_iv': fit_rmse, 'n_points': len(df), 'n_expiries': len(surface.T),
+            'fit_s': time.perf_counter() - t0}
+
+
+# ========== Batch ==========
+
+def screen(tickers, out_dir=None, processes=PROCESSES, io_workers=IO_WORKERS, n_sigma=N_SIGMA, model=MODEL):
+    """Byg surfaces for alle tickers. Returnerer den rangerede resultattabel."""
+    out_dir = Path(out_dir or OUT_DIR / f"{dt.date.today():%Y-%m-%d}")
+    (out_dir / "surfaces").mkdir(parents=True, exist_ok=True)
+    store = ChainStore()
+    wall0 = time.perf_counter()
+    results = {}
+
+    with ThreadPoolExecutor(max_workers=io_workers) as io_pool, \
+            ProcessPoolExecutor(max_workers=processes) as cpu_pool:
+        fetches = {io_pool.submit(fetch_points, t, store): t for t in tickers}
+        fits = {}
+        # Hver ticker sendes til process pool'en, så snart dens chains er hentet
+        for fut in as_completed(fetches):
+            ticker = fetches[fut]
+            try:
+                spot, points, fetch_s = fut.result()
+            except Exception as e:
+                results[ticker] = {'ticker': ticker, 'error': f"fetch: {e}"}
+                print(f"❌ {ticker}: {e}")
+                continue
+            results[ticker] = {'ticker': ticker, 'spot': spot, 'fetch_s': fetch_s}
+            if points.empty:
+                results[ticker]['error'] = "ingen option data"
+                continue
+            fits[cpu_pool.submit(analyze_surface, ticker, spot, points, out_dir, n_sigma, model)] = ticker
+
+        for fut in as_completed(fits):
+            ticker = fits[fut]
+            try:
+                results[ticker].update(fut.result())
+            except Exception as e:
+                results[ticker]['error'] = f"fit: {e}"
+                print(f"❌ {ticker}: {e}")
+                continue
+            r = results[ticker]
+            print(f"✅ {ticker:<6} ATM IV {r['atm_iv']:.1%} | hentning {r['fetch_s']:.1f}s | fit {r['fit_s']:.2f}s")
+
+    table = pd.DataFrame(list(results.values()), columns=RESULT_COLUMNS)
+    table['total_s'] = table['fetch_s'].fillna(0) + table['fit_s'].fillna(0)
+    table = table.sort_values('atm_iv', ascending=False, na_position='last').reset_index(drop=True)
+    table.insert(0, 'rank', np.arange(1, len(table) + 1))
+    table.to_csv(out_dir / "results.csv", index=False)
+
+    wall = time.perf_counter() - wall0
+    ok = table['error'].isna().sum()
+    print(f"\n{ok}/{len(tickers)} surfaces på {wall:.1f}s wall-time "
+          f"(sum af pr.-ticker tider {table['total_s'].sum():.1f}s) -> {out_dir}")
+    return table
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Vol surface screener for en liste af tickers")
+    parser.add_argument("tickers", nargs="*", help="tickers (default: TICKERS i scriptet)")
+    parser.add_argument("--file", help="fil med én ticker pr. linje")
+    parser.add_argument("--processes", type=int, default=PROCESSES)
+    parser.add_argument("--io-workers", type=int, default=IO_WORKERS)
+    parser.add_argument("--n-sigma", type=float, default=N_SIGMA)
+    parser.add_argument("--model", choices=["svi", "ssvi"], default=MODEL)
+    parser.add_argument("--out", help="output-mappe (default: data/screener/<dato>)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    tickers = list(args.tickers)
+    if args.file:
+        tickers += [line.strip().upper() for line in Path(args.file).read_text().splitlines() if line.strip()]
+    table = screen(tickers or TICKERS, out_dir=args.out, processes=args.processes,
+                   io_workers=args.io_workers, n_sigma=args.n_sigma, model=args.model)
+    print(table.to_string(index=False))
@@ -0,0 +1,194 @@
+# yahoo_chains.py
+# Parallel download af Yahoo option chains (én request pr. expiry) via en begrænset thread pool.
+# Hver expiry behandles, så snart dens chain er hentet, og fejl samles i en skip-rapport.
+
+import datetime as dt
+import math
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+import pandas as pd
+
+from metrics import METRICS
+
+MAX_WORKERS = 8         # samtidige requests mod Yahoo
+EXPIRY_TIMEOUT = 20.0   # sekunder pr. expiry før den opgives
+
+SKIP_COLUMNS = ['expiry', 'reason', 'detail']
+SURFACE_COLUMNS = ['expiry', 'T', 'strike', 'log_moneyness', 'iv_final', 'atm_iv',
+                   'openInterest_call', 'openInterest_put']
+
+# Samme form som yfinance' option_chain()-resultat (calls/puts)
+Chain = namedtuple('Chain', ['calls', 'puts'])
+
+
+def time_to_expiry(expiry: str) -> float:
+    """Tid til udløb i år for en Yahoo expiry ('YYYY-MM-DD')."""
+    ed = dt.datetime.strptime(expiry, "%Y-%m-%d")
+    return (ed - dt.datetime.today()).days / 365
+
+
+def merge_calls_puts(calls: pd.DataFrame, puts: pd.DataFrame, spot: float) -> pd.DataFrame:
+    """
+    Merge calls/puts på strike og lav 'iv_final':
+    puts under spot, calls over spot, ATM = gennemsnit.
+    """
+    m = pd.merge(
+        calls[['strike', 'impliedVolatility', 'openInterest']],
+        puts[['strike', 'impliedVolatility', 'openInterest']],
+        on='strike', how='inner', suffixes=('_call', '_put')
+    )
+    if m.empty:
+        return m
+
+    atm_strike = m.loc[(m['strike'] - spot).abs().idxmin(), 'strike']
+    m['iv_final'] = np.nan
+    m.loc[m['strike'] < spot, 'iv_final'] = m.loc[m['strike'] < spot, 'impliedVolatility_put']
+    m.loc[m['strike'] > spot, 'iv_final'] = m.loc[m['strike'] > spot, 'impliedVolatility_call']
+    m.loc[m['strike'] == atm_strike, 'iv_final'] = m.loc[
+        m['strike'] == atm_strike, ['impliedVolatility_call', 'impliedVolatility_put']
+    ].mean(axis=1)
+    m['atm_iv'] = m.loc[m['strike'] == atm_strike, 'iv_final'].iloc[0]
+    m['log_moneyness'] = np.log(m['strike'] / spot)
+    return m
+
+
+def surface_points(expiry, chain, spot):
+    """Ufiltrerede surface-punkter for én expiry (SURFACE_COLUMNS), eller None."""
+    m = merge_calls_puts(chain.calls, chain.puts, spot)
+    if m.empty:
+        return None
+    m['expiry'] = expiry
+    m['T'] = time_to_expiry(expiry)
+    return m[SURFACE_COLUMNS]
+
+
+def filter_surface_points(points, n_sigma=3.0, iv_cap=1.0, min_open_interest=None) -> pd.DataFrame:
+    """
+    Vektoriseret filter over alle expiries på én gang -> DataFrame[x, T, iv].
+    Strikes inden for +/- n_sigma * atm_iv * sqrt(T) i log-moneyness, endelig IV under iv_cap
+    og (valgfrit) samlet open interest over min_open_interest.
+    """
+    if points.empty:
+        return pd.DataFrame(columns=['x', 'T', 'iv'])
+    with METRICS.span('analytics_filter_surface'):
+        return _filter_surface_points(points, n_sigma, iv_cap, min_open_interest)
+
+
+def _filter_surface_points(points, n_sigma, iv_cap, min_open_interest):
+    x = points['log_moneyness'].to_numpy()
+    iv = points['iv_final'].to_numpy()
+    band = n_sigma * points['atm_iv'].to_numpy() * np.sqrt(points['T'].to_numpy())
+    mask = (np.abs(x) <= band) & np.isfinite(iv) & (iv < iv_cap)
+    if min_open_interest is not None:
+        oi = points['openInterest_call'].fillna(0).to_numpy() + points['openInterest_put'].fillna(0).to_numpy()
+        mask &= oi > min_open_interest
+    return pd.DataFrame({'x': x[mask], 'T': points['T'].to_numpy()[mask], 'iv': iv[mask]})
+
+
+def chain_to_frame(expiry, chain) -> pd.DataFrame:
+    """calls/puts -> én DataFrame med 'expiry' og 'right' (til ChainStore)."""
+    calls = chain.calls.assign(right='C')
+    puts = chain.puts.assign(right='P')
+    return pd.concat([calls, puts], ignore_index=True).assign(expiry=expiry)
+
+
+def frame_to_chain(df: pd.DataFrame) -> Chain:
+    return Chain(calls=df[df['right'] == 'C'].reset_index(drop=True),
+                 puts=df[df['right'] == 'P'].reset_index(drop=True))
+
+
+def fetch_chains(ticker_obj, expiries, process, max_workers=MAX_WORKERS, timeout=EXPIRY_TIMEOUT,
+                 store=None, max_age=None):
+    """
+    Hent option chains for alle expiries parallelt.
+
+    process(expiry, chain) kaldes i hovedtråden, efterhånden som hver chain ankommer,
+    og skal returnere en DataFrame (eller None/tom for "ingen data").
+    Med en ChainStore læses friske snapshots fra disk (ingen netværkskald),
+    og nye downloads gemmes som snapshots.
+    Returnerer (liste af DataFrames, skip-rapport som DataFrame[expiry, reason, detail]).
+    Ud over timeout pr. expiry gælder en samlet deadline (timeout x antal runder, poolen skal
+    bruge), så expiries i kø bag hængende requests også opgives.
+    """
+    results = []
+    skipped = []
+    started = {}
+    lock = threading.Lock()
+
+    def handle(expiry, chain):
+        try:
+            out = process(expiry, chain)
+        except Exception as e:
+            skipped.append({'expiry': expiry, 'reason': 'error', 'detail': str(e)})
+            return
+        if out is None or out.empty:
+            skipped.append({'expiry': expiry, 'reason': 'empty', 'detail': ''})
+        else:
+            results.append(out)
+
+    def download(expiry):
+        with lock:
+            started[expiry] = time.monotonic()
+        with METRICS.span('yahoo_option_chain'):
+            return ticker_obj.option_chain(expiry)
+
+    # Udløbne expiries hentes slet ikke
+    live = []
+    for expiry in expiries:
+        if time_to_expiry(expiry) <= 0:
+            skipped.append({'expiry': expiry, 'reason': 'expired', 'detail': ''})
+        else:
+            live.append(expiry)
+
+    if store is not None:
+        cached = store.read(ticker_obj.ticker, 'yahoo', expiries=live, max_age=max_age)
+        if not cached.empty:
+            for expiry, part in cached.groupby('expiry'):
+                handle(expiry, frame_to_chain(part))
+            METRICS.count('yahoo_store_hits_total', cached['expiry'].nunique())
+            live = [e for e in live if e not in set(cached['expiry'])]
+
+    workers = max(1, int(max_workers))
+    deadline = time.monotonic() + timeout * math.ceil(len(live) / workers)
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        pending = {pool.submit(download, expiry): expiry for expiry in live}
+        while pending:
+            done, _ = wait(pending, timeout=min(1.0, timeout), return_when=FIRST_COMPLETED)
+
+            for fut in done:
+                expiry = pending.pop(fut)
+                try:
+                    chain = fut.result()
+                except Exception as e:
+                    skipped.append({'expiry': expiry, 'reason': 'error', 'detail': str(e)})
+                    continue
+                if store is not None:
+                    store.write(ticker_obj.ticker, chain_to_frame(expiry, chain), source='yahoo')
+                handle(expiry, chain)
+
+            # Per-expiry timeout regnes fra det tidspunkt, hvor download faktisk startede;
+            # efter den samlede deadline opgives også dem, der aldrig kom ud af køen
+            now = time.monotonic()
+            with lock:
+                expired = [f for f, e in pending.items()
+                           if now > deadline or (e in started and now - started[e] > timeout)]
+            for fut in expired:
+                expiry = pending.pop(fut)
+                fut.cancel()
+                detail = f"> {timeout:g} s" if expiry in started else "ikke startet før deadline"
+                skipped.append({'expiry': expiry, 'reason': 'timeout', 'detail': detail})
+    finally:
+        # Vent ikke på hængende requests – de er allerede registreret som timeout
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    if METRICS.enabled:
+        for s in skipped:
+            METRICS.count('yahoo_expiries_skipped_total', reason=s['reason'])
+        METRICS.count('yahoo_expiries_total', len(results))
+
+    return results, pd.DataFrame(skipped, columns=SKIP_COLUMNS)